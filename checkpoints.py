@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import pickle
+from datetime import datetime
+
+
+class CheckpointStore:
+    """Periodic checkpoints of season processing.
+
+    A checkpoint is taken every `interval` processed matches and holds the in-memory
+    leaderboard, the number of events rows already on disk (the events watermark) and the
+    catalog position of the last processed match. While a processing run is in progress a
+    run marker is kept on disk; finding it on startup means the previous run died and
+    processing resumes from that run's latest checkpoint."""
+
+    VERSION = 1
+
+    def __init__(self, checkpoint_dir, interval=100):
+        self.logger = logging.getLogger('Checkpoints')
+        self.checkpoint_dir = checkpoint_dir
+        self.interval = max(1, int(interval))
+        self.marker_file = os.path.join(self.checkpoint_dir, 'run.json')
+        # Written just before a run saves its final files; removed again by end_run
+        self.final_file = os.path.join(self.checkpoint_dir, 'final.pickle')
+        self.run_id = None
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+    def _path(self, position):
+        return os.path.join(self.checkpoint_dir, f"checkpoint_{position:06d}.pickle")
+
+    def _write(self, path, write):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def begin_run(self, kind, run_id=None):
+        """Mark a processing run ('rebuild' or 'update') as in progress; pass run_id to continue an interrupted run."""
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d%H%M%S%f')
+        marker = json.dumps({'run': self.run_id, 'kind': kind}).encode('utf-8')
+        self._write(self.marker_file, lambda f: f.write(marker))
+        return self.run_id
+
+    def end_run(self):
+        self.run_id = None
+        for path in (self.final_file, self.marker_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def interrupted_run(self):
+        """The marker of a run that did not finish, or None."""
+        if not os.path.exists(self.marker_file):
+            return None
+        try:
+            with open(self.marker_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.error(f"Unreadable run marker {self.marker_file}: {e}")
+            return {'run': None, 'kind': 'update'}
+
+    def is_due(self, position):
+        return position > 0 and position % self.interval == 0
+
+    def save(self, position, match_file, start_key, leaderboard_df, needs_rank, events_watermark, complete=False):
+        checkpoint = {
+            'version': self.VERSION,
+            'run': self.run_id,
+            'position': position,
+            'match_file': match_file,
+            'start_key': start_key,
+            'leaderboard': leaderboard_df,
+            'needs_rank': needs_rank,
+            'events_watermark': events_watermark,
+            'complete': complete,
+        }
+        path = self.final_file if complete else self._path(position)
+        self._write(path, lambda f: pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.logger.info(f"{'Final checkpoint' if complete else 'Checkpoint'} at match {position} ({match_file})")
+
+    def positions(self):
+        positions = []
+        for file_name in os.listdir(self.checkpoint_dir):
+            if file_name.startswith('checkpoint_') and file_name.endswith('.pickle'):
+                try:
+                    positions.append(int(file_name[len('checkpoint_'):-len('.pickle')]))
+                except ValueError:
+                    continue
+        return sorted(positions)
+
+    def load(self, position=None):
+        path = self.final_file if position is None else self._path(position)
+        try:
+            with open(path, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            self.logger.error(f"Could not load checkpoint {position}: {e}")
+            return None
+        return checkpoint if checkpoint.get('version') == self.VERSION else None
+
+    def latest(self, run_id=None):
+        """Newest checkpoint, optionally only one written by run_id."""
+        if os.path.exists(self.final_file):
+            checkpoint = self.load()
+            if checkpoint is not None and (run_id is None or checkpoint['run'] == run_id):
+                return checkpoint
+        for position in reversed(self.positions()):
+            checkpoint = self.load(position)
+            if checkpoint is not None and (run_id is None or checkpoint['run'] == run_id):
+                return checkpoint
+        return None
+
+    def nearest_before(self, position):
+        """Newest checkpoint taken strictly before `position` matches were processed."""
+        for checkpoint_position in reversed(self.positions()):
+            if checkpoint_position < position:
+                checkpoint = self.load(checkpoint_position)
+                if checkpoint is not None:
+                    return checkpoint
+        return None
+
+    def discard_from(self, position):
+        """Drop checkpoints at or after `position`; they no longer match the season."""
+        for checkpoint_position in self.positions():
+            if checkpoint_position >= position:
+                os.remove(self._path(checkpoint_position))
+
+    def clear(self):
+        self.discard_from(0)
@@ -0,0 +1,176 @@
+"""One place that reads the YAML files under config/.
+
+Every file is parsed once, on first use, into a read-only ConfigSnapshot. watch() polls the
+loaded files and swaps in a new snapshot when one changes, so code that asks for
+ranked_percentages() or settings() when it starts a piece of work sees new values without a
+restart, and keeps a consistent set of values for the rest of that work."""
+import logging
+import os
+import threading
+import yaml
+
+CONFIG_DIR = 'config'
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return ConfigSnapshot(value)
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class ConfigSnapshot(dict):
+    """Read-only dict with attribute access; nested mappings are snapshots and lists are tuples.
+
+    It still is a dict, so json.dumps, pickling and {**snapshot, **overrides} work as before."""
+
+    def __init__(self, data=()):
+        super().__init__((key, freeze(value)) for key, value in dict(data).items())
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("config snapshots are read-only, use to_dict() for a mutable copy")
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return ConfigSnapshot, (thaw(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def to_dict(self):
+        """Mutable deep copy (dicts and lists)."""
+        return thaw(self)
+
+
+class ConfigService:
+    """Loads every config file once and serves its current snapshot.
+
+    Readers never see a half-updated file: a reload parses the whole file first and then
+    replaces the snapshot reference. A file that fails to parse keeps its last good snapshot."""
+
+    def __init__(self, directory=CONFIG_DIR):
+        self.logger = logging.getLogger('ConfigService')
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.files = {}          # file name -> (mtime_ns, size, snapshot)
+        self.failed = {}         # file name -> (mtime_ns, size) of a version that did not parse
+        self.section = None      # config.yaml section, None: its 'use' key
+        self.listeners = []
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read(self, name):
+        path = self.path(name)
+        stat = os.stat(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return stat.st_mtime_ns, stat.st_size, ConfigSnapshot(yaml.safe_load(f) or {})
+
+    def get(self, name) -> ConfigSnapshot:
+        """Current snapshot of a file under the config directory, e.g. 'ranked_percentages.yaml'."""
+        entry = self.files.get(name)
+        if entry is None:
+            with self.lock:
+                entry = self.files.get(name)
+                if entry is None:
+                    entry = self._read(name)
+                    self.files[name] = entry
+        return entry[2]
+
+    def use(self, section):
+        """Select the config.yaml section settings() returns (main, test, ...) instead of its 'use' key."""
+        self.section = section
+
+    def settings(self) -> ConfigSnapshot:
+        all_configs = self.get('config.yaml')
+        section = self.section or all_configs.get('use', 'main')
+        return all_configs[section]
+
+    def subscribe(self, callback):
+        """callback(file name, snapshot) after a file was reloaded; it runs on the watcher thread."""
+        self.listeners.append(callback)
+
+    def reload(self):
+        """Re-read the loaded files that changed on disk; returns their names."""
+        changed = []
+        for name, (mtime, size, _) in list(self.files.items()):
+            version = None
+            try:
+                stat = os.stat(self.path(name))
+                version = (stat.st_mtime_ns, stat.st_size)
+                if version == (mtime, size) or version == self.failed.get(name):
+                    continue
+                entry = self._read(name)
+            except (OSError, yaml.YAMLError) as e:
+                # logged once per broken version, retried when the file changes again
+                if version is not None:
+                    self.failed[name] = version
+                self.logger.error(f"Keeping the loaded {name}, could not reload it: {e}")
+                continue
+            self.failed.pop(name, None)
+            with self.lock:
+                self.files[name] = entry
+            changed.append(name)
+            self.logger.info(f"Reloaded {name}")
+            for callback in self.listeners:
+                try:
+                    callback(name, entry[2])
+                except Exception as e:
+                    self.logger.error(f"Error in config listener for {name}: {e}")
+        return changed
+
+    def watch(self, interval=5.0):
+        """Poll the loaded files for changes every interval seconds on a daemon thread."""
+        if self.watcher is not None and self.watcher.is_alive():
+            return
+        self.stop_event.clear()
+
+        def poll():
+            while not self.stop_event.wait(interval):
+                self.reload()
+
+        self.watcher = threading.Thread(target=poll, name='config-watcher', daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+service = ConfigService()
+
+
+def settings() -> ConfigSnapshot:
+    """Active section of config.yaml."""
+    return service.settings()
+
+
+def ranked_percentages() -> ConfigSnapshot:
+    return service.get('ranked_percentages.yaml')
+
+
+def emojis() -> ConfigSnapshot:
+    """Active section of emojis.yaml."""
+    all_emojis = service.get('emojis.yaml')
+    return all_emojis[all_emojis.get('use', 'main')]
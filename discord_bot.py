@@ -3,6 +3,7 @@ import difflib
 import json
 import logging
 import io
+import multiprocessing
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Union
 
@@ -13,31 +14,37 @@ from discord import app_commands, Button, ButtonStyle
 
 from file_processing import FileHandler
 from match_class import Match
+from match_replay import is_alive
+from match_time import to_epoch
+from match_watcher import MatchWatcher
+from ingest_worker import IngestWorker
 from player_in_match import PlayerInMatch
 from premium_members import PremiumMembers
 from views.votes_view import VotesView
+from win_prob_fit import match_history, fit_report
+from what_if import WhatIfSandbox, parse_overrides
+from modifier_report import modifier_contributions, attribution_report, GROUPS
+from rating_intervals import RatingIntervals
 
 from rapidfuzz import fuzz, process
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import aiohttp
-import yaml
 import sys
+from config_service import service as config_service, settings, emojis as emoji_settings
 
-with open(os.path.join('config', 'config.yaml'), 'r', encoding='utf-8') as f:
-    all_configs = yaml.safe_load(f)
-with open(os.path.join('config', 'emojis.yaml'), 'r', encoding='utf-8') as f:
-    all_emojis = yaml.safe_load(f)
+# Determine which config to use (main or test) from command-line or default to config.yaml's 'use'
+if len(sys.argv) > 1 and sys.argv[1] in config_service.get('config.yaml'):
+    config_service.use(sys.argv[1])
 
-# Determine which config to use (main or test) from command-line or default to 'main'
-if len(sys.argv) > 1 and sys.argv[1] in all_configs:
-    use_config = sys.argv[1]
-else:
-    use_config = all_configs['use'] if 'use' in all_configs else 'main'
+config = settings()
+emojis = emoji_settings()
 
-config = all_configs[use_config]
-emojis = all_emojis[all_emojis['use'] if 'use' in all_emojis else 'main']
+# Commands that read or edit the leaderboard; they are held back until the startup catch-up is done
+LEADERBOARD_COMMANDS = {"stats", "lb", "graph_mmr", "link", "unlink", "change_match", "update_lb",
+                        "mmr_change", "name_change", "replay_match", "season_stats", "fit_win_prob", "what_if",
+                        "modifier_report"}
 
 class DiscordBot(commands.Bot):
     def __init__(self, command_prefix='!', token=None, variables=None, **options):
@@ -74,7 +81,8 @@ class DiscordBot(commands.Bot):
         # init guild variables
         try:
             self.matches_path = self.config['matches_path']
-            self.channels = self.config['ranked_channels']
+            # channel members change at runtime, so the bot keeps its own mutable copy
+            self.channels = self.config['ranked_channels'].to_dict()
             self.guild_id = self.config['guild_id']
             self.match_logs = self.config['match_logs_channel']
             self.bot_commands = self.config['bot_commands_channel']
@@ -104,18 +112,20 @@ class DiscordBot(commands.Bot):
         self.version = "v1.3"
         self.token = token
 
+        # Rating constants (ranked_percentages.yaml) are picked up by the next match once the file changes;
+        # guild wiring read above still needs a restart
+        config_service.watch()
+
         # init subclasses
         self.file_handler = FileHandler(self.matches_path, self.season_name)
         self.leaderboard = self.file_handler.leaderboard
-
-        #check for unprocessed matches
-        self.logger.info(f"Loading all match files from{self.matches_path}")
-        match = self.file_handler.process_unprocessed_matches()
-        if match:
-            self.logger.info("Leaderboard has been updated")
-            self.leaderboard.load_leaderboard()
-        else:
-            self.logger.info("Leaderboard is already up to date")
+        self.match_watcher = MatchWatcher(self.file_handler)
+        # Unprocessed matches are caught up on the ingest thread once the bot starts (see start_bot)
+        self.ingest = IngestWorker()
+        self.what_if = WhatIfSandbox(self.leaderboard, self.file_handler.events_leaderboard,
+                                     k=lambda match_id: self.file_handler.special_matches.k_for(match_id, float('nan')))
+        self.rating_intervals = RatingIntervals(self.leaderboard, self.file_handler.events_leaderboard,
+                                                k=lambda match_id: self.file_handler.special_matches.k_for(match_id, float('nan')))
 
         # init bot
         intents = discord.Intents.default()
@@ -124,6 +134,7 @@ class DiscordBot(commands.Bot):
         intents.guilds = True
         intents.voice_states = True
         super().__init__(command_prefix=command_prefix, intents=intents, help_command=None, **options)
+        self.add_check(self.leaderboard_ready_check)
         self.add_commands()
         self.add_events()
         
@@ -131,6 +142,23 @@ class DiscordBot(commands.Bot):
         self.logger.info(f'Imported Database location from {self.season_name.replace(" ", "_")}_leaderboard.csv')
         self.logger.info(f'Guild ID is {self.guild_id}')
 
+    def catch_up_matches(self):
+        """Startup catch-up, runs on the ingest thread."""
+        self.logger.info(f"Loading all match files from{self.matches_path}")
+        match = self.file_handler.process_unprocessed_matches()
+        if match:
+            self.logger.info("Leaderboard has been updated")
+            self.leaderboard.load_leaderboard()
+        else:
+            self.logger.info("Leaderboard is already up to date")
+
+    async def leaderboard_ready_check(self, ctx:Context):
+        """Global command check: leaderboard commands wait until the startup catch-up has finished."""
+        if self.ingest.is_ready() or ctx.command is None or ctx.command.name not in LEADERBOARD_COMMANDS:
+            return True
+        await ctx.send("The leaderboard is still catching up on matches, please try again in a moment.", ephemeral=True)
+        return False
+
     def add_commands(self):
         @self.hybrid_command(name="stats", description = "Display Stats of yourself or a player")
         @app_commands.describe(player="Player name or @Player")
@@ -157,11 +185,11 @@ class DiscordBot(commands.Bot):
                 thumbnail = self.guild.icon.url if self.guild.icon else None
                 if player is None:
                     player_name = ctx.author.display_name
-                    player_row = self.leaderboard.get_player_by_discord(ctx.author.id)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, ctx.author.id)
                     thumbnail = ctx.author.avatar.url if ctx.author.avatar else ctx.author.default_avatar.url
                 elif player.startswith("<@"):
                     player_id = player.strip('<@!>')
-                    player_row = self.leaderboard.get_player_by_discord(player_id)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, player_id)
                     member = self.guild.get_member(int(player_id))
                     if member is None:
                         await ctx.send(f"Member not found.", ephemeral=True)
@@ -170,7 +198,7 @@ class DiscordBot(commands.Bot):
                     thumbnail = member.avatar.url if member.avatar else member.default_avatar.url
                 else:
                     player_name = player
-                    player_row = self.leaderboard.get_player_row(player_name)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_row, player_name)
                     if player_row is None:
                         await ctx.send(f"Player {player_name} not found.", ephemeral=True)
                         return
@@ -190,22 +218,27 @@ class DiscordBot(commands.Bot):
 
                 rank_emoji=emojis['ranks_emojis'].get(player_role, "")
                 ace_emoji=emojis['ranks_emojis'].get("Ace" if self.leaderboard.get_player_ranking(player_row)==1 else "", "")
-                sherlock_emoji=emojis['ranks_emojis'].get("Sherlock" if self.leaderboard.is_player_sherlock(player_name) else "", "") 
-                jack_emoji=emojis['ranks_emojis'].get("Jack" if self.leaderboard.is_player_jack_the_ripper(player_name) else "", "") 
+                sherlock_emoji=emojis['ranks_emojis'].get("Sherlock" if await self.ingest.run(self.leaderboard.is_player_sherlock, player_name) else "", "") 
+                jack_emoji=emojis['ranks_emojis'].get("Jack" if await self.ingest.run(self.leaderboard.is_player_jack_the_ripper, player_name) else "", "") 
                 
                 embed = discord.Embed(title=f"{rank_emoji}Player {player_name} Stats{rank_emoji}", color=discord.Color.purple())
                 embed.set_thumbnail(url=thumbnail)
 
+                def interval(column):
+                    bounds = self.leaderboard.get_player_mmr_interval(player_row, column)
+                    return f" ({bounds[0]:.0f}-{bounds[1]:.0f})" if bounds else ""
+
+                provisional = " (provisional)" if self.leaderboard.is_player_provisional(player_row) else ""
                 general_stats = (
-                    f"- **Rank:** {self.leaderboard.get_player_ranking(player_row)}\n"
-                    f"- **MMR:** {self.leaderboard.get_player_mmr(player_row)}\n"
+                    f"- **Rank:** {self.leaderboard.get_player_ranking(player_row)}{provisional}\n"
+                    f"- **MMR:** {self.leaderboard.get_player_mmr(player_row)}{interval('MMR')}\n"
                     f"- **Games Played:** {int(player_row['Total Number Of Games Played'])}\n"
                     f"- **Games Won:** {int(player_row['Number Of Games Won'])}\n"
                     f"- **Win Rate:** {round(self.leaderboard.get_player_win_rate(player_row), 1)}%"
                 )
                 
                 crew_stats = (
-                    f"- **MMR:** {self.leaderboard.get_player_crew_mmr(player_row)}\n"
+                    f"- **MMR:** {self.leaderboard.get_player_crew_mmr(player_row)}{interval('Crewmate MMR')}\n"
                     f"- **Games Played:** {int(player_row['Number Of Crewmate Games Played'])}\n"
                     f"- **Games Won:** {int(player_row['Number Of Crewmate Games Won'])}\n"
                     f"- **WinRate:** {round(self.leaderboard.get_player_crew_win_rate(player_row), 1)}%\n"
@@ -215,7 +248,7 @@ class DiscordBot(commands.Bot):
                 )
 
                 imp_stats = (
-                    f"- **MMR:** {self.leaderboard.get_player_imp_mmr(player_row)}\n"
+                    f"- **MMR:** {self.leaderboard.get_player_imp_mmr(player_row)}{interval('Impostor MMR')}\n"
                     f"- **Games Played:** {int(player_row['Number Of Impostor Games Played'])}\n"
                     f"- **Games Won:** {int(player_row['Number Of Impostor Games Won'])}\n"
                     f"- **WinRate:** {round(self.leaderboard.get_player_imp_win_rate(player_row), 1)}%\n"
@@ -255,17 +288,17 @@ class DiscordBot(commands.Bot):
 
             if type:
                 if type.startswith('imp'):
-                    top_players = self.leaderboard.top_players_by_impostor_mmr(length or 10)  
+                    top_players = await self.ingest.run(self.leaderboard.top_players_by_impostor_mmr, length or 10)  
                     title = f"{length or 10} Top Impostors"
                     color = discord.Color.red()
 
                 elif type.startswith('crew'):
-                    top_players = self.leaderboard.top_players_by_crewmate_mmr(length or 10)
+                    top_players = await self.ingest.run(self.leaderboard.top_players_by_crewmate_mmr, length or 10)
                     title = f"{length or 10} Top Crewmates"
                     color = discord.Color.green()
 
             else:
-                top_players = self.leaderboard.top_players_by_mmr(length or 10)
+                top_players = await self.ingest.run(self.leaderboard.top_players_by_mmr, length or 10)
                 title = f"{length or 10} Top Players Overall"
                 color = discord.Color.blue()
 
@@ -353,14 +386,14 @@ class DiscordBot(commands.Bot):
                 member = ctx.author
                 discord_id = ctx.author.id
                 player_name = ctx.author.display_name
-                player_row = self.leaderboard.get_player_by_discord(discord_id)
+                player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, discord_id)
                 
             elif player.startswith('<@'):  # If a mention is provided
                 try:
                     mentioned_id = int(player[2:-1])
                     member = ctx.guild.get_member(mentioned_id)
                     player_name = member.display_name
-                    player_row = self.leaderboard.get_player_by_discord(mentioned_id)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, mentioned_id)
                     
                 except Exception as e:
                     self.logger.error(e, mentioned_id)
@@ -369,24 +402,24 @@ class DiscordBot(commands.Bot):
                 
             else:  # If a display name is provided
                 player_name = player
-                player_row = self.leaderboard.get_player_row(player_name)
+                player_row = await self.ingest.run(self.leaderboard.get_player_row, player_name)
                 if player_row is None:
-                    player_row = self.leaderboard.get_player_row_lookslike(player_name)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_row_lookslike, player_name)
                     if player_row is None:
                             await ctx.channel.send(f"Player {player_name} not found.")
                             return
                 discord_id = self.leaderboard.get_player_discord(player_row)
                     
             if player_row is None:
-                player_row = self.leaderboard.get_player_row(player_name)
+                player_row = await self.ingest.run(self.leaderboard.get_player_row, player_name)
                 if player_row is None:
-                    player_row = self.leaderboard.get_player_row_lookslike(player_name)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_row_lookslike, player_name)
                     if player_row is None:
                         await ctx.channel.send(f"Player {player_name} not found.")
                         return
             player_name = player_row['Player Name']
 
-            mmr_changes, crew_changes, imp_changes = self.file_handler.events_leaderboard.fetch_mmr_changes(player_name)
+            mmr_changes, crew_changes, imp_changes = await self.ingest.run(self.file_handler.events_leaderboard.fetch_mmr_changes, player_name)
 
             impostor_mmr = config['impostor_current_mmr']
             crew_mmr = config['crewmate_current_mmr']
@@ -423,7 +456,7 @@ class DiscordBot(commands.Bot):
                 await ctx.send("Please provide a player name.")
                 return
 
-            player_row = self.leaderboard.get_player_row(player)
+            player_row = await self.ingest.run(self.leaderboard.get_player_row, player)
             player_discord = self.leaderboard.get_player_discord(player_row)
 
             if discord is None:
@@ -439,7 +472,7 @@ class DiscordBot(commands.Bot):
                 await ctx.send(f"Player {player} not found in the database.")
                 return
 
-            if self.leaderboard.add_player_discord(player, discord_id):
+            if await self.ingest.run(self.leaderboard.add_player_discord, player, discord_id):
                 await ctx.send(f"Linked {player} to <@{discord_id}> in the leaderboard.")
             else:
                 await ctx.send("Failed to link the player. Please try again later.")
@@ -453,19 +486,19 @@ class DiscordBot(commands.Bot):
 
             if player.startswith('<@'):  # unlinking a mention
                 discord_id = int(player[2:-1])
-                player_row = self.leaderboard.get_player_by_discord(discord_id)
+                player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, discord_id)
                 if player_row is not None:
-                    self.leaderboard.delete_player_discord(player_row['Player Name'])
+                    await self.ingest.run(self.leaderboard.delete_player_discord, player_row['Player Name'])
                     await ctx.send(f"Unlinked {player_row['Player Name']} from <@{discord_id}>")
                 else:
                     await ctx.send(f"{player} is not linked to any account")
 
             else:  # unlinking a player name
-                player_row = self.leaderboard.get_player_row(player)
+                player_row = await self.ingest.run(self.leaderboard.get_player_row, player)
                 if player_row is not None:
                     discord_id = self.leaderboard.get_player_discord(player_row)
                     if discord_id is not None:
-                        self.leaderboard.delete_player_discord(player)
+                        await self.ingest.run(self.leaderboard.delete_player_discord, player)
                         await ctx.send(f"Unlinked {player} from <@{discord_id}>")
                     else:
                         await ctx.send(f"Player {player} is not linked to any account")
@@ -494,7 +527,7 @@ class DiscordBot(commands.Bot):
                 await ctx.send(f"Cannot find match with ID: {match_id}")
                 return
 
-            changed_match, output = self.file_handler.change_match_result(match_id=match_id, new_result=result)
+            changed_match, output = await self.ingest.run(self.file_handler.change_match_result, match_id=match_id, new_result=result)
 
             if changed_match != False:
                 mentions = ""
@@ -519,7 +552,7 @@ class DiscordBot(commands.Bot):
                     await ctx.send("You don't have permission to use this command.", ephemeral=True)
                     return
                 member = ctx.author
-                match = self.file_handler.process_unprocessed_matches()
+                match = await self.ingest.run(self.file_handler.process_unprocessed_matches)
                 if match:
                     await ctx.send(f"{member.mention} Updated the Leaderboard!", ephemeral=True)
                 else:
@@ -528,6 +561,76 @@ class DiscordBot(commands.Bot):
                 await ctx.send(f"An error occurred: {str(e)}", ephemeral=True)
                 self.logger.error(f"Error in update_lb command: {str(e)}")
 
+        @self.hybrid_command(name="fit_win_prob", description="Fit the win probability curve to this season's matches")
+        async def fit_win_prob(ctx:Context):
+            try:
+                await ctx.defer(ephemeral=True)
+                if self.staff_role not in [role.id for role in ctx.author.roles]:
+                    await ctx.send("You don't have permission to use this command.", ephemeral=True)
+                    return
+                # the events are read and summarized on the ingest thread, the fit runs off the event loop
+                history = await self.ingest.run(lambda: match_history(self.file_handler.events_leaderboard.events_lb))
+                if len(history.match_id) < 10:
+                    await ctx.send("Not enough decided matches to fit the curve.", ephemeral=True)
+                    return
+                proposal, buf = await asyncio.to_thread(fit_report, history)
+                await ctx.send(f"```yaml\n{proposal}\n```", file=discord.File(buf, filename='win_prob_calibration.png'), ephemeral=True)
+            except Exception as e:
+                await ctx.send(f"An error occurred: {str(e)}", ephemeral=True)
+                self.logger.error(f"Error in fit_win_prob command: {str(e)}")
+
+        @self.hybrid_command(name="what_if", description="Re-rate the season with other MMR settings and compare with the leaderboard")
+        @app_commands.describe(changes="ranked_percentages values, e.g. crew_wrong_crit_penalty=0.3 k_factor=24")
+        async def what_if(ctx:Context, *, changes:str):
+            try:
+                await ctx.defer(ephemeral=True)
+                if self.staff_role not in [role.id for role in ctx.author.roles]:
+                    await ctx.send("You don't have permission to use this command.", ephemeral=True)
+                    return
+                try:
+                    overrides = parse_overrides(changes.replace(',', ' ').split())
+                except ValueError as e:
+                    await ctx.send(str(e), ephemeral=True)
+                    return
+                # the live data is only read on the ingest thread, the replay runs beside it
+                snapshot = await self.ingest.run(self.what_if.snapshot)
+                diff = await asyncio.to_thread(self.what_if.compare, overrides, snapshot)
+                movers = diff.reindex(diff['Rank Change'].abs().sort_values(ascending=False, kind='mergesort').index).head(10)
+                columns = ['Player Name', 'Rank', 'What-if Rank', 'MMR', 'What-if MMR']
+                text = (f"**What if** {', '.join(f'{name}={value:g}' for name, value in overrides.items())}\n"
+                        f"```\nTop 10\n{diff[columns].head(10).to_string(index=False, float_format=lambda x: f'{x:.1f}')}\n\n"
+                        f"Biggest moves\n{movers[columns].to_string(index=False, float_format=lambda x: f'{x:.1f}')}\n```")
+                buf = io.BytesIO(diff.to_csv(index=False).encode())
+                await ctx.send(text[:2000], file=discord.File(buf, filename='what_if.csv'), ephemeral=True)
+            except Exception as e:
+                await ctx.send(f"An error occurred: {str(e)}", ephemeral=True)
+                self.logger.error(f"Error in what_if command: {str(e)}")
+
+        @self.hybrid_command(name="modifier_report", description="Show how much MMR each modifier moved this season")
+        @app_commands.describe(by="Split by team, tier or window (weekly)")
+        async def modifier_report(ctx:Context, by:Optional[str] = None):
+            try:
+                await ctx.defer(ephemeral=True)
+                if self.staff_role not in [role.id for role in ctx.author.roles]:
+                    await ctx.send("You don't have permission to use this command.", ephemeral=True)
+                    return
+                if by is not None and by.lower() not in GROUPS:
+                    await ctx.send(f"Choose one of: {', '.join(GROUPS)}", ephemeral=True)
+                    return
+                by = by.lower() if by else None
+                window = '7d' if by == 'window' else None
+                contributions = await self.ingest.run(lambda: modifier_contributions(self.file_handler.events_leaderboard.events_lb,
+                                                                                     window=window))
+                report = attribution_report(contributions, by)
+                columns = ([by] if by else []) + ['Label', 'Rows', 'MMR', 'Share']
+                text = report[columns].to_string(index=False, float_format=lambda x: f"{x:.2f}")
+                buf = io.BytesIO(report.to_csv(index=False).encode())
+                await ctx.send(f"**MMR moved per modifier** (role MMR)\n```\n{text[:1800]}\n```",
+                               file=discord.File(buf, filename='modifier_report.csv'), ephemeral=True)
+            except Exception as e:
+                await ctx.send(f"An error occurred: {str(e)}", ephemeral=True)
+                self.logger.error(f"Error in modifier_report command: {str(e)}")
+
         @self.hybrid_command(name="m", description="Mute all players but yourself in a Voice Channel")
         async def m(ctx: Context):
             if not any(role.id in [self.moderator_role, self.staff_role] for role in ctx.author.roles):
@@ -661,9 +764,9 @@ class DiscordBot(commands.Bot):
                 
                 if player.startswith('<@'):  # unlinking a mention
                     discord_id = int(player[2:-1])
-                    player_row = self.leaderboard.get_player_by_discord(discord_id)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, discord_id)
                 else:
-                    player_row = self.leaderboard.get_player_row(player)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_row, player)
 
                 if player_row is None:
                     await ctx.send(f"Player {player} not found.")
@@ -690,13 +793,13 @@ class DiscordBot(commands.Bot):
 
                 mmr_change_text = ""
                 if change_type and change_type.startswith("crew"):
-                    self.file_handler.leaderboard.mmr_change_crew(player_row, mmr_change_value)
+                    await self.ingest.run(self.file_handler.leaderboard.mmr_change_crew, player_row, mmr_change_value)
                     mmr_change_text = "Crew "
                 elif change_type and change_type.startswith("imp"):
-                    self.file_handler.leaderboard.mmr_change_imp(player_row, mmr_change_value)
+                    await self.ingest.run(self.file_handler.leaderboard.mmr_change_imp, player_row, mmr_change_value)
                     mmr_change_text = "Impostor "
                 else:
-                    self.file_handler.leaderboard.mmr_change(player_row, mmr_change_value)
+                    await self.ingest.run(self.file_handler.leaderboard.mmr_change, player_row, mmr_change_value)
 
                 if mmr_change_value > 0:
                     await ctx.send(f"Added {mmr_change_value} {mmr_change_text} MMR to Player {player_name}")
@@ -720,9 +823,9 @@ class DiscordBot(commands.Bot):
                     await ctx.send("You don't have permission to change a player's name.")
                     return
                     
-                found_old_player = self.leaderboard.get_player_row(old_name)
+                found_old_player = await self.ingest.run(self.leaderboard.get_player_row, old_name)
                 if found_old_player is not None and not found_old_player.empty:
-                    self.file_handler.change_player_name(old_name, new_name)
+                    await self.ingest.run(self.file_handler.change_player_name, old_name, new_name)
                     await ctx.send(f'Changed player name from {old_name} to {new_name}')
                     await self.get_channel(self.admin_logs_channel).send(f'{ctx.author.mention} Changed player name from {old_name} to {new_name}')
                 else:
@@ -802,7 +905,7 @@ class DiscordBot(commands.Bot):
             if match_id == None: 
                 return
             match_file = self.file_handler.find_matchfile_by_id(int(match_id))
-            match = self.file_handler.match_from_file(match_file)
+            match = await self.ingest.run(self.file_handler.stored_match, match_file)
             end_embed = self.end_game_embed(match)
             events_embed = self.events_embed(match)
             view = VotesView(embed=events_embed)
@@ -1854,7 +1957,8 @@ class DiscordBot(commands.Bot):
             if not os.path.exists(leaderboard_path):
                 await ctx.send("No leaderboard file found.")
                 return
-            df = pd.read_csv(events_path)
+            # a copy taken on the ingest thread, which appends to the events while matches come in
+            df = await self.ingest.run(lambda: self.file_handler.events_leaderboard.events_lb.copy())
             lb = pd.read_csv(leaderboard_path)
 
             # --- Timeframe Filtering ---
@@ -1873,8 +1977,7 @@ class DiscordBot(commands.Bot):
                     else:
                         await ctx.send("Invalid timeframe format. Use e.g. '7d' for 7 days, '30d' for 30 days, or 'all'.")
                         return
-                    df['Match Start Time'] = pd.to_datetime(df['Match Start Time'], errors='coerce', dayfirst=True)
-                    filtered_df = df[df['Match Start Time'] >= cutoff]
+                    filtered_df = df[df['Match Start Epoch'] >= to_epoch(cutoff)]
                     timeframe_str = f"Last {timeframe}"
                 except Exception as e:
                     await ctx.send(f"Error parsing timeframe: {e}")
@@ -2073,7 +2176,6 @@ class DiscordBot(commands.Bot):
             await asyncio.sleep(1)
             # await self.queue_manager.initialize_queue_embed()
             await self.get_members_in_channel()
-            await self.update_leaderboard_discords()
             await self.download_player_icons()
             
             try:
@@ -2087,6 +2189,12 @@ class DiscordBot(commands.Bot):
                 self.check_vip_balances.start()
             self.logger.info(f'Ranked Among Us Bot has started!')
 
+            # Discord links are written to the leaderboard, so wait for the startup catch-up first
+            await self.ingest.wait_ready()
+            await self.update_leaderboard_discords()
+            if not self.refresh_rating_intervals.is_running():
+                self.refresh_rating_intervals.start()
+
         @self.event
         async def on_voice_state_update(member:discord.Member, before:discord.VoiceState, after:discord.VoiceState):
             # await self.queue_manager.handle_voice_state_update(member, before, after)
@@ -2137,6 +2245,19 @@ class DiscordBot(commands.Bot):
                 df = df.drop(index)
         df.to_csv('rank_blocks.csv', index=False)
 
+    @tasks.loop(minutes=30)
+    async def refresh_rating_intervals(self):
+        """Re-bootstrap the MMR intervals of players who played since the last refresh"""
+        try:
+            job = await self.ingest.run(self.rating_intervals.prepare)
+            if job is None:
+                return
+            results = await asyncio.to_thread(self.rating_intervals.compute, job)
+            refreshed = await self.ingest.run(self.rating_intervals.store, results)
+            self.logger.info(f"Refreshed the MMR intervals of {refreshed} players")
+        except Exception as e:
+            self.logger.error(f"Error in refresh_rating_intervals task: {str(e)}")
+
     def cog_unload(self):
         self.check_vip_balances.cancel()
 
@@ -2145,7 +2266,8 @@ class DiscordBot(commands.Bot):
         os.makedirs(icons_dir, exist_ok=True)
         async with aiohttp.ClientSession() as session:
             tasks = []
-            for _, row in self.leaderboard.leaderboard.iterrows():
+            leaderboard = await self.ingest.run(lambda: self.leaderboard.leaderboard.copy())
+            for _, row in leaderboard.iterrows():
                 discord_id = row.get('Player Discord')
                 if discord_id and discord_id != 0:
                     member = self.guild.get_member(int(discord_id))
@@ -2174,9 +2296,11 @@ class DiscordBot(commands.Bot):
 
     async def update_leaderboard_discords(self):
         # await self.validate_and_update_existing_discords()
-        await self.add_missing_discords()
-        await self.match_and_add_discords()
-        self.leaderboard.save()
+        # guild members are read here, the leaderboard is only touched on the ingest thread
+        members = [(member.display_name, member.id) for member in self.guild.members]
+        await self.ingest.run(self.add_missing_discords, members)
+        await self.ingest.run(self.match_and_add_discords, members)
+        await self.ingest.run(self.leaderboard.save)
 
     async def validate_and_update_existing_discords(self):
         valid_ids = {member.id for member in self.guild.members}
@@ -2192,15 +2316,15 @@ class DiscordBot(commands.Bot):
         else:
             self.logger.info("All Discord IDs in the leaderboard are valid.")
 
-    async def add_missing_discords(self):
-        member_dict = {member.display_name: member.id for member in self.guild.members}
+    def add_missing_discords(self, members):
+        member_dict = {display_name: member_id for display_name, member_id in members}
         missing_discords = self.leaderboard.leaderboard[self.leaderboard.leaderboard['Player Discord'].isnull()]
         for player_name in missing_discords['Player Name']:
             if player_name in member_dict:
                 self.leaderboard.add_player_discord(player_name, member_dict[player_name])
                 self.logger.info(f"Added {player_name} to leaderboard with Discord ID from guild.")
 
-    async def match_and_add_discords(self):
+    def match_and_add_discords(self, members):
         players_with_empty_discord = self.leaderboard.players_with_empty_discord()
         if players_with_empty_discord is None:
             return
@@ -2214,20 +2338,21 @@ class DiscordBot(commands.Bot):
             player_name_normalized = player_name.lower().replace(" ", "")
             best_match = None
             best_score = 0
-            for member in self.guild.members:
-                member_display_name = member.display_name.lower().replace(" ", "")
+            for display_name, member_id in members:
+                member_display_name = display_name.lower().replace(" ", "")
                 match_score = fuzz.token_sort_ratio(player_name_normalized, member_display_name)
                 if match_score > best_score and match_score >= 80:
-                    best_match = member
+                    best_match = (display_name, member_id)
                     best_score = match_score
 
             if best_match:
-                self.leaderboard.add_player_discord(player_name, best_match.id)
-                self.logger.info(f"Added {best_match.display_name} to {player_name} in leaderboard")
+                self.leaderboard.add_player_discord(player_name, best_match[1])
+                self.logger.info(f"Added {best_match[0]} to {player_name} in leaderboard")
             else:
-                self.logger.warning(f"Can't find a discord match for player {player_name} in {self.guild.name}")
+                self.logger.warning(f"Can't find a discord match for player {player_name} in the guild")
 
-    def start_game_embed(self, json_data) -> discord.Embed:
+    def start_game_embed(self, json_data, player_rows) -> discord.Embed:
+        """player_rows: leaderboard row (or None) of every player, read on the ingest thread."""
         players = json_data.get("Players", [])
         player_colors = json_data.get("PlayerColors", [])
         match_id = json_data.get("MatchID", "")
@@ -2236,8 +2361,7 @@ class DiscordBot(commands.Bot):
         
         embed = discord.Embed(title=f"Ranked Match Started", description=f"Match ID: {match_id} - Code: {game_code}\n Players:", color=discord.Color.dark_purple())
 
-        for player_name, player_color in zip(players, player_colors): 
-            player_row = self.leaderboard.get_player_row(player_name)
+        for player_name, player_color, player_row in zip(players, player_colors, player_rows): 
             player_discord_id = self.leaderboard.get_player_discord(player_row)
             color_emoji = emojis['default_color_emojis'].get(player_color, ":question:")
             value = color_emoji
@@ -2339,70 +2463,49 @@ class DiscordBot(commands.Bot):
         return embed  
 
     def events_embed(self, match:Match) -> discord.Embed:
+        """Render the match's replay snapshots (see match_replay) round by round."""
         player:PlayerInMatch
-        for player in match.players:
-            player.tasks_complete = 0
-            if player.team == "impostor": 
-                player.color +=100
         votes_embed = discord.Embed(title=f"Match ID: {match.id} - Events", description="")
-        events_df = pd.read_json(os.path.join(self.matches_path, match.event_file_name), typ='series')
-        
-        meeting_count = 0
+
+        def color_emoji(player, dead=False):
+            color = player.color + (100 if player.team == "impostor" else 0) + (200 if dead else 0)
+            return emojis['default_color_emojis'].get(color, "?")
+
+        tasks_complete = {}
         meeting_end = False
         meeting_start = False
 
-        events_embed = f"__**Round {meeting_count+1} Actions**__\n"
-        for event in events_df:
-            event_type = event.get('Event')
-            for key in ['Name', 'Player', 'Target', 'Killer']:
-                if key in event:
-                    if event[key].endswith(" |"):
-                        event[key] = event[key][:-2] 
+        events_embed = f"__**Round 1 Actions**__\n"
+        for snapshot in match.snapshots:
+            event_type = snapshot.event_type
+            player = snapshot.player
                 
             if event_type == "Task":
-                player = match.get_player_by_name(event.get('Name'))
-                player.finished_task()
-                if player.tasks_complete == 10:
-                    color_emoji = emojis['default_color_emojis'].get(player.color, "?")
-                    events_embed += f"{color_emoji} Tasks {emojis['done_emoji']} {'Alive' if player.alive else 'Dead'}\n"
+                if player.team.lower() != "crewmate":
+                    continue
+                tasks_complete[player.name] = tasks_complete.get(player.name, 0) + 1
+                if tasks_complete[player.name] == 10:
+                    events_embed += f"{color_emoji(player)} Tasks {emojis['done_emoji']} {'Alive' if is_alive(match, snapshot, player) else 'Dead'}\n"
 
             elif event_type == "PlayerVote":
-                player = match.get_player_by_name(event.get('Player'))
-                target = match.get_player_by_name(event.get('Target'))
-                player_emoji = emojis['default_color_emojis'].get(player.color, "?")
-                if target == None:
-                    events_embed += f" {player_emoji} Skipped\n"
+                if snapshot.target == None:
+                    events_embed += f" {color_emoji(player)} Skipped\n"
                 else:
-                    target_emoji = emojis['default_color_emojis'].get(target.color, "?")
-                    events_embed += f" {player_emoji} voted {target_emoji}\n"
+                    events_embed += f" {color_emoji(player)} voted {color_emoji(snapshot.target)}\n"
                     
             elif event_type == "Death":
-                player = match.get_player_by_name(event.get('Name'))
-                killer = match.get_player_by_name(event.get('Killer'))
-                player_emoji = emojis['default_color_emojis'].get(player.color+200, "?")
-                killer_emoji = emojis['default_color_emojis'].get(killer.color, "?")
-                events_embed += f" {killer_emoji} {emojis['kill_emoji']} {player_emoji}\n"
+                events_embed += f" {color_emoji(snapshot.target)} {emojis['kill_emoji']} {color_emoji(player, dead=True)}\n"
                 
             elif event_type == "BodyReport":
-                player = match.get_player_by_name(event.get('Player'))
-                dead_player = match.get_player_by_name(event.get('DeadPlayer'))
-                player_emoji = emojis['default_color_emojis'].get(player.color, "?")
-                dead_emoji = emojis['default_color_emojis'].get(dead_player.color+200, "?")
-                events_embed += f" {player_emoji} {emojis['report_emoji']} {dead_emoji}\n"
+                events_embed += f" {color_emoji(player)} {emojis['report_emoji']} {color_emoji(snapshot.target, dead=True)}\n"
                 meeting_start = True
-                meeting_count+=1
                 
             elif event_type == "MeetingStart":
-                player = match.get_player_by_name(event.get('Player'))
-                player_emoji = emojis['default_color_emojis'].get(player.color, "?")
-                events_embed += f" {player_emoji} {emojis['emergency_emoji']} Meeting\n"
+                events_embed += f" {color_emoji(player)} {emojis['emergency_emoji']} Meeting\n"
                 meeting_start = True
-                meeting_count+=1
                 
             elif event_type == "Exiled":
-                ejected_player = match.get_player_by_name(event.get('Player'))
-                ejected_emoji = emojis['default_color_emojis'].get(ejected_player.color, "?")
-                events_embed += f"{ejected_emoji} __was **Ejected**__\n"
+                events_embed += f"{color_emoji(player)} __was **Ejected**__\n"
                 meeting_end = True
                 events_embed += f"Meeting End\n"
             
@@ -2415,15 +2518,13 @@ class DiscordBot(commands.Bot):
                 break
 
             elif event_type == "Disconnect":
-                disconnected_player = match.get_player_by_name(event.get('Name'))
-                disconnected_emoji = emojis['default_color_emojis'].get(disconnected_player.color, "?")
-                events_embed += f"{disconnected_emoji}{'__** Disconnected Alive**__' if disconnected_player.alive else 'Disconnected Dead'}\n"
+                events_embed += f"{color_emoji(player)}{'__** Disconnected Alive**__' if is_alive(match, snapshot, player) else 'Disconnected Dead'}\n"
                 
             elif event_type == "MeetingEnd":
-                if (event.get("Result") == "Exiled"):
+                if (snapshot.event.get("result") == "Exiled"):
                     continue
 
-                elif (event.get("Result") == "Tie"):
+                elif (snapshot.event.get("result") == "Tie"):
                     events_embed += f"__**Votes Tied**__\n"
                 else:
                     events_embed += f"__**Skipped**__\n"
@@ -2435,11 +2536,11 @@ class DiscordBot(commands.Bot):
                     self.logger.error(events_embed)
                 votes_embed.add_field(name = "", value=events_embed, inline=True)
                 events_embed = ""
-                events_embed += f"__**Round {meeting_count+1} Actions**__\n"
+                events_embed += f"__**Round {snapshot.meeting+1} Actions**__\n"
                 meeting_end = False 
 
             elif meeting_start == True:
-                events_embed += f"__Meeting #{meeting_count}__\n"
+                events_embed += f"__Meeting #{snapshot.meeting+1}__\n"
                 meeting_start = False
 
         
@@ -2493,21 +2594,25 @@ class DiscordBot(commands.Bot):
             if best_match is not None:
                 self.logger.debug(f"found {best_match[1].display_name}")
                 player_name, member = best_match
-                player_row = self.leaderboard.get_player_row(player_name)
-
-                if player_row is None:
-                    self.logger.info(f"Player {player_name} was not found in the leaderboard, creating a new player")
-                    self.leaderboard.new_player(player_name)
-                    self.leaderboard.add_player_discord(player_name, member.id)
-                    self.leaderboard.save()
-
-                if self.leaderboard.get_player_discord(player_row) is None:
-                    self.logger.info(f"Player {player_name} has no discord in the leaderboard, adding discord {member.id}")
-                    self.leaderboard.add_player_discord(player_name, member.id)
-                    self.leaderboard.save()
+                await self.ingest.run(self.add_player_discord_if_missing, player_name, member.id)
             else:
                 self.logger.error(f"Can't find a match a player for member {member.display_name}")
 
+    def add_player_discord_if_missing(self, player_name, discord_id):
+        """Leaderboard side of add_players_discords, runs on the ingest thread."""
+        player_row = self.leaderboard.get_player_row(player_name)
+
+        if player_row is None:
+            self.logger.info(f"Player {player_name} was not found in the leaderboard, creating a new player")
+            self.leaderboard.new_player(player_name)
+            self.leaderboard.add_player_discord(player_name, discord_id)
+            self.leaderboard.save()
+
+        if self.leaderboard.get_player_discord(player_row) is None:
+            self.logger.info(f"Player {player_name} has no discord in the leaderboard, adding discord {discord_id}")
+            self.leaderboard.add_player_discord(player_name, discord_id)
+            self.leaderboard.save()
+
     async def handle_game_start(self, json_data):
         match_id = json_data.get("MatchID", "")
         game_code = json_data.get("GameCode", "")
@@ -2530,7 +2635,9 @@ class DiscordBot(commands.Bot):
                 await self.game_start_automute(game_channel)
             text_channel_id = game_channel['text_channel_id']
             await self.add_players_discords(json_data, game_channel)
-            embed = self.start_game_embed(json_data)
+            players = json_data.get("Players", [])
+            player_rows = await self.ingest.run(lambda: [self.leaderboard.get_player_row(player) for player in players])
+            embed = self.start_game_embed(json_data, player_rows)
             text_channel = self.get_channel(text_channel_id)
             if text_channel:
                 await text_channel.send(embed=embed)
@@ -2796,17 +2903,17 @@ class DiscordBot(commands.Bot):
             if special_role:
                 current_holders = special_role.members
                 for member in current_holders:
-                    player_row = self.leaderboard.get_player_by_discord(member.id)
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, member.id)
                     if player_row is not None:
-                        has_role = check_function(player_row['Player Name'])
+                        has_role = await self.ingest.run(check_function, player_row['Player Name'])
                         if not has_role:
                             await member.remove_roles(special_role)
                             self.logger.info(f"Removed {special_role.name} from {member.display_name}")
 
                 # Check if any member in the members list now qualifies for the special roles
                 for member in members:
-                    player_row = self.leaderboard.get_player_by_discord(member.id)
-                    qualifies_for_role = check_function(player_row['Player Name'])
+                    player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, member.id)
+                    qualifies_for_role = await self.ingest.run(check_function, player_row['Player Name'])
                     if qualifies_for_role and special_role not in member.roles:
                         await member.add_roles(special_role)
                         self.logger.info(f"Added {special_role.name} to {member.display_name}")
@@ -2822,7 +2929,7 @@ class DiscordBot(commands.Bot):
 
         # Then, handle ranked roles for the provided members
         for member in members:
-            player_row = self.leaderboard.get_player_by_discord(member.id)
+            player_row = await self.ingest.run(self.leaderboard.get_player_by_discord, member.id)
             if player_row is not None:
                 player_mmr = player_row['MMR']
                 current_ranked_roles = [role for role in member.roles if role.name.startswith("Ranked |")]
@@ -2890,19 +2997,14 @@ class DiscordBot(commands.Bot):
             else:
                 self.logger.error(f"Failed to log VIP Match {match_id}: {msg}")
         
+        # Wait for the match and events files to be fully written, then process once
+        if await self.match_watcher.wait_ready(match_id, timeout=10) is None:
+            self.logger.warning(f"Match {match_id} was not loaded correctly")
+
         # Process match with appropriate K value
-        last_match = self.file_handler.process_match_by_id(match_id, k=k_value)
+        last_match = await self.ingest.run(self.file_handler.process_match_by_id, match_id, k=k_value)
         if last_match.crewmates_count != 8:
             return
-        
-        for i in range(10):
-            if last_match.result == "Unknown":
-                await asyncio.sleep(1)
-                last_match = self.file_handler.process_match_by_id(match_id, k=k_value)
-                if i == 9:
-                    self.logger.warning(f"Match {match_id} was not loaded correctly")
-            else:
-                break
 
         end_embed = self.end_game_embed(last_match, json_data)
         events_embed = self.events_embed(last_match)
@@ -3034,6 +3136,8 @@ class DiscordBot(commands.Bot):
             await server.serve_forever()
 
     async def start_bot(self):
+        self.match_watcher.start(asyncio.get_running_loop())
+        self.ingest.start_catch_up(self.catch_up_matches)
         await asyncio.gather(
             self.start_server(),
             super().start(self.token)
@@ -3122,6 +3226,8 @@ class DiscordBot(commands.Bot):
 
 if __name__ == "__main__":
     # Usage: python discord_bot.py [main|test]
+    # Needed for the season rebuild process pool in PyInstaller builds
+    multiprocessing.freeze_support()
     bot = DiscordBot(token=config['token'], variables=config)
     import asyncio
     asyncio.run(bot.start_bot())
\ No newline at end of file
@@ -2,18 +2,135 @@ import pandas as pd
 import os
 from player_in_match import PlayerInMatch
 from match_class import Match
+from match_replay import replay_events
 from leaderboard import Leaderboard
 from leaderboard_events import EventsLeaderboard
+from match_catalog import MatchCatalog
+from checkpoints import CheckpointStore
+from match_rerate import MatchReRater
+from match_cache import MatchCache
+from match_time import parse_time, to_epoch, duration_seconds
+from special_matches import get_special_match_index
+from config_service import ranked_percentages, settings
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from contextlib import contextmanager, nullcontext
 import json
+import time
 import logging
-import yaml
 
-# Load config from YAML
-with open(os.path.join('config', 'config.yaml'), 'r', encoding='utf-8') as f:
-    all_configs = yaml.safe_load(f)
-use_config = all_configs['use'] if 'use' in all_configs else 'main'
-config = all_configs[use_config]
+
+logger = logging.getLogger('FileHandler')
+
+def read_match_header(path, json_file):
+    # Load match JSON and normalize keys to lowercase
+    match_path = os.path.join(path, json_file)
+    with open(match_path, 'r', encoding='utf-8') as f:
+        match_obj = json.load(f)
+    return {str(k).lower(): v for k, v in match_obj.items()}
+
+def read_match_events(path, events_file):
+    # Load events JSON and normalize keys to lowercase
+    events_path = os.path.join(path, events_file)
+    with open(events_path, 'r', encoding='utf-8') as f:
+        events_raw = json.load(f)
+    if isinstance(events_raw, list):
+        return [{str(k).lower(): v for k, v in ev.items()} for ev in events_raw]
+    elif isinstance(events_raw, dict):
+        # Some files might be dict of events
+        return [{str(k).lower(): v for k, v in events_raw.items()}]
+    else:
+        return []
+
+def read_match_source(path, json_file):
+    match_norm = read_match_header(path, json_file)
+    return match_norm, read_match_events(path, match_norm.get('eventslogfile'))
+
+match_caches = {}
+
+def read_match_json(path, json_file, cache_dir=None):
+    """Return the normalized match header (as a Series) and events of json_file,
+    going through the compiled MatchCache when cache_dir is given."""
+    if cache_dir is None:
+        match_norm, events_norm = read_match_source(path, json_file)
+    else:
+        if cache_dir not in match_caches:
+            match_caches[cache_dir] = MatchCache(cache_dir)
+        match_norm, events_norm = match_caches[cache_dir].load(path, json_file, read_match_header, read_match_events)
+
+    match_df = pd.Series(match_norm)
+    events_df = events_norm
+    return match_df, events_df
+
+def replay_match(match_df, events_df, k=None) -> Match:
+    """Build a Match from its match/events data and replay the events, without touching the leaderboard."""
+    player:PlayerInMatch
+    logger.debug(f"Filling Match {match_df['matchid']} object from the events file")
+    match = Match(id=match_df['matchid'], match_start_time=match_df['gamestarted'],
+                  result=match_df['result'], event_file_name=match_df['eventslogfile'], players = [], k=k)
+
+    players_array = [x.strip() for x in match_df['players'].split(',')]
+    impostors_array = [x.strip() for x in match_df['impostors'].split(",")]
+    match.impostors = str(impostors_array)
+    for player_name in players_array:
+        team = "impostor" if player_name in impostors_array else "crewmate"
+        match.add_player(PlayerInMatch(name=player_name, team=team))
+
+    for player in match.players:
+        player.won = (player.team.lower() == 'crewmate' and match.result.lower() in ["crewmates win", "humansbyvote", "humansbytask"]) or \
+                    (player.team.lower() == 'impostor' and match.result.lower().startswith("impostor"))
+
+    match.match_end_time = match_df['gamestarted']
+    players_alive = len(players_array)
+    imps_alive = len(impostors_array)
+
+    match.crewmates_count = players_alive - imps_alive
+    match.impostors_count = imps_alive
+
+    match.snapshots, state = replay_events(match, events_df, players_alive, imps_alive)
+    players_alive = state.players_alive
+    imps_alive = state.imps_alive
+
+    match_start_time = parse_time(match.match_start_time)
+    match_end_time = parse_time(match.match_end_time)
+    match.match_duration = str(match_end_time - match_start_time)
+    match.start_epoch = to_epoch(match_start_time)
+    match_seconds = duration_seconds(match_end_time - match_start_time)
+    for player in match.players:
+        player.match_id = match.id
+        player.match_result = match.result
+        player.total_rounds = match.rounds
+        player.voting_accuracy = player.number_of_correct_votes / (player.number_of_placed_votes - player.number_of_skip_votes) if player.team == 'crewmate' and (player.number_of_placed_votes - player.number_of_skip_votes) != 0 else 0
+        if player.time_of_death is None:
+            player.time_of_death = match.match_end_time
+        time_of_death = parse_time(player.time_of_death)
+        player.alive_time = str(time_of_death - match_start_time)
+        player.alive_seconds = duration_seconds(time_of_death - match_start_time)
+        player.match_time = match.match_duration
+        player.match_seconds = match_seconds
+        if player.match_result == "Impostors Win" and player.solo_imp:
+            player.won_as_solo_imp = True
+    match.alive_players = players_alive
+    match.alive_impostors = imps_alive
+    for player in match.players:
+        if match.get_player_by_name(player.name).rounds_survived == 0:
+            match.get_player_by_name(player.name).rounds_survived = match.rounds
+    return match
+
+def replay_match_file(matches_path, json_file, k=None, cache_dir=None):
+    """Process pool stage of a rebuild: read and replay one match file.
+    Returns (json_file, match or None, error message, (read seconds, replay seconds))."""
+    start = time.perf_counter()
+    read_seconds = 0.0
+    try:
+        match_df, events_df = read_match_json(matches_path, json_file, cache_dir)
+        read_seconds = time.perf_counter() - start
+        match = replay_match(match_df, events_df, k=k)
+    except Exception as e:
+        return json_file, None, str(e), (read_seconds, time.perf_counter() - start - read_seconds)
+    match.match_file_name = json_file
+    return json_file, match, None, (read_seconds, time.perf_counter() - start - read_seconds)
 
 class FileHandler:
     def __init__(self, matches_path, season_name:str):
@@ -27,47 +144,18 @@ class FileHandler:
         self.matches_path = os.path.expanduser(matches_path)
         self.leaderboard = Leaderboard(f"{self.season_name}_leaderboard.csv")
         self.events_leaderboard = EventsLeaderboard(f"{self.season_name}_events.csv")
-        self.special_matches_file = config['special_matches_file']  # Add this line
+        self.special_matches_file = settings().special_matches_file  # Add this line
+        self.special_matches = get_special_match_index(self.special_matches_file)
+        self.match_cache_dir = f"{self.season_name}_match_cache"
+        self.catalog = MatchCatalog(self.matches_path, f"{self.season_name}_match_catalog.json", self.parse_time)
+        self.checkpoints = CheckpointStore(f"{self.season_name}_checkpoints", settings().get('checkpoint_interval', 100))
+        self.rerater = MatchReRater(self)
 
     def parse_time(self, time_str):
-        """Parse time robustly; if missing or malformed, return a safe minimal datetime."""
-        if not time_str:
-            self.logger.warning("Missing game start time; defaulting to minimal datetime")
-            return datetime.min
-
-        time_formats = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %I:%M:%S %p"]
-        for time_format in time_formats:
-            try:
-                return datetime.strptime(str(time_str), time_format)
-            except ValueError:
-                continue
-
-        self.logger.warning(f"Time format not recognized: {time_str}; defaulting to minimal datetime")
-        return datetime.min
+        return parse_time(time_str)
 
     def df_from_json(self, path, json_file):
-        # Load match JSON and normalize keys to lowercase
-        match_path = os.path.join(path, json_file)
-        with open(match_path, 'r', encoding='utf-8') as f:
-            match_obj = json.load(f)
-        match_norm = {str(k).lower(): v for k, v in match_obj.items()}
-
-        # Load events JSON and normalize keys to lowercase
-        events_file = match_norm.get('eventslogfile')
-        events_path = os.path.join(path, events_file)
-        with open(events_path, 'r', encoding='utf-8') as f:
-            events_raw = json.load(f)
-        if isinstance(events_raw, list):
-            events_norm = [{str(k).lower(): v for k, v in ev.items()} for ev in events_raw]
-        elif isinstance(events_raw, dict):
-            # Some files might be dict of events
-            events_norm = [{str(k).lower(): v for k, v in events_raw.items()}]
-        else:
-            events_norm = []
-
-        match_df = pd.Series(match_norm)
-        events_df = events_norm
-        return match_df, events_df
+        return read_match_json(path, json_file, self.match_cache_dir)
 
     def get_players_info_from_leaderboard(self, match : Match):
         players = match.players
@@ -85,176 +173,30 @@ class FileHandler:
             player.impostor_current_mmr = self.leaderboard.get_player_imp_mmr(player_row)
             player.discord = self.leaderboard.get_player_discord(player_row)
 
-    def match_from_dataframe(self, match_df, events_df, k=32) -> Match:
-        player:PlayerInMatch
-        self.logger.debug(f"Filling Match {match_df['matchid']} object from the events file")
-        match = Match(id=match_df['matchid'], match_start_time=match_df['gamestarted'],
-                      result=match_df['result'], event_file_name=match_df['eventslogfile'], players = [], k=k)
-
-        players_array = [x.strip() for x in match_df['players'].split(',')]
-        impostors_array = [x.strip() for x in match_df['impostors'].split(",")]
-        match.impostors = str(impostors_array)
-        for player_name in players_array:
-            team = "impostor" if player_name in impostors_array else "crewmate"
-            match.add_player(PlayerInMatch(name=player_name, team=team))
-
+    def match_from_dataframe(self, match_df, events_df, k=None) -> Match:
+        match = replay_match(match_df, events_df, k=k)
         self.get_players_info_from_leaderboard(match)
-        for player in match.players:
-            player.won = (player.team.lower() == 'crewmate' and match.result.lower() in ["crewmates win", "humansbyvote", "humansbytask"]) or \
-                        (player.team.lower() == 'impostor' and match.result.lower().startswith("impostor"))
+        return match
 
-        death_happened = False
-        meeting_called_after_death = False
-        match.match_end_time = match_df['gamestarted']
-        players_alive = len(players_array)
-        imps_alive = len(impostors_array)
+    def match_from_file(self, json_file=None, k=None) -> Match:
+        match = self.replay_file(json_file, k)
+        if match is None:
+            return None
+        return self.rate_match(match)
 
-        match.crewmates_count = players_alive - imps_alive
-        match.impostors_count = imps_alive
-        player : PlayerInMatch
-        imp : PlayerInMatch
-
-        for event in events_df:
-            event_type = event.get('event')
-            if event_type == "Task":
-                player_name = event.get('name')
-                player = match.get_player_by_name(player_name)
-                player.finished_task()
-                if player.tasks_complete == 10:
-                    if player.alive:
-                        player.finished_tasks_alive = True
-                    else:
-                        player.finished_tasks_dead = True
-
-            elif event_type == "Death":
-                player_name = event.get('name')
-                if (match.get_player_by_name(player_name).alive == False):
-                    continue
-                players_alive -= 1 # one player killed
-                death_happened = True
-                match.get_player_by_name(player_name).alive = False
-                match.get_player_by_name(player_name).time_of_death = event.get('time')
-                match.get_player_by_name(player_name).rounds_survived = match.rounds
-                if meeting_called_after_death:
-                    match.get_player_by_name(player_name).died_first_round = False
-                else:
-                    match.get_player_by_name(player_name).died_first_round = True
-
-                killer = match.get_player_by_name(event.get('killer'))
-                if killer is not None:
-                    killer.got_a_kill()
-                    if killer.solo_imp: killer.kills_as_solo_imp += 1
-                if match.match_end_time < event.get('time'):
-                    match.match_end_time = event.get('time')
-
-            elif event_type == "BodyReport":
-                meeting_called_after_death = True
-
-            elif event_type == "MeetingStart":
-                if death_happened:
-                    meeting_called_after_death = True
-
-            elif event_type == "PlayerVote":
-                if death_happened:
-                    meeting_called_after_death = True
-
-                player_name = event.get('player')
-
-                if str(event.get('target')).lower() =='none':
-                    match.get_player_by_name(player_name).skipped_vote()
-
-                elif match.is_player_imp(event.get('target')):
-                    match.get_player_by_name(player_name).correct_vote()
-
-                else:
-                    match.get_player_by_name(player_name).incorrect_vote()
-
-                match.get_player_by_name(player_name).last_voted = event.get('target')
-
-                if match.match_end_time < event.get('time'):
-                    match.match_end_time = event.get('time')
-
-
-            elif event_type == "Exiled":
-                ejected_player_name = event.get('player')
-                if match.get_player_by_name(ejected_player_name).alive == False: continue
-                match.get_player_by_name(ejected_player_name).alive = False
-                match.get_player_by_name(ejected_player_name).time_of_death = event.get('time')
-                match.get_player_by_name(ejected_player_name).rounds_survived = match.rounds
-                match.get_player_by_name(ejected_player_name).ejected_in_meeting = True
-
-                if match.is_player_imp(ejected_player_name):
-                    imps_alive -= 1
-                    if players_alive >= 7:
-                        impostors = match.get_players_by_team("impostor")
-                        for player in impostors:
-                            if player.name == ejected_player_name:
-                                player.ejected_early_as_imp = True
-                            else:
-                                player.solo_imp = True
-                                match.solo_imp_game = True
-                    for player in match.get_players_by_team("crewmate"):
-                        if player.last_voted == ejected_player_name and player.alive: #crewmate voted an imp out
-                            player.correct_vote_on_eject.append([players_alive, 1])
-
-                else: # voted a crewmate or skipped
-                    for player in match.players:
-                        if player.alive:
-                            if player.last_voted == ejected_player_name and player.team == "crewmate":
-                                player.got_crew_voted.append([players_alive, 1]) # all players who voted out a crewmate
-
-                            elif player.team == "impostor":
-                                player.got_crew_voted.append([players_alive, 1])
-
-                            if ((players_alive in [3,4]) or ((players_alive in [5,6,7]) and (imps_alive == 2))) and player.team == "crewmate" and not player.won: #crit
-                                if match.is_player_imp(player.last_voted):
-                                    player.right_vote_on_crit_but_loss = True
-
-                                elif players_alive in [3,5,6]:
-                                    player.voted_wrong_on_crit = True
-                                elif players_alive in [4,7] and (player.last_voted != "Skipped" and player.last_voted != "none"):
-                                    player.voted_wrong_on_crit = True
-
-                players_alive -= 1 # one player ejected
-                if imps_alive == 0 or (players_alive==1 and imps_alive==1) or (players_alive==2 and imps_alive==2): #game ended
-                    pass
-                else:
-                    match.rounds+=1
-
-            elif event_type == "MeetingEnd" and (event.get("result") == "Skipped" or event.get("result") == "Tie"):
-                match.rounds+=1
-                if (((players_alive in [5,6]) and (imps_alive == 2)) or players_alive == 3):
-                    for player in match.players:
-                        if not player.alive: continue
-                        if player.team == "crewmate" and not player.won:
-                            if (player.last_voted == "none" or player.last_voted == None or player.last_voted == "missed" or not match.is_player_imp(player.last_voted)):
-                                player.voted_wrong_on_crit = True
-                            elif match.is_player_imp(player.last_voted):
-                                player.right_vote_on_crit_but_loss = True
-
-        match_start_time = self.parse_time(match.match_start_time)
-        match_end_time = self.parse_time(match.match_end_time)
-        match.match_duration = str(match_end_time - match_start_time)
-        for player in match.players:
-            player.match_id = match.id
-            player.match_result = match.result
-            player.total_rounds = match.rounds
-            player.voting_accuracy = player.number_of_correct_votes / (player.number_of_placed_votes - player.number_of_skip_votes) if player.team == 'crewmate' and (player.number_of_placed_votes - player.number_of_skip_votes) != 0 else 0
-            if player.time_of_death is None:
-                player.time_of_death = match.match_end_time
-            time_of_death = self.parse_time(player.time_of_death)
-            player.alive_time = str(time_of_death - match_start_time)
-            player.match_time = match.match_duration
-            if player.match_result == "Impostors Win" and player.solo_imp:
-                player.won_as_solo_imp = True
-        match.alive_players = players_alive
-        match.alive_impostors = imps_alive
+    def stored_match(self, json_file) -> Match:
+        """Replayed match with the ratings stored in the events when it was rated (rated now if it never was)."""
+        match = self.replay_file(json_file)
+        if match is None:
+            return None
+        if not self.events_leaderboard.restore_match_ratings(match):
+            return self.rate_match(match)
         for player in match.players:
-            if match.get_player_by_name(player.name).rounds_survived == 0:
-                match.get_player_by_name(player.name).rounds_survived = match.rounds
+            player.discord = self.leaderboard.get_player_discord(self.leaderboard.get_player_row(player.name))
         return match
 
-    def match_from_file(self, json_file=None, k=32) -> Match:
+    def replay_file(self, json_file, k=None) -> Match:
+        """Replay a match file without rating it (no leaderboard lookups)."""
         try:
             match_df, events_df = self.df_from_json(self.matches_path, json_file)
         except Exception as e:
@@ -267,58 +209,65 @@ class FileHandler:
             self.logger.error(error_message)
             return None
 
-        match_id = match_df['matchid']
-
         # Check if this is a special match
-        try:
-            special_matches_df = pd.read_csv(self.special_matches_file)
-            special_match = special_matches_df[special_matches_df['match_id'] == match_id]
-            if not special_match.empty:
-                # Get the multiplier type and set appropriate k value
-                multiplier = special_match.iloc[0]['multiplier']
-                k = 64 if multiplier == 'double' else 96 if multiplier == 'triple' else 32
-                self.logger.info(f"Processing special match {match_id} with {multiplier} multiplier (k={k})")
-        except Exception as e:
-            self.logger.error(f"Error checking special matches file: {str(e)}")
-            # Continue with default k value if there's an error
-            pass
+        k = self.special_match_k(match_df['matchid'], k)
 
-        match = self.match_from_dataframe(match_df, events_df, k=k)
+        match = replay_match(match_df, events_df, k=k)
         match.match_file_name = json_file
+        return match
+
+    def rate_match(self, match:Match) -> Match:
+        """Serial stage: fill current MMRs from the leaderboard and calculate the MMR gains."""
+        self.get_players_info_from_leaderboard(match)
         if match.result in ["Canceled", "Unknown"]:
             return match
 
+        params = ranked_percentages()
         match.calculate_avg_mmr()
-        match.calculate_percentage_of_winning()
-        match.calculate_mmr()
+        match.calculate_percentage_of_winning(params)
+        match.calculate_mmr(params)
         return match
 
+    def special_match_k(self, match_id, k=None):
+        return self.special_matches.k_for(match_id, k)
+
     def get_sorted_match_files(self):
-        def get_game_started_timestamp(file_name):
-            file_path = os.path.join(self.matches_path, file_name)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-            except Exception as e:
-                self.logger.error(f"Failed to read match file {file_name}: {e}")
-                return datetime.min
-
-            # Prefer 'gameStarted' then fallback
-            game_started = data.get("gameStarted") or data.get("gamestarted") or data.get("GameStarted") or data.get("GameStart")
-            game_started_time = self.parse_time(game_started)
-            return game_started_time
-
-        files = os.listdir(self.matches_path)
-        filtered_files = [file for file in files if "match.json" in file.lower()]
-        # Sort with robust key; files without timestamps will be first (datetime.min)
-        sorted_files = sorted(filtered_files, key=lambda x: get_game_started_timestamp(x))
-        return sorted_files
+        # Files without timestamps sort first (datetime.min)
+        self.catalog.refresh()
+        return self.catalog.sorted_files()
+
+    @contextmanager
+    def batch(self):
+        """Suppress intermediate leaderboard sorts and CSV writes; everything is flushed once on exit."""
+        with self.leaderboard.batch(), self.events_leaderboard.batch():
+            yield self
 
     def update_leaderboard(self, match:Match):
         for player in match.players:
             self.leaderboard.update_player(player)
         self.leaderboard.save()
 
+    def add_match(self, match:Match) -> bool:
+        """Add the events rows of a match and, when it is rated, its leaderboard gains as one step.
+
+        The rows are built first and appended only after the leaderboard update went through; if
+        that update fails, the MMRs of the match's players are put back. Returns whether rows were added."""
+        rows = self.events_leaderboard.match_rows(match)
+        if self.is_rated_match(match):
+            columns = ['MMR', 'Crewmate MMR', 'Impostor MMR']
+            before = {player.name: self.leaderboard.get_player_row(player.name) for player in match.players}
+            try:
+                self.update_leaderboard(match)
+            except Exception:
+                for name, row in before.items():
+                    if row is not None:
+                        index = self.leaderboard.get_player_row(name)['Rank']
+                        for column in columns:
+                            self.leaderboard.leaderboard.at[index, column] = row[column]
+                raise
+        self.events_leaderboard.add_rows(rows)
+        return len(rows) > 0
+
     def fully_update_lb(self):
         player_stats = self.events_leaderboard.stats_leaderboard()
         if self.leaderboard.leaderboard.index.name != 'Player Name':
@@ -330,94 +279,194 @@ class FileHandler:
         self.leaderboard.leaderboard = self.leaderboard.leaderboard.fillna(0)
         self.leaderboard.save()
 
-    def process_match_by_id(self, match_id, k=32):
+    def process_match_by_id(self, match_id, k=None):
         processed_matches = set(self.events_leaderboard.events_lb['Match ID'].unique())
         match_file_name = self.find_matchfile_by_id(match_id)
         match = self.match_from_file(match_file_name, k=k)
         if match_id in processed_matches:
             self.logger.info(f"Match {match_id} has already been processed - skipping")
             return match
-        if match.result != "Unknown":
-            self.events_leaderboard.add_match_events(match=match)
-        if match.result != "Canceled" and match.result != "Unknown":
-            self.update_leaderboard(match)
-            self.fully_update_lb()
-            self.logger.info(f"Match {match_id} has been added to the leaderboard")
-        else:
-            self.logger.info(f"Match {match_id} is a Cancel - skipping")
-        
+        with self.batch():
+            if match.result != "Unknown":
+                self.events_leaderboard.add_match_events(match=match)
+            if match.result != "Canceled" and match.result != "Unknown":
+                self.update_leaderboard(match)
+                self.fully_update_lb()
+                self.logger.info(f"Match {match_id} has been added to the leaderboard")
+            else:
+                self.logger.info(f"Match {match_id} is a Cancel - skipping")
+            # after the leaderboard update, so the checkpoint holds the events and ratings of the match
+            if match.result != "Unknown" and self.checkpoints.is_due(len(processed_matches) + 1):
+                self.checkpoint(len(processed_matches) + 1, match_file_name)
+
         return match
 
+    def checkpoint(self, position, match_file, complete=False):
+        """Append new events rows to the CSV and checkpoint the leaderboard after `position` processed matches."""
+        watermark = self.events_leaderboard.flush()
+        entry = self.catalog.get(match_file) or {}
+        leaderboard_df, needs_rank = self.leaderboard.state()
+        self.checkpoints.save(position, match_file, entry.get('start_key'), leaderboard_df, needs_rank, watermark, complete)
+
+    def resume_interrupted_run(self):
+        """Roll back to the latest checkpoint of a processing run that died; returns its marker or None."""
+        run = self.checkpoints.interrupted_run()
+        if run is None:
+            return None
+        checkpoint = self.checkpoints.latest(run['run']) if run.get('run') else None
+        if checkpoint is None:
+            # Nothing was written before the first checkpoint, the files still hold the state before the run
+            self.logger.warning(f"Previous {run['kind']} run was interrupted before its first checkpoint - starting it again")
+            self.checkpoints.end_run()
+            return None
+        self.logger.warning(f"Resuming interrupted {run['kind']} run from the checkpoint at match {checkpoint['position']} ({checkpoint['match_file']})")
+        self.leaderboard.restore(checkpoint['leaderboard'], checkpoint['needs_rank'])
+        self.events_leaderboard.truncate(checkpoint['events_watermark'])
+        run['complete'] = checkpoint['complete']
+        return run
+
     def process_unprocessed_matches(self):
-        processed_matches = set(self.events_leaderboard.events_lb['Match ID'].unique())
+        run = self.resume_interrupted_run()
         sorted_files_with_match = self.get_sorted_match_files()
+        if run is not None and run['kind'] == 'rebuild' and not run['complete']:
+            return self.rebuild_season(sorted_files_with_match, run_id=run['run'])
+
+        processed_matches = set(self.events_leaderboard.events_lb['Match ID'].unique())
+        position = len(processed_matches)
         match = None
-        special_matches_df = None
-        try:
-            special_matches_df = pd.read_csv(config['special_matches_file'])
-        except Exception as e:
-            self.logger.error(f"Error loading special matches file: {str(e)}")
 
         # Check if this is a fresh calculation (events file is empty)
         is_fresh_calculation = len(self.events_leaderboard.events_lb) == 0
         if is_fresh_calculation:
             self.logger.info("Events file is empty - this is a fresh calculation, will apply stored MMR changes after processing")
-
-        for file in sorted_files_with_match:
-            try:
-                with open(os.path.join(self.matches_path, file), 'r') as f:
-                    match_data = json.load(f)
-                    match_id = match_data.get('MatchID') or match_data.get('matchid')
+            return self.rebuild_season(sorted_files_with_match)
+
+        # a file dropped from the catalog meanwhile stays in the list and fails inside the loop's try
+        unprocessed_files = [file for file in sorted_files_with_match if (self.catalog.get(file) or {}).get('match_id') not in processed_matches]
+        if unprocessed_files or run is not None:
+            self.checkpoints.begin_run('update', run['run'] if run is not None else None)
+        with self.batch():
+            if run is not None:
+                self.leaderboard.save()  # the restored checkpoint still has to reach the CSV
+            for file in unprocessed_files:
+                try:
+                    match_id = self.catalog.get(file)['match_id']
                     if match_id in processed_matches:
                         continue
 
-                    # Check if it's a special match
-                    k = 32  # default k value
-                    if special_matches_df is not None and match_id:
-                        special_match = special_matches_df[special_matches_df['match_id'] == match_id]
-                        if not special_match.empty:
-                            multiplier = special_match.iloc[0]['multiplier']
-                            k = 64 if multiplier == 'double' else 96 if multiplier == 'triple' else 32
-                            self.logger.info(f"Found special match {match_id} with {multiplier} multiplier (k={k})")
-
                     # Create match with appropriate k value
-                    match = self.match_from_file(file, k=k)
-
-                    if match:
-                        self.events_leaderboard.add_match_events(match)
-                        if match.result == "Canceled" or match.result == "Unknown":
-                            self.logger.info(f"Skipped {match.match_file_name} because result is {match.result}")
-                        elif len(match.players) != 10:
-                            self.logger.info(f"Skipped {match.match_file_name} because it doesn't have 10 players")
-                        else:
-                            self.logger.info(f"Processed Match ID:{match.id}")
-                            self.update_leaderboard(match)
+                    match = self.match_from_file(file)
+
                     processed_matches.add(match_id) # Add match_id to processed_matches set
+                    # positions count matches with events rows, like the events order the re-rater indexes
+                    if match and self.add_match(match):
+                        position += 1
+                        if self.checkpoints.is_due(position):
+                            self.checkpoint(position, file)
+
+                except Exception as e:
+                    self.logger.error(f"Error processing file {file}: {str(e)}")
+                    continue
+            self.fully_update_lb()
+            if self.checkpoints.run_id is not None:
+                self.checkpoint(position, unprocessed_files[-1] if unprocessed_files else None, complete=True)
+        if self.checkpoints.run_id is not None:
+            self.checkpoints.end_run()
+
+        # Stored MMR changes are only re-applied by a fresh calculation (rebuild_season)
+        self.logger.info("Skipping stored MMR changes - this was not a fresh calculation")
+        return match
+
+    def is_rated_match(self, match:Match):
+        if match.result == "Canceled" or match.result == "Unknown":
+            self.logger.info(f"Skipped {match.match_file_name} because result is {match.result}")
+            return False
+        if len(match.players) != 10:
+            self.logger.info(f"Skipped {match.match_file_name} because it doesn't have 10 players")
+            return False
+        self.logger.info(f"Processed Match ID:{match.id}")
+        return True
 
-            except Exception as e:
-                self.logger.error(f"Error processing file {file}: {str(e)}")
+    def rebuild_season(self, sorted_files_with_match, workers=None, run_id=None, timer=None):
+        """Cold rebuild of the season.
+
+        Reading the match/events JSON and replaying the events run in a process pool,
+        MMR rating stays a serial stage in gameStarted order, and the events CSV and
+        leaderboard are written once at the end. With run_id an interrupted rebuild is
+        continued after its restored checkpoint instead of starting over. A StageTimer
+        passed as timer collects read/replay (summed over workers), rate, stats and
+        persist seconds."""
+        def stage(name):
+            return timer.stage(name) if timer is not None else nullcontext()
+
+        if run_id is None:
+            self.checkpoints.clear()
+        processed = set(self.events_leaderboard.events_lb['Match ID'].unique())
+        files, ks, seen = [], [], set(processed)
+        for file in sorted_files_with_match:
+            entry = self.catalog.get(file)
+            if entry is None:
+                self.logger.error(f"Match file {file} is no longer in the catalog - skipping")
                 continue
-        self.fully_update_lb()
-        
-        # Only apply stored MMR changes if this was a fresh calculation
-        if is_fresh_calculation:
-            self.logger.info("Applying stored MMR changes after fresh calculation...")
-            self.apply_stored_mmr_changes()
+            match_id = entry['match_id']
+            if match_id in seen:
+                continue
+            seen.add(match_id)
+            files.append(file)
+            ks.append(self.special_match_k(match_id))
+
+        workers = workers or os.cpu_count() or 1
+        executor = None
+        if workers > 1 and len(files) > workers:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(replay_match_file, repeat(self.matches_path), files, ks, repeat(self.match_cache_dir),
+                                   chunksize=max(1, len(files) // (workers * 8)))
         else:
-            self.logger.info("Skipping stored MMR changes - this was not a fresh calculation")
-        
+            results = map(replay_match_file, repeat(self.matches_path), files, ks, repeat(self.match_cache_dir))
+
+        self.checkpoints.begin_run('rebuild', run_id)
+        match = None
+        file = None
+        with self.batch():
+            if run_id is not None:
+                self.leaderboard.save()  # the restored checkpoint still has to reach the CSV
+            try:
+                for file, replayed, error, (read_seconds, replay_seconds) in results:
+                    if timer is not None:
+                        timer.add('read', read_seconds)
+                        timer.add('replay', replay_seconds)
+                    if replayed is None:
+                        self.logger.error(f"Error reading match from file {file}: {error}")
+                        continue
+                    with stage('rate'):
+                        try:
+                            match = self.rate_match(replayed)
+                            added = self.add_match(match)
+                        except Exception as e:
+                            self.logger.error(f"Error processing file {file}: {str(e)}")
+                            continue
+                    if not added:
+                        continue
+                    processed.add(match.id)
+                    # only after a match went through completely, so every position is checkpointed once
+                    if self.checkpoints.is_due(len(processed)):
+                        with stage('persist'):
+                            self.checkpoint(len(processed), file)
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+            with stage('stats'):
+                self.fully_update_lb()
+                self.logger.info("Applying stored MMR changes after fresh calculation...")
+                self.apply_stored_mmr_changes()
+            with stage('persist'):
+                self.checkpoint(len(processed), file, complete=True)
+        self.checkpoints.end_run()
         return match
 
     def find_matchfile_by_id(self, match_id):
-        json_files = [file for file in os.listdir(self.matches_path) if file.endswith('_match.json')]
-        for match_file_name in json_files:
-            match_file_path = os.path.join(self.matches_path, match_file_name)
-            with open(match_file_path, 'r') as f:
-                match_data = json.load(f)
-                found_id = match_data.get('MatchID') or match_data.get('matchid')
-                if str(found_id) == str(match_id):
-                    return match_file_name
-        return None
+        return self.catalog.find(match_id)
 
     def change_player_name(self, old_name, new_name):
         def read_json_file(filename):
@@ -434,6 +483,7 @@ class FileHandler:
 
         index = player_row['Rank']
         self.leaderboard.leaderboard.at[index, 'Player Name'] = new_name
+        self.leaderboard.invalidate_names()
         self.leaderboard.save()
         self.logger.info(f"Player name '{old_name}' updated to '{new_name}' in Leaderboard")
         self.events_leaderboard.events_lb.loc[self.events_leaderboard.events_lb['Player Name'] == player_row['Player Name'], 'Player Name'] = new_name
@@ -501,37 +551,38 @@ class FileHandler:
                 
             self.logger.info(f"Applying {len(df)} stored MMR changes...")
             
-            for index, row in df.iterrows():
-                try:
-                    player_name = row['Player Name']
-                    mmr_value = float(row['MMR Value'])
-                    change_type = row['Change Type']
-                    moderator = row['Moderator']
-                    reason = row.get('Reason', '')
+            with self.leaderboard.batch():
+                for index, row in df.iterrows():
+                    try:
+                        player_name = row['Player Name']
+                        mmr_value = float(row['MMR Value'])
+                        change_type = row['Change Type']
+                        moderator = row['Moderator']
+                        reason = row.get('Reason', '')
                     
-                    # Get player row
-                    player_row = self.leaderboard.get_player_row(player_name)
-                    if player_row is None:
-                        self.logger.warning(f"Player {player_name} not found in leaderboard, skipping MMR change")
-                        continue
+                        # Get player row
+                        player_row = self.leaderboard.get_player_row(player_name)
+                        if player_row is None:
+                            self.logger.warning(f"Player {player_name} not found in leaderboard, skipping MMR change")
+                            continue
                     
-                    # Apply the MMR change based on type
-                    if change_type == 'crew':
-                        self.leaderboard.mmr_change_crew(player_row, mmr_value)
-                        change_text = "Crew"
-                    elif change_type == 'imp':
-                        self.leaderboard.mmr_change_imp(player_row, mmr_value)
-                        change_text = "Impostor"
-                    else:  # total
-                        self.leaderboard.mmr_change(player_row, mmr_value)
-                        change_text = "Total"
+                        # Apply the MMR change based on type
+                        if change_type == 'crew':
+                            self.leaderboard.mmr_change_crew(player_row, mmr_value)
+                            change_text = "Crew"
+                        elif change_type == 'imp':
+                            self.leaderboard.mmr_change_imp(player_row, mmr_value)
+                            change_text = "Impostor"
+                        else:  # total
+                            self.leaderboard.mmr_change(player_row, mmr_value)
+                            change_text = "Total"
                     
-                    self.logger.info(f"Applied stored MMR change: {player_name} {mmr_value:+} ({change_text}) by {moderator}")
+                        self.logger.info(f"Applied stored MMR change: {player_name} {mmr_value:+} ({change_text}) by {moderator}")
                     
-                except Exception as e:
-                    self.logger.error(f"Error applying stored MMR change at row {index}: {str(e)}")
-                    continue
-            
+                    except Exception as e:
+                        self.logger.error(f"Error applying stored MMR change at row {index}: {str(e)}")
+                        continue
+
             self.logger.info("Finished applying stored MMR changes")
             
         except Exception as e:
@@ -563,36 +614,35 @@ class FileHandler:
             self.logger.error(f"Can't find {match_id} - Could not change match to {result}")
             return False, f"Can't find {match_id} - Could not change match to {result}"
 
-        match = self.match_from_file(match_file_name)
+        match = self.replay_file(match_file_name)
+        if match is None:
+            return False, f"Can't read {match_file_name} - Could not change match to {result}"
         if match.result == result:
             self.logger.info(f"Match {match_id} is already a {result}")
             return False, f"Match {match_id} is already a {result}"
 
         self.logger.info(f"Changing match {match_id} to {result}")
-        match_rows = self.events_leaderboard.events_lb[self.events_leaderboard.events_lb['Match ID'] == match_id]
-
-        self.leaderboard.leaderboard.reset_index(inplace=True)
-        changes_df = match_rows[['Player Name', 'MMR Gain', 'Crewmate MMR Gain', 'Impostor MMR Gain']].set_index('Player Name')
-        self.leaderboard.leaderboard = self.leaderboard.leaderboard.set_index('Player Name').join(changes_df, how='left')
-        for change_col, target_col in zip(['MMR Gain', 'Crewmate MMR Gain', 'Impostor MMR Gain'], ['MMR', 'Crewmate MMR', 'Impostor MMR']):
-            self.leaderboard.leaderboard[target_col] -= self.leaderboard.leaderboard[change_col].fillna(0)
-        self.leaderboard.leaderboard.drop(columns=['MMR Gain', 'Crewmate MMR Gain', 'Impostor MMR Gain'], inplace=True)
-        self.leaderboard.leaderboard.reset_index(inplace=True)
-        self.leaderboard.leaderboard.set_index('Rank', inplace=True)
-
-        match.result = result
-        self.events_leaderboard.remove_match(match_id)
-
         file_path = os.path.join(self.matches_path, match_file_name)
         with open(file_path, 'r') as f:
             match_data = json.load(f)
         match_data['result'] = result
         with open(file_path, 'w') as f:
             json.dump(match_data, f, indent=4)
+        self.catalog.update_file(match_file_name)
 
-        self.process_match_by_id(match_id)
-        self.events_leaderboard.events_lb = self.events_leaderboard.events_lb.sort_values(by='Match ID')
-        self.events_leaderboard.save()
+        if match_id not in set(self.events_leaderboard.events_lb['Match ID'].unique()):
+            match = self.process_match_by_id(match_id)
+            return match, f"Match {match_id} changed to {result}"
+
+        # Later matches were rated with the old result, re-rate the ones that depend on it
+        with self.batch():
+            match, rerated, players = self.rerater.rerate(match_id)
+            self.fully_update_lb()
+            order = self.events_leaderboard.events_lb['Match ID'].unique()
+            self.checkpoint(len(order), self.find_matchfile_by_id(order[-1]))
+        self.logger.info(f"Match {match_id} changed to {result}: {rerated} matches re-rated for {players} players")
+        for player in match.players:
+            player.discord = self.leaderboard.get_player_discord(self.leaderboard.get_player_row(player.name))
 
         return match, f"Match {match_id} changed to {result}"
 
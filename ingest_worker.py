@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class IngestWorker:
+    """Runs leaderboard/events work on one dedicated thread so the event loop never blocks on it.
+
+    Every job goes through the same single-thread executor, so match ingestion, rebuilds and
+    staff edits of the leaderboard are serialized exactly like they were on the loop. The
+    startup catch-up (process_unprocessed_matches) runs as the first job; `ready` is set once
+    it has finished, and commands that read the leaderboard wait for it."""
+
+    def __init__(self):
+        self.logger = logging.getLogger('IngestWorker')
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest')
+        self.ready = asyncio.Event()
+        self.catch_up_task = None
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the ingest thread and await its result."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def start_catch_up(self, catch_up):
+        """Schedule catch_up() as a background job and open the readiness gate when it is done."""
+        self.catch_up_task = asyncio.create_task(self._catch_up(catch_up))
+        return self.catch_up_task
+
+    async def _catch_up(self, catch_up):
+        try:
+            await self.run(catch_up)
+        except Exception as e:
+            self.logger.error(f"Startup catch-up failed: {e}")
+        finally:
+            self.ready.set()
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    async def wait_ready(self):
+        await self.ready.wait()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -4,13 +4,9 @@ from match_class import Match
 from rapidfuzz import process
 from rapidfuzz import fuzz
 import os
-import yaml
+from contextlib import contextmanager
+from config_service import settings
 
-# Load config from YAML
-with open(os.path.join('config', 'config.yaml'), 'r', encoding='utf-8') as f:
-    all_configs = yaml.safe_load(f)
-use_config = all_configs['use'] if 'use' in all_configs else 'main'
-config = all_configs[use_config]
 
 class Leaderboard:
     def __init__(self, csv_file):
@@ -18,6 +14,8 @@ class Leaderboard:
         self.dtype_dict = {
             'Rank': 'Int64', 'Player Name': 'object',
             'Player Discord': 'Int64', 'MMR': 'float64', 'Crewmate MMR': 'float64', 'Impostor MMR': 'float64',
+            'MMR Low': 'float64', 'MMR High': 'float64', 'Crewmate MMR Low': 'float64', 'Crewmate MMR High': 'float64',
+            'Impostor MMR Low': 'float64', 'Impostor MMR High': 'float64', 'Provisional': 'Int64', 'Interval Games': 'Int64',
             'Voting Accuracy (Crewmate games)': 'float64', 'Total Number Of Games Played': 'Int64',
             'Number Of Impostor Games Played': 'Int64', 'Number Of Crewmate Games Played': 'Int64',
             'Number Of Impostor Games Won': 'Int64', 'Number Of Crewmate Games Won': 'Int64',
@@ -28,8 +26,39 @@ class Leaderboard:
             'Impostor Win Streak': 'Int64', 'Best Impostor Win Streak': 'Int64',
             'Survivability (Crewmate)': 'float64', 'Survivability (Impostor)': 'float64'
         }
+        self._batch_depth = 0
+        self._needs_rank = False
+        self._dirty = False
+        self._names = {}
+        self._names_signature = None
         self.load_leaderboard()
 
+    @contextmanager
+    def batch(self):
+        """Defer re-sorting and saving until the outermost batch exits.
+
+        Nothing is saved when the batch exits with an exception; the leaderboard is reloaded
+        from the CSV instead, so a half-applied batch never reaches the file."""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._needs_rank = False
+                self._dirty = False
+                self.load_leaderboard()
+                self.invalidate_names()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            if self._needs_rank:
+                self._needs_rank = False
+                self.rank_players()
+            if self._dirty:
+                self._dirty = False
+                self.save()
+
     def load_leaderboard(self):
         if not os.path.exists(self.csv_file):
             # Create empty leaderboard if file doesn't exist
@@ -54,20 +83,33 @@ class Leaderboard:
             self.leaderboard.set_index('Rank', inplace=True)
             self.leaderboard.fillna(0, inplace=True)
 
+    def state(self):
+        """(frame, pending re-sort) as kept in a checkpoint."""
+        return self.leaderboard, self._needs_rank
+
+    def restore(self, leaderboard:pd.DataFrame, needs_rank=False):
+        """Replace the in-memory leaderboard with a checkpointed one; it is re-sorted by the next batch."""
+        self.leaderboard = leaderboard
+        self._needs_rank = needs_rank
+        self.invalidate_names()
+
     def create_empty_leaderboard(self):
         self.leaderboard = pd.DataFrame(columns=self.dtype_dict.keys()).astype(self.dtype_dict)
         self.leaderboard.set_index('Rank', inplace=True)
 
     def save(self):
+        if self._batch_depth:
+            self._dirty = True
+            return
         self.leaderboard.to_csv(self.csv_file, float_format='%.2f')
 
     def new_player(self, player_name:str):
         new_player_data = {
             'Player Name': player_name.strip(),
             'Player Discord': 0,
-            'MMR': float(config['current_mmr']),
-            'Crewmate MMR': float(config['crewmate_current_mmr']),
-            'Impostor MMR': float(config['impostor_current_mmr'])
+            'MMR': float(settings().current_mmr),
+            'Crewmate MMR': float(settings().crewmate_current_mmr),
+            'Impostor MMR': float(settings().impostor_current_mmr)
         }
         self.leaderboard = pd.concat([self.leaderboard, pd.DataFrame([new_player_data])], ignore_index=True)
         self.rank_players()
@@ -76,9 +118,9 @@ class Leaderboard:
         new_player_data = {
             'Player Name': player_name.strip(),
             'Player Discord': 0,
-            'MMR': float(config['current_mmr']),
-            'Crewmate MMR': float(config['crewmate_current_mmr']),
-            'Impostor MMR': float(config['impostor_current_mmr'])
+            'MMR': float(settings().current_mmr),
+            'Crewmate MMR': float(settings().crewmate_current_mmr),
+            'Impostor MMR': float(settings().impostor_current_mmr)
         }
         return pd.Series(new_player_data)
 
@@ -94,19 +136,53 @@ class Leaderboard:
         self.rank_players()
         
     def rank_players(self):
+        if self._batch_depth:
+            self._needs_rank = True
+            self.leaderboard.index.name = 'Rank'
+            return
         if len(self.leaderboard) > 1:
             self.leaderboard.sort_values(by='MMR', ascending=False, inplace=True, kind='mergesort')
             self.leaderboard.reset_index(drop=True, inplace=True)
         self.leaderboard.index.name = 'Rank'
 
+    def _build_name_index(self):
+        names = self.leaderboard['Player Name'].str.lower().str.replace(" ","")
+        self._names = {}
+        for index, name in zip(names.index, names):
+            if isinstance(name, str) and name not in self._names:
+                self._names[name] = index
+        self._names_signature = (id(self.leaderboard), len(self.leaderboard))
+
+    def invalidate_names(self):
+        self._names_signature = None
+
+    def _find_player_index(self, lowercase_name):
+        if self._names_signature != (id(self.leaderboard), len(self.leaderboard)):
+            self._build_name_index()
+        index = self._names.get(lowercase_name)
+        if index is not None:
+            # Rows may have been re-sorted since the index was built
+            try:
+                current = str(self.leaderboard.at[index, 'Player Name']).lower().replace(" ","")
+            except KeyError:
+                current = None
+            if current != lowercase_name:
+                self._build_name_index()
+                index = self._names.get(lowercase_name)
+        return index
+
+    def player_index(self, player_name):
+        """Row label of a player, names compared lowercased without spaces; None if not in the leaderboard."""
+        return self._find_player_index(str(player_name).lower().replace(" ",""))
+
     def get_player_row(self, player_name):
         lowercase_name = str(player_name).lower().replace(" ","")
-        row = self.leaderboard[self.leaderboard['Player Name'].str.lower().str.replace(" ","") == lowercase_name]
-        if not row.empty:
-            row.reset_index(inplace=True, drop=False)
-            return row.iloc[0]
-        else:
+        index = self._find_player_index(lowercase_name)
+        if index is None:
             return None
+        # Same shape as row.reset_index().iloc[0], without copying the frame
+        values = self.leaderboard.loc[index]
+        return pd.Series([index, *values.tolist()], index=['Rank', *values.index], name=0, dtype=object)
                  
     def get_player_row_lookslike(self, player_name):
         row = self.leaderboard[self.leaderboard['Player Name'] == player_name]
@@ -150,6 +226,19 @@ class Leaderboard:
         else:
             return None
 
+    def get_player_mmr_interval(self, player_row, column='MMR'):
+        """(low, high) of the rating_intervals.py interval of an MMR column, or None before one was computed."""
+        games = player_row.get('Interval Games', 0) if player_row is not None else 0
+        # players added since the leaderboard was loaded have NA here
+        if pd.notna(games) and games > 0:
+            return player_row[f'{column} Low'], player_row[f'{column} High']
+        else:
+            return None
+
+    def is_player_provisional(self, player_row):
+        provisional = player_row.get('Provisional', 0) if player_row is not None else 0
+        return bool(pd.notna(provisional) and provisional == 1)
+
     def get_player_voting_accuracy(self, player_row):
         if player_row is not None and not player_row.empty:
             return player_row['Voting Accuracy (Crewmate games)']
@@ -157,11 +246,7 @@ class Leaderboard:
             return None
 
     def is_player_in_leaderboard(self, player_name):
-        player_row = self.get_player_row(player_name)
-        if player_row is not None and not player_row.empty:
-            return not player_row.empty
-        else:
-            return False
+        return self._find_player_index(str(player_name).lower().replace(" ","")) is not None
 
     def get_player_crew_win_rate(self, player_row):
         if player_row is not None and not player_row.empty:
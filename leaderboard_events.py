@@ -1,10 +1,28 @@
 import pandas as pd
-from player_in_match import PlayerInMatch
-from match_class import Match
+from player_in_match import PlayerInMatch, vote_pairs
+from match_class import Match, breakdown_text, parse_breakdown, breakdown_performance
 import os
+from contextlib import contextmanager
+from match_time import parse_time, to_epoch
 from rapidfuzz import process
 from rapidfuzz import fuzz
 
+def start_epoch(match_start_time):
+    """Epoch seconds of a stored 'Match Start Time' string (0 when missing)."""
+    if match_start_time is None or match_start_time == 0 or pd.isna(match_start_time):
+        return 0
+    return to_epoch(parse_time(match_start_time))
+
+def add_time_columns(events_df:pd.DataFrame):
+    """Fill the integer time columns of an events frame written before they existed."""
+    if 'Match Start Epoch' not in events_df.columns:
+        events_df['Match Start Epoch'] = events_df['Match Start Time'].map(start_epoch).astype('int64')
+    for seconds_column, time_column in (('Alive Seconds', 'Alive Time'), ('Match Seconds', 'Match Time')):
+        if seconds_column not in events_df.columns:
+            events_df[seconds_column] = (pd.to_timedelta(events_df[time_column].astype(str), errors='coerce')
+                                         .fillna(pd.Timedelta(0)) // pd.Timedelta(seconds=1)).astype('int64')
+    return events_df
+
 class EventsLeaderboard:
     def __init__(self, csv_file=None):
         self.csv_file = csv_file
@@ -19,16 +37,61 @@ class EventsLeaderboard:
             'Tasks Complete': 'int', 'Correct Vote on Eject': 'object', 'Voted Wrong on Crit': 'bool',
             'Voted Right on Crit but Lost': 'bool',
             'Number of Kills': 'int', 'Ejected Early as Imp': 'bool', 'Got Crew Voted': 'object',
-            'Solo Imp': 'bool', 'Kills as Solo Imp': 'int', 'Won as Solo Imp': 'bool'
+            'Solo Imp': 'bool', 'Kills as Solo Imp': 'int', 'Won as Solo Imp': 'bool',
+            'Match Start Epoch': 'int', 'Alive Seconds': 'int', 'Match Seconds': 'int', 'MMR Breakdown': 'object'
         }
+        self._batch_depth = 0
+        self._dirty = False
+        self._pending_rows = []
+        self._saved_rows = 0        # rows of events_lb already in the CSV
+        self._saved_columns = None  # column order of the CSV
         self.load_leaderboard_events()
 
+    @property
+    def events_lb(self) -> pd.DataFrame:
+        if self._pending_rows:
+            rows, self._pending_rows = self._pending_rows, []
+            self._events_lb = pd.concat([self._events_lb, pd.DataFrame(rows)], ignore_index=True)
+            self._events_lb = self._events_lb.fillna(0).infer_objects(copy=False)
+        return self._events_lb
+
+    @events_lb.setter
+    def events_lb(self, value:pd.DataFrame):
+        self._pending_rows = []
+        self._saved_rows = 0
+        self._events_lb = value
+
+    @contextmanager
+    def batch(self):
+        """Collect added rows in memory and write the CSV once when the outermost batch exits.
+
+        On an exception nothing is written and the events are reloaded from the CSV."""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._dirty = False
+                self.load_leaderboard_events()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._dirty:
+            self._dirty = False
+            self.save()
+
     def load_leaderboard_events(self):
         if self.csv_file and os.path.exists(self.csv_file):
             self.events_lb = pd.read_csv(self.csv_file, dtype=self.dtype_dict)
             self.events_lb.fillna(0, inplace=True)
             # Ensure the DataFrame doesn't have an index column
             self.events_lb.reset_index(drop=True, inplace=True)
+            self._saved_rows = len(self.events_lb)
+            self._saved_columns = list(self.events_lb.columns)
+            add_time_columns(self.events_lb)
+            if 'MMR Breakdown' not in self.events_lb.columns:
+                # rated before breakdowns were recorded
+                self.events_lb['MMR Breakdown'] = ""
         else:
             self.create_empty_leaderboard()
 
@@ -36,6 +99,9 @@ class EventsLeaderboard:
         self.events_lb = pd.DataFrame(columns=self.dtype_dict.keys()).astype(self.dtype_dict)
 
     def save(self):
+        if self._batch_depth:
+            self._dirty = True
+            return
         # Always reset to default integer index (do not keep the old index as a column)
         self.events_lb.reset_index(drop=True, inplace=True)
         # Reorder columns so 'Index' is first
@@ -44,11 +110,49 @@ class EventsLeaderboard:
             cols.insert(0, cols.pop(cols.index('Index')))
         self.events_lb = self.events_lb[cols]
         # Save without writing the DataFrame index
-        self.events_lb.to_csv(self.csv_file, index=False, float_format='%.2f')
+        self._write_csv(self.events_lb)
 
-    def add_player_in_match(self, player:PlayerInMatch, match_start_time=None):
-        new_player_in_match_data = {
-                'Index': len(self.events_lb),
+    def _write_csv(self, events_lb:pd.DataFrame):
+        events_lb.to_csv(self.csv_file, index=False, float_format='%.2f')
+        self._saved_rows = len(events_lb)
+        self._saved_columns = list(events_lb.columns)
+
+    def flush(self) -> int:
+        """Write rows that are not in the CSV yet, even inside a batch; returns the number of rows on disk.
+
+        New rows are appended when the CSV already has the same columns, otherwise the file is rewritten."""
+        events_lb = self.events_lb
+        if self._saved_rows and self._saved_columns == list(events_lb.columns) and os.path.exists(self.csv_file):
+            new_rows = events_lb.iloc[self._saved_rows:]
+            if len(new_rows):
+                new_rows.to_csv(self.csv_file, mode='a', header=False, index=False, float_format='%.2f')
+            self._saved_rows = len(events_lb)
+        else:
+            batch_depth, self._batch_depth = self._batch_depth, 0
+            try:
+                self.save()
+            finally:
+                self._batch_depth = batch_depth
+        # The CSV now matches the frame, the outer batch has nothing left to write
+        self._dirty = False
+        return self._saved_rows
+
+    def truncate(self, row_count):
+        """Keep only the first row_count rows (an events watermark) and rewrite the CSV."""
+        self.events_lb = self.events_lb.iloc[:row_count].reset_index(drop=True)
+        batch_depth, self._batch_depth = self._batch_depth, 0
+        try:
+            self.save()
+        finally:
+            self._batch_depth = batch_depth
+
+    def player_in_match_row(self, player:PlayerInMatch, match_start_time=None, index=None, match_start_epoch=None) -> dict:
+        if match_start_time is None:
+            match_start_time = getattr(player, 'match_start_time', None)
+        if match_start_epoch is None:
+            match_start_epoch = start_epoch(match_start_time)
+        return {
+                'Index': len(self._events_lb) + len(self._pending_rows) if index is None else index,
                 'Match ID': player.match_id,
                 'Player Name': player.name,
                 'Match Result': player.match_result,
@@ -66,7 +170,7 @@ class EventsLeaderboard:
                 #survivability
                 'Alive Time': player.alive_time,
                 'Match Time': player.match_time,
-                'Match Start Time': match_start_time if match_start_time is not None else getattr(player, 'match_start_time', None),
+                'Match Start Time': match_start_time,
                 'Rounds Survived': player.rounds_survived,
                 'Total Rounds': player.total_rounds,
                 'Ejected in Meeting': player.ejected_in_meeting,
@@ -81,26 +185,45 @@ class EventsLeaderboard:
                 'Finished Tasks Alive': player.finished_tasks_alive,
                 'Finished Tasks Dead': player.finished_tasks_dead,
                 'Tasks Complete': player.tasks_complete,
-                'Correct Vote on Eject': player.correct_vote_on_eject,
+                'Correct Vote on Eject': vote_pairs(player.correct_vote_on_eject),
                 'Voted Wrong on Crit': player.voted_wrong_on_crit,
                 'Voted Right on Crit but Lost': player.right_vote_on_crit_but_loss,
                 #imp
                 'Number of Kills': player.number_of_kills,
                 'Ejected Early as Imp': player.ejected_early_as_imp,
-                'Got Crew Voted': player.got_crew_voted,
+                'Got Crew Voted': vote_pairs(player.got_crew_voted),
                 'Solo Imp': player.solo_imp,
                 'Kills as Solo Imp': player.kills_as_solo_imp,
-                'Won as Solo Imp': player.won_as_solo_imp
+                'Won as Solo Imp': player.won_as_solo_imp,
+                #times normalized at ingest
+                'Match Start Epoch': match_start_epoch,
+                'Alive Seconds': player.alive_seconds,
+                'Match Seconds': player.match_seconds,
+                'MMR Breakdown': breakdown_text(player.mmr_breakdown)
         }
-        new_row = pd.DataFrame([new_player_in_match_data])
+
+    def add_player_in_match(self, player:PlayerInMatch, match_start_time=None):
+        new_row = pd.DataFrame([self.player_in_match_row(player, match_start_time)])
         self.events_lb = pd.concat([self.events_lb, new_row], ignore_index=True)
 
-    def add_match_events(self, match : Match):
+    def match_rows(self, match : Match) -> list:
+        """Events rows of a match, numbered to follow the stored rows; nothing is added yet."""
         player : PlayerInMatch
-        for player in match.players:
-            self.add_player_in_match(player, match_start_time=match.match_start_time)
-        self.events_lb = self.events_lb.fillna(0).infer_objects(copy=False)
-        self.events_lb.to_csv(self.csv_file, index=False, float_format='%.2f')
+        first_index = len(self._events_lb) + len(self._pending_rows)
+        return [self.player_in_match_row(player, match_start_time=match.match_start_time, index=first_index + i,
+                                         match_start_epoch=match.start_epoch)
+                for i, player in enumerate(match.players)]
+
+    def add_match_events(self, match : Match):
+        self.add_rows(self.match_rows(match))
+
+    def add_rows(self, rows:list):
+        """Append rows built by match_rows."""
+        self._pending_rows.extend(rows)
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self._write_csv(self.events_lb)
 
     def stats_leaderboard(self):
         # Filter out matches with results that are 'unknown' or 'canceled'
@@ -112,7 +235,7 @@ class EventsLeaderboard:
                 'Number Of Games Won', 'Number Of Impostor Games Played', 'Number Of Games Died First',
                 'Voted Wrong on Crit', 'Voted Right on Crit but Lost', 'Number of Kills',
                 'Ejected Early as Imp', 'Got Crew Voted', 'Solo Imp', 'Kills as Solo Imp',
-                'Won as Solo Imp', 'Alive Time', 'Match Time', 'Total Number Of Games Played',
+                'Won as Solo Imp', 'Alive Seconds', 'Match Seconds', 'Total Number Of Games Played',
                 'Number Of Crewmate Games Played', 'Number Of Impostor Games Won',
                 'Number Of Crewmate Games Won', 'Crewmate Win Streak', 'Best Crewmate Win Streak',
                 'Impostor Win Streak', 'Best Impostor Win Streak', 'Survivability (Impostor)',
@@ -121,9 +244,6 @@ class EventsLeaderboard:
             empty_df.index.name = 'Player Name'
             return empty_df
 
-        # Ensure 'Alive Time' and 'Match Time' are timedelta objects
-        valid_matches['Alive Time'] = pd.to_timedelta(valid_matches['Alive Time'])
-        valid_matches['Match Time'] = pd.to_timedelta(valid_matches['Match Time'])
         def count_length(arrays):
             return sum(len(eval(array)) if isinstance(array, str) else len(array) for array in arrays)
 
@@ -140,8 +260,8 @@ class EventsLeaderboard:
             'Solo Imp': 'sum',
             'Kills as Solo Imp': 'sum',
             'Won as Solo Imp': 'sum',
-            'Alive Time': 'sum',
-            'Match Time': 'sum'
+            'Alive Seconds': 'sum',
+            'Match Seconds': 'sum'
         }).rename(columns={
             'Player Team': 'Number Of Impostor Games Played',
             'Died First Round': 'Number Of Games Died First',
@@ -195,12 +315,8 @@ class EventsLeaderboard:
 
         # Calculate survivability ratios
         for team in ['impostor', 'crewmate']:
-            team_matches = valid_matches[valid_matches['Player Team'] == team]
-            survivability = team_matches.groupby('Player Name').apply(
-                lambda df: (df['Alive Time'].sum().total_seconds() / df['Match Time'].sum().total_seconds())
-                if df['Match Time'].sum() != pd.Timedelta(0) else 0,
-                include_groups=False
-            )
+            team_seconds = valid_matches[valid_matches['Player Team'] == team].groupby('Player Name')[['Alive Seconds', 'Match Seconds']].sum()
+            survivability = (team_seconds['Alive Seconds'] / team_seconds['Match Seconds'].where(team_seconds['Match Seconds'] != 0)).fillna(0)
             player_stats[f'Survivability ({team.capitalize()})'] = survivability.round(3)
 
         # Calculate voting accuracy for Crewmate games only, excluding those who died first round
@@ -214,6 +330,60 @@ class EventsLeaderboard:
         player_stats.index.name = 'Player Name'
         return player_stats
 
+    def replace_matches(self, rows_by_match:dict):
+        """Swap in new rows for already stored matches, keeping every match at its position in the frame."""
+        events_lb = self.events_lb
+        pieces = []
+        for match_id, positions in events_lb.groupby('Match ID', sort=False).indices.items():
+            if match_id in rows_by_match:
+                pieces.append(pd.DataFrame(rows_by_match[match_id], columns=events_lb.columns))
+            else:
+                pieces.append(events_lb.iloc[positions])
+        events_lb = pd.concat(pieces, ignore_index=True).fillna(0).infer_objects(copy=False)
+        if not events_lb['Index'].is_unique:
+            events_lb['Index'] = range(len(events_lb))
+        self.events_lb = events_lb
+        self.save()
+
+    def restore_match_ratings(self, match:Match) -> bool:
+        """Put the stored pre-match MMRs, gains and breakdowns of a match back on its replayed players.
+
+        Returns False when the match has no events rows (it was never rated)."""
+        rows = self.events_lb[self.events_lb['Match ID'] == match.id]
+        if rows.empty:
+            return False
+        rows_by_name = {row['Player Name']: row for row in rows.to_dict('records')}
+        player:PlayerInMatch
+        for player in match.players:
+            row = rows_by_name.get(player.name)
+            if row is None:
+                continue
+            player.current_mmr = row['MMR']
+            player.crewmate_current_mmr = row['Crewmate MMR']
+            player.impostor_current_mmr = row['Impostor MMR']
+            player.mmr_gain = row['MMR Gain']
+            player.crewmate_mmr_gain = row['Crewmate MMR Gain']
+            player.impostor_mmr_gain = row['Impostor MMR Gain']
+            player.percentage_of_winning = row['Percentage of Winning']
+            player.mmr_breakdown = parse_breakdown(row.get('MMR Breakdown'))
+            if player.mmr_breakdown:
+                player.performance = breakdown_performance(player.mmr_breakdown)
+            else:
+                # not recorded (or no modifier applied): derive it from the replayed match with the current settings
+                player.performance, player.mmr_breakdown = match.performance_breakdown(player)
+            # p as calculate_mmr had it, from the stored win probability and the performance
+            if player.won:
+                player.p = round((1 - player.percentage_of_winning) * player.performance, 4)
+            else:
+                player.p = round(-player.percentage_of_winning / player.performance, 4)
+        match.calculate_avg_mmr()
+        for player in match.players:
+            if player.team == 'crewmate':
+                match.crew_winning_percentage = player.percentage_of_winning
+                match.imp_winning_percentage = 1 - player.percentage_of_winning
+                break
+        return True
+
     def remove_match(self, match_id):
         self.events_lb = self.events_lb[self.events_lb['Match ID'] != match_id]
         self.save()
@@ -0,0 +1,59 @@
+import logging
+import os
+import pickle
+
+
+class MatchCache:
+    """On-disk cache of parsed matches.
+
+    Each *_match.json gets one pickle holding its lowercased match header and event
+    list, keyed by the size/mtime of both source files. Editing either JSON changes
+    the fingerprint, so the entry is rebuilt on the next load."""
+
+    VERSION = 1
+
+    def __init__(self, cache_dir):
+        self.logger = logging.getLogger('MatchCache')
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(file_path):
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def cache_path(self, json_file):
+        return os.path.join(self.cache_dir, f"{json_file}.pickle")
+
+    def load(self, path, json_file, read_header, read_events):
+        """Return (match header, events) for json_file; on a miss the header comes from
+        read_header(path, json_file) and the events from read_events(path, events file)."""
+        match_path = os.path.join(path, json_file)
+        match_fingerprint = self.fingerprint(match_path)
+        cache_path = self.cache_path(json_file)
+        try:
+            with open(cache_path, 'rb') as f:
+                version, fingerprints, match_norm, events_norm = pickle.load(f)
+            if version == self.VERSION and fingerprints[0] == match_fingerprint:
+                events_file = match_norm.get('eventslogfile')
+                if fingerprints[1] == self.fingerprint(os.path.join(path, events_file)):
+                    return match_norm, events_norm
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable cache entry {cache_path}: {e}")
+
+        match_norm = read_header(path, json_file)
+        events_file = match_norm.get('eventslogfile')
+        # stat before reading: a file rewritten while it is read then misses on the next load
+        events_fingerprint = self.fingerprint(os.path.join(path, events_file))
+        events_norm = read_events(path, events_file)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self.VERSION, (match_fingerprint, events_fingerprint), match_norm, events_norm),
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write cache entry {cache_path}: {e}")
+        return match_norm, events_norm
@@ -0,0 +1,171 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class MatchCatalog:
+    """Persistent index of the *_match.json files in a season folder.
+
+    Each entry is keyed by file name and stores the match id, events file, start time,
+    result and a size/mtime fingerprint, so a file is only re-read when it changes."""
+
+    VERSION = 1
+    # A miss in find() rescans the folder at most this often unless files were added or removed
+    MISS_REFRESH_INTERVAL = 30
+
+    def __init__(self, matches_path, catalog_file, parse_time):
+        self.logger = logging.getLogger('MatchCatalog')
+        self.matches_path = matches_path
+        self.catalog_file = catalog_file
+        self.parse_time = parse_time
+        self.entries = {}   # file name -> entry
+        self.by_id = {}     # str(match id) -> file name
+        self.order = []     # sorted [(start key, file name)]
+        self.refreshed_dir_mtime = None  # folder mtime at the last full refresh
+        self.refreshed_at = None         # monotonic time of the last full refresh
+        # The match watcher indexes files from the event loop while ingestion runs on its own thread
+        self.lock = threading.RLock()
+        self.load()
+
+    @staticmethod
+    def is_match_file(file_name):
+        return "match.json" in file_name.lower()
+
+    def load(self):
+        if not os.path.exists(self.catalog_file):
+            return
+        try:
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Failed to load match catalog {self.catalog_file}: {e}")
+            return
+        if data.get('version') != self.VERSION:
+            self.logger.info("Match catalog version changed - rebuilding")
+            return
+        for file_name, entry in data.get('entries', {}).items():
+            self._add(file_name, entry)
+
+    def save(self):
+        tmp_file = f"{self.catalog_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_file, self.catalog_file)
+
+    def _add(self, file_name, entry):
+        self.entries[file_name] = entry
+        if entry['match_id'] is not None:
+            self.by_id[str(entry['match_id'])] = file_name
+        bisect.insort(self.order, (entry['start_key'], file_name))
+
+    def _remove(self, file_name):
+        entry = self.entries.pop(file_name, None)
+        if entry is None:
+            return
+        if self.by_id.get(str(entry['match_id'])) == file_name:
+            del self.by_id[str(entry['match_id'])]
+        index = bisect.bisect_left(self.order, (entry['start_key'], file_name))
+        if index < len(self.order) and self.order[index] == (entry['start_key'], file_name):
+            del self.order[index]
+
+    def _read_entry(self, file_name, stat):
+        file_path = os.path.join(self.matches_path, file_name)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Failed to read match file {file_name}: {e}")
+            data = {}
+        data = {str(k).lower(): v for k, v in data.items()} if isinstance(data, dict) else {}
+        game_started = data.get('gamestarted') or data.get('gamestart')
+        started = self.parse_time(game_started) if game_started else datetime.min
+        return {
+            'match_id': data.get('matchid'),
+            'events_file': data.get('eventslogfile'),
+            'game_started': game_started,
+            'start_key': (started - datetime.min).total_seconds(),
+            'result': data.get('result'),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+        }
+
+    def _index_file(self, file_name, stat):
+        """Re-read file_name if its fingerprint changed; returns True if the catalog changed."""
+        entry = self.entries.get(file_name)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return False
+        self._remove(file_name)
+        self._add(file_name, self._read_entry(file_name, stat))
+        return True
+
+    def update_file(self, file_name):
+        """Index a single file that was just written (or drop it if it is gone)."""
+        with self.lock:
+            return self._update_file(file_name)
+
+    def _update_file(self, file_name):
+        try:
+            stat = os.stat(os.path.join(self.matches_path, file_name))
+        except FileNotFoundError:
+            changed = file_name in self.entries
+            self._remove(file_name)
+        else:
+            changed = self._index_file(file_name, stat)
+        if changed:
+            self.save()
+        return self.entries.get(file_name)
+
+    def refresh(self):
+        """Stat the season folder and re-read only new or modified match files."""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self):
+        changed = False
+        seen = set()
+        self.refreshed_dir_mtime = self._dir_mtime()
+        self.refreshed_at = time.monotonic()
+        with os.scandir(self.matches_path) as it:
+            for dir_entry in it:
+                if not self.is_match_file(dir_entry.name):
+                    continue
+                seen.add(dir_entry.name)
+                changed |= self._index_file(dir_entry.name, dir_entry.stat())
+        for file_name in [name for name in self.entries if name not in seen]:
+            self._remove(file_name)
+            changed = True
+        if changed:
+            self.save()
+        return changed
+
+    def _dir_mtime(self):
+        try:
+            return os.stat(self.matches_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stale(self):
+        """Whether a full refresh may find something new: files were added or removed since the
+        last one, or it is older than MISS_REFRESH_INTERVAL (files rewritten in place)."""
+        if self.refreshed_at is None or self._dir_mtime() != self.refreshed_dir_mtime:
+            return True
+        return time.monotonic() - self.refreshed_at >= self.MISS_REFRESH_INTERVAL
+
+    def find(self, match_id):
+        with self.lock:
+            file_name = self.by_id.get(str(match_id))
+            # unknown ids (typos) only cost a folder stat; written files reach the catalog through update_file
+            if file_name is None and self._stale() and self._refresh():
+                file_name = self.by_id.get(str(match_id))
+            return file_name
+
+    def get(self, file_name):
+        return self.entries.get(file_name)
+
+    def sorted_files(self):
+        with self.lock:
+            return [file_name for _, file_name in self.order]
@@ -1,14 +1,84 @@
 from player_in_match import PlayerInMatch
 from rapidfuzz import fuzz
-import numpy as np
-import yaml
-import os
+from config_service import ranked_percentages
+from win_probability import win_probability
 
-# Load ranked percentages config
-with open(os.path.join('config', 'ranked_percentages.yaml'), 'r', encoding='utf-8') as f:
-    ranked_percentages = yaml.safe_load(f)
+# Performance modifiers recorded by Match.calculate_mmr, code -> label
+MODIFIERS = {
+    'CV': "Voted Imp", 'IV': "Voted Crew", 'CG': "Voted Crew on Ej", 'TK': "Tasks",
+    'WC': "Voted Wrg on Crit", 'EJ': "Imp on Ej", 'RC': "Voted Rgt on Crit & L",
+    'WS': "Rounds survived", 'LS': "Rounds survived", 'SS': "Rounds survived (SoloImp)",
+    'EE': "EjEarly", 'SI': "SImp", 'IG': "Voted Crewmates", 'SK': "SoloImp-kills", 'SW': "Solo Imp Win", 'KL': "Kills",
+    'MIN': "Min Perf", 'D1W': "Dead1st", 'D1L': "Dead1st",
+}
+PENALTY_MODIFIERS = {'IV', 'CG', 'WC', 'LS', 'SS', 'EE'}
+SET_MODIFIERS = {'MIN', 'D1W', 'D1L'}
+
+def breakdown_text(modifiers) -> str:
+    """Events/CSV form of a breakdown: 'CV:1.1;WC:1.3'."""
+    return ";".join(f"{code}:{factor:.6g}" for code, factor in modifiers)
+
+def parse_breakdown(text) -> list:
+    """[(code, factor), ...] of a stored breakdown; empty for rows rated before it was recorded."""
+    if not isinstance(text, str) or not text:
+        return []
+    modifiers = []
+    for item in text.split(";"):
+        code, _, factor = item.partition(":")
+        modifiers.append((code, float(factor)))
+    return modifiers
+
+def breakdown_performance(modifiers, performance=1.0) -> float:
+    """Performance after applying a breakdown (to display precision for stored ones)."""
+    for code, factor in modifiers:
+        if code in PENALTY_MODIFIERS:
+            performance /= factor
+        elif code in SET_MODIFIERS:
+            performance = factor
+        else:
+            performance *= factor
+    return performance
+
+# Labels with the counts a modifier was computed from, for match_details
+COUNTED_MODIFIERS = {
+    'CV': lambda player: f"Voted {player.number_of_correct_votes} Imp",
+    'IV': lambda player: f"Voted {player.number_of_incorrect_votes} Crew",
+    'CG': lambda player: f"Voted {len(player.got_crew_voted)} Crew on Ej",
+    'TK': lambda player: f"{player.tasks_complete} Tasks",
+    'EJ': lambda player: f"Voted {len(player.correct_vote_on_eject)} Imp on Ej",
+    'IG': lambda player: f"Voted {len(player.got_crew_voted)} Crewmates",
+    'SK': lambda player: f"SoloImp-kills {player.kills_as_solo_imp}",
+    'KL': lambda player: f"Kills {player.number_of_kills}",
+}
+
+def describe_breakdown(modifiers, player:PlayerInMatch=None) -> str:
+    """'(Voted Imp +10%) (Voted Wrg on Crit -30%) ...' for a breakdown; with player the labels
+    carry its counts, e.g. '(Voted 2 Imp +10%)'."""
+    parts = []
+    for code, factor in modifiers:
+        if player is not None and code in COUNTED_MODIFIERS:
+            label = COUNTED_MODIFIERS[code](player)
+        else:
+            label = MODIFIERS.get(code, code)
+        if code in SET_MODIFIERS:
+            parts.append(f"({label} ={factor*100:.0f}%)")
+        elif code in PENALTY_MODIFIERS:
+            parts.append(f"({label} -{(factor - 1)*100:.0f}%)")
+        else:
+            parts.append(f"({label} +{(factor - 1)*100:.0f}%)")
+    return " ".join(parts)
+
+def normalize_name(name) -> str:
+    """Lowercased name without spaces, like match_rerate.player_key."""
+    return str(name).lower().replace(" ", "")
 
 class Match:
+    __slots__ = ('id', 'match_start_time', 'match_end_time', 'match_duration', 'start_epoch', 'players', 'impostors',
+                 '_players_by_name', '_players_by_normalized', '_resolved_names', '_impostor_players',
+                 'crewmates_count', 'impostors_count', 'avg_impostor_mmr', 'avg_crewmate_mmr',
+                 'crew_winning_percentage', 'imp_winning_percentage', 'rounds', 'solo_imp_game', 'alive_players',
+                 'alive_impostors', 'snapshots', 'k', 'result', 'match_file_name', 'event_file_name')
+
     def __init__(self, 
                  id:int=None,
                  players:list=None,
@@ -17,32 +87,49 @@ class Match:
                  result:str=None, 
                  match_file_name:str=None, 
                  event_file_name:str=None,
-                 k = 32
+                 k = None
                  ):
         self.id = id
         self.match_start_time = match_start_time
         self.match_end_time = match_end_time
         self.match_duration = None
+        self.start_epoch = None
         self.players = players
         self.impostors:list = None
+        self._players_by_name = {}        # exact name -> player
+        self._players_by_normalized = {}  # lowercased name without spaces -> [players]
+        self._resolved_names = {}         # looked up name -> player (or None), memoized fuzzy matches
+        self._impostor_players = set()
         self.crewmates_count = 0
         self.impostors_count = 0
         self.avg_impostor_mmr = 0
         self.avg_crewmate_mmr = 0
-        self.crew_winning_percentage = ranked_percentages['crew_base_win_percentage']
-        self.imp_winning_percentage = ranked_percentages['imp_base_win_percentage']
+        params = ranked_percentages()
+        self.crew_winning_percentage = params['crew_base_win_percentage']
+        self.imp_winning_percentage = params['imp_base_win_percentage']
         self.rounds = 1
         self.solo_imp_game = False
         self.alive_players = 10
         self.alive_impostors = 2
+        self.snapshots = []   # per-event EventSnapshot list filled by match_replay.replay_events
         
-        self.k = ranked_percentages['k_factor'] if k is None else k
+        self.k = params['k_factor'] if k is None else k
         self.result = result
         self.match_file_name = match_file_name
         self.event_file_name = event_file_name
+        for player in self.players or []:
+            self._index_player(player)
         
+    def _index_player(self, player : PlayerInMatch):
+        self._players_by_name.setdefault(player.name, player)
+        self._players_by_normalized.setdefault(normalize_name(player.name), []).append(player)
+        if player.team.lower() == 'impostor':
+            self._impostor_players.add(player)
+        self._resolved_names.clear()
+
     def add_player(self, player : PlayerInMatch):
         self.players.append(player)
+        self._index_player(player)
         if player.team == 'impostor':
             self.impostors_count += 1
         elif player.team == 'crewmate':
@@ -67,63 +154,10 @@ class Match:
         self.avg_impostor_mmr = impostor_mmr / self.impostors_count
         self.avg_crewmate_mmr = crewmate_mmr / self.crewmates_count
     
-    def calculate_percentage_of_winning(self):
-        player : PlayerInMatch
-        
-        def winning_prob(avg_crew_elo, avg_imp_elo):
-            
-            def log_function(diff):
-                a = ranked_percentages['win_prob_a']
-                b = ranked_percentages['win_prob_b']
-                c = ranked_percentages['win_prob_c']
-                d = ranked_percentages['win_prob_d']
-                return a * np.log(b * diff + c) + d
-
-            difference = avg_crew_elo - avg_imp_elo
-            if difference < 0:
-                difference = abs(difference)
-                prob_change = log_function(difference)
-                win_prob = ranked_percentages['crew_base_win_percentage'] - prob_change
-                if win_prob < ranked_percentages['min_win_probability']: 
-                    win_prob = ranked_percentages['min_win_probability']
-                return win_prob
-            else:
-                prob_change = log_function(difference)
-                win_prob = ranked_percentages['crew_base_win_percentage'] + prob_change
-                if win_prob > ranked_percentages['max_win_probability']: 
-                    win_prob = ranked_percentages['max_win_probability']
-                return win_prob
-        
-        self.crew_winning_percentage = winning_prob(self.avg_crewmate_mmr, self.avg_impostor_mmr)
-        self.imp_winning_percentage = 1 - self.crew_winning_percentage
-        for player in self.players:
-            if player.team == 'impostor':
-                player.percentage_of_winning = self.imp_winning_percentage
-            elif player.team == 'crewmate':
-                player.percentage_of_winning = self.crew_winning_percentage
-        # a = 0.043290409437842466
-        # b = 7.855256175054392
-        # c = 98.05742514755777
-        # d = -0.19883086302819628
-
-    def calculate_percentage_of_winning_elo(self): # not used
-        """Calculate win probabilities using the ELO formula"""
+    def calculate_percentage_of_winning(self, params=None):
         player : PlayerInMatch
-        
-        def elo_expected_score(avg_crew_mmr, avg_imp_mmr):
-            # Expected Score (Ev) = 1 / (1 + 10^((Rating2 - Rating1) / 400))
-            # Here Rating2 is avg_imp_mmr and Rating1 is avg_crew_mmr
-            exponent = (avg_imp_mmr - avg_crew_mmr) / 400
-            crew_win_prob = 1 / (1 + pow(10, exponent))
-            
-            # Crew win probability is the direct result of the ELO formula
-            return crew_win_prob
-        
-        # Calculate crew win probability using ELO formula
-        self.crew_winning_percentage = elo_expected_score(self.avg_crewmate_mmr, self.avg_impostor_mmr)
+        self.crew_winning_percentage = win_probability(self.avg_crewmate_mmr, self.avg_impostor_mmr, params)
         self.imp_winning_percentage = 1 - self.crew_winning_percentage
-        
-        # Assign win probabilities to players
         for player in self.players:
             if player.team == 'impostor':
                 player.percentage_of_winning = self.imp_winning_percentage
@@ -139,56 +173,87 @@ class Match:
         return team_players
     
     def get_player_by_name(self, name)->PlayerInMatch:
-        for player in self.players:
-            if player.name == name:
-                return player 
-        for player in self.players:
-            if fuzz.ratio(player.name, name)>=70:
-                return player
+        player = self._players_by_name.get(name)
+        if player is not None:
+            return player
+        if name in self._resolved_names:
+            return self._resolved_names[name]
+        # Same result as a plain scan: exact name first, then the first player in list order that is
+        # close enough. A unique case/space variant is taken when it is close enough and no player
+        # before it in the list is, so only that prefix has to be scanned.
+        candidates = self._players_by_normalized.get(normalize_name(name), []) if name is not None else []
+        player = None
+        if len(candidates) == 1 and fuzz.ratio(candidates[0].name, name)>=70:
+            for p in self.players:
+                if p is candidates[0] or fuzz.ratio(p.name, name)>=70:
+                    player = p
+                    break
+        else:
+            player = next((p for p in self.players if fuzz.ratio(p.name, name)>=70), None)
+        self._resolved_names[name] = player
+        return player
+
+    def performance_breakdown(self, player:PlayerInMatch, params=None):
+        """(performance, [(code, factor), ...]) of a player: every modifier of MODIFIERS that applies, in order.
+
+        Bonuses multiply the performance by their factor, penalties divide it, and MIN/D1W/D1L set
+        it to their factor. Performance does not depend on MMR."""
+        rp = ranked_percentages() if params is None else params
+        performance = player.performance
+        modifiers = []
+
+        def apply(code, factor):
+            nonlocal performance
+            performance = breakdown_performance([(code, factor)], performance)
+            modifiers.append((code, factor))
+
+        if player.team == 'crewmate':
+            if player.number_of_correct_votes: apply('CV', 1 + (player.number_of_correct_votes * rp['crew_correct_vote_bonus']))
+            if player.number_of_incorrect_votes: apply('IV', 1 + (player.number_of_incorrect_votes * rp['crew_incorrect_vote_penalty']))
+            if player.got_crew_voted: apply('CG', 1 + (rp['crew_got_voted_penalty'] * len(player.got_crew_voted)))
+            if player.tasks_complete: apply('TK', 1 + (player.tasks_complete * rp['crew_task_bonus']))
+
+            if player.voted_wrong_on_crit: apply('WC', 1 + rp['crew_wrong_crit_penalty'])
+            # x * 1.0 is exact, so a player without correct ejects can skip the factor
+            if player.correct_vote_on_eject: apply('EJ', 1 + sum(players_alive * rp['crew_correct_eject_bonus'] for players_alive in player.correct_vote_on_eject))
+            if player.right_vote_on_crit_but_loss: apply('RC', 1 + rp['crew_right_crit_loss_bonus'])
 
-    def calculate_mmr(self):
+            if player.won:
+                if player.rounds_survived: apply('WS', 1 + (player.rounds_survived * rp['crew_win_survival_bonus']))
+            elif player.rounds_survived:
+                apply('LS', 1 + (player.rounds_survived * rp['crew_loss_survival_penalty']))
+                if self.solo_imp_game:
+                    apply('SS', 1 + (player.rounds_survived * rp['crew_solo_imp_survival_penalty']))
+
+        elif player.team == 'impostor':
+            if player.ejected_early_as_imp: apply('EE', 1 + rp['imp_early_eject_penalty'])
+            if player.solo_imp : apply('SI', 1 + rp['imp_solo_bonus'])
+            if player.got_crew_voted: apply('IG', 1 + (rp['imp_got_voted_bonus'] * len(player.got_crew_voted)))
+            if player.kills_as_solo_imp > 0: apply('SK', 1 + (rp['imp_solo_kill_bonus'] * player.kills_as_solo_imp))
+            if player.won_as_solo_imp : apply('SW', 1 + rp['imp_solo_win_bonus'])
+            if player.number_of_kills > 0: apply('KL', 1 + (player.number_of_kills * rp['imp_kill_bonus']))
+
+        if performance < rp['min_performance']:
+            apply('MIN', rp['min_performance'])
+        if player.died_first_round:
+            apply('D1W' if player.won else 'D1L', rp['died_first_win_performance'] if player.won else rp['max_loss_performance'])
+        return performance, modifiers
+
+    def calculate_mmr(self, params=None):
+        """MMR gains of every player; pass the params calculate_percentage_of_winning used so a
+        config reload in between cannot mix two versions of ranked_percentages in one match."""
         if self.result.lower() in ["canceled", "unknown"]:
             return
+        params = ranked_percentages() if params is None else params
         player:PlayerInMatch
         for player in self.players:
-
-            if player.team == 'crewmate': 
-                if player.number_of_correct_votes: player.performance *= 1 + (player.number_of_correct_votes * ranked_percentages['crew_correct_vote_bonus'])
-                if player.number_of_incorrect_votes: player.performance /= 1 + (player.number_of_incorrect_votes * ranked_percentages['crew_incorrect_vote_penalty'])
-                if player.got_crew_voted: player.performance /= 1 + (ranked_percentages['crew_got_voted_penalty'] * len(player.got_crew_voted))
-                if player.tasks_complete: player.performance *= 1 + (player.tasks_complete * ranked_percentages['crew_task_bonus'])
-
-                if player.voted_wrong_on_crit: player.performance /= 1 + ranked_percentages['crew_wrong_crit_penalty']
-                if player.correct_vote_on_eject != None: player.performance *= 1 + sum(correct_vote[0] * ranked_percentages['crew_correct_eject_bonus'] for correct_vote in player.correct_vote_on_eject) #correct_vote[0] is players alive
-                if player.right_vote_on_crit_but_loss: player.performance *= 1 + ranked_percentages['crew_right_crit_loss_bonus']
-            
-                if player.won:
-                    player.performance *= 1 + (player.rounds_survived * ranked_percentages['crew_win_survival_bonus'])
-                else:
-                    player.performance /= 1 + (player.rounds_survived * ranked_percentages['crew_loss_survival_penalty'])
-                    if self.solo_imp_game:
-                        player.performance /= 1 + (player.rounds_survived * ranked_percentages['crew_solo_imp_survival_penalty'])
-
-            elif player.team == 'impostor':
-                if player.ejected_early_as_imp: player.performance /= 1 + ranked_percentages['imp_early_eject_penalty']
-                if player.solo_imp : player.performance *= 1 + ranked_percentages['imp_solo_bonus']
-                if player.got_crew_voted: player.performance *= 1 + (ranked_percentages['imp_got_voted_bonus'] * len(player.got_crew_voted))
-                if player.kills_as_solo_imp > 0: player.performance *= 1 + (ranked_percentages['imp_solo_kill_bonus'] * player.kills_as_solo_imp)
-                if player.won_as_solo_imp : player.performance *= 1 + ranked_percentages['imp_solo_win_bonus']
-                if player.number_of_kills > 0: player.performance *= 1 + (player.number_of_kills * ranked_percentages['imp_kill_bonus'])
-                        
-            if player.performance < ranked_percentages['min_performance']:
-                player.performance = ranked_percentages['min_performance']
+            player.performance, player.mmr_breakdown = self.performance_breakdown(player, params)
 
             if player.won:
-                if player.died_first_round:
-                    player.performance = ranked_percentages['died_first_win_performance']
                 player.p = (1 - player.percentage_of_winning)
                 player.p *= player.performance
 
             else:
-                if player.died_first_round:
-                    player.performance = ranked_percentages['max_loss_performance']
                 player.p = player.percentage_of_winning
                 player.p /= player.performance
                 player.p *= -1
@@ -207,54 +272,19 @@ class Match:
         string = ""
         string+=f"Match ({self.id}) - Result ({self.result}) - Crew Avg Elo({self.avg_crewmate_mmr}) - Imp Avg Elo({self.avg_impostor_mmr})\n"
         player : PlayerInMatch
-        for player in self.players:
-            if player.team == "crewmate":
-                string+=f"{player.name}: CElo({player.crewmate_current_mmr}) C-+({player.crewmate_mmr_gain}) P/Per({round(player.p,2)},{round(player.performance,2)}) VAcc({player.voting_accuracy}) "
-                if player.died_first_round:
-                    string+=f"(Dead1st {ranked_percentages['died_first_win_performance']*100:.0f}%) "
-                if player.voted_wrong_on_crit:
-                    string+=f"(Voted Wrg on Crit -{ranked_percentages['crew_wrong_crit_penalty']*100:.0f}%) "
-                if player.right_vote_on_crit_but_loss:
-                    string+=f"(Voted Rgt on Crit & L +{ranked_percentages['crew_right_crit_loss_bonus']*100:.0f}%) "
-                if player.correct_vote_on_eject:
-                    string+=f"(Voted {len(player.correct_vote_on_eject)} Imp on Ej +{sum(correct_vote[0] * ranked_percentages['crew_correct_eject_bonus']*100 for correct_vote in player.correct_vote_on_eject):.0f}%) "
-                if player.number_of_correct_votes:
-                    string+=f"(Voted {player.number_of_correct_votes} Imp +{player.number_of_correct_votes*ranked_percentages['crew_correct_vote_bonus']*100:.0f}%) "
-                if player.got_crew_voted:
-                    string+=f"(Voted {len(player.got_crew_voted)} Crew on Ej -{len(player.got_crew_voted)*ranked_percentages['crew_got_voted_penalty']*100:.0f}%) "
-                if player.number_of_incorrect_votes > 0:
-                    string+=f"(Voted {player.number_of_incorrect_votes} Crew -{player.number_of_incorrect_votes*ranked_percentages['crew_incorrect_vote_penalty']*100:.0f}%) "
-                if player.tasks_complete > 0:
-                    string+=f"({player.tasks_complete} Tasks +{player.tasks_complete*ranked_percentages['crew_task_bonus']*100:.0f}%) "
-                if player.won:
-                    if player.rounds_survived: 
-                        string+=f"(Rounds survived +{player.rounds_survived*ranked_percentages['crew_win_survival_bonus']*100:.0f}%) "
-                else:
-                    if player.rounds_survived: 
-                        if not self.solo_imp_game:
-                            string+=f"(Rounds survived -{player.rounds_survived*ranked_percentages['crew_loss_survival_penalty']*100:.0f}%) "
-                        else: #solo imp -4%
-                            string+=f"(Rounds survived -{player.rounds_survived*(ranked_percentages['crew_loss_survival_penalty']+ranked_percentages['crew_solo_imp_survival_penalty'])*100:.0f}%) "
-                string +="\n"
-
-        for player in self.players:
-            if player.team == "impostor":
-                string += f"{player.name}: IElo({player.impostor_current_mmr}) I-+({player.impostor_mmr_gain}) P/Per({round(player.p,2)},{round(player.performance,2)}) "
-                if player.ejected_early_as_imp:
-                    string+=f"(EjEarly -{ranked_percentages['imp_early_eject_penalty']*100:.0f}%) "
-                if player.solo_imp:
-                    string+=f"(SoloImp-kills {player.kills_as_solo_imp} +{player.kills_as_solo_imp*ranked_percentages['imp_solo_kill_bonus']*100:.0f}) +{ranked_percentages['imp_solo_bonus']*100:.0f}%(SImp) "
-                if player.got_crew_voted:
-                    string+=f"(Voted {len(player.got_crew_voted)} Crewmates +{len(player.got_crew_voted)*ranked_percentages['imp_got_voted_bonus']*100:.0f}%) "
-                if player.won_as_solo_imp:
-                    string+=f"(Solo Imp Win +{ranked_percentages['imp_solo_win_bonus']*100:.0f}%) "
-                if player.number_of_kills > 0: string+=f"Kills {player.number_of_kills} +({player.number_of_kills*ranked_percentages['imp_kill_bonus']*100:.0f}%) "
-                string += "\n"
+        # rendered from the breakdown recorded when the match was rated, so it shows what was applied
+        for player in self.get_players_by_team("crewmate"):
+            string+=f"{player.name}: CElo({player.crewmate_current_mmr}) C-+({player.crewmate_mmr_gain}) P/Per({round(player.p,2)},{round(player.performance,2)}) VAcc({player.voting_accuracy}) "
+            string+=describe_breakdown(player.mmr_breakdown, player) + "\n"
+        for player in self.get_players_by_team("impostor"):
+            string += f"{player.name}: IElo({player.impostor_current_mmr}) I-+({player.impostor_mmr_gain}) P/Per({round(player.p,2)},{round(player.performance,2)}) "
+            string+=describe_breakdown(player.mmr_breakdown, player) + "\n"
         return string 
 
     def is_player_imp(self, player_name : str):
-        try:
-            if player_name == "none": return False
-            return self.get_player_by_name(player_name).team.lower() == "impostor"
-        except:
-            print(player_name)
\ No newline at end of file
+        if player_name == "none": return False
+        player = self.get_player_by_name(player_name)
+        if player is None:
+            print(player_name)
+            return None
+        return player in self._impostor_players
@@ -0,0 +1,207 @@
+from collections import namedtuple
+from player_in_match import PlayerInMatch
+from match_class import Match
+
+# Game state at the moment an event happened (before the event is applied).
+# player/target are the PlayerInMatch objects the event refers to, alive_mask has
+# bit i set while match.players[i] is alive.
+EventSnapshot = namedtuple('EventSnapshot', ['index', 'event_type', 'event', 'players_alive', 'imps_alive',
+                                             'round', 'meeting', 'crit', 'alive_mask', 'player', 'target'])
+
+# event type -> (handler, actor key, target key)
+EVENT_HANDLERS = {}
+
+
+def event_handler(event_type, actor=None, target=None):
+    """Register handler(state, event, snapshot) for event_type.
+
+    actor/target name the event keys holding the player names the replay loop
+    resolves into snapshot.player/snapshot.target before calling the handler."""
+    def register(handler):
+        EVENT_HANDLERS[event_type] = (handler, actor, target)
+        return handler
+    return register
+
+
+def is_crit(players_alive, imps_alive):
+    """A wrong eject at this point can lose the game for the crewmates."""
+    return players_alive in (3, 4) or (players_alive in (5, 6, 7) and imps_alive == 2)
+
+
+class GameState:
+    __slots__ = ('match', 'players_alive', 'imps_alive', 'death_happened', 'meeting_called_after_death',
+                 'meeting', 'alive_mask', 'bits')
+
+    def __init__(self, match:Match, players_alive, imps_alive):
+        self.match = match
+        self.players_alive = players_alive
+        self.imps_alive = imps_alive
+        self.death_happened = False
+        self.meeting_called_after_death = False
+        self.meeting = 0
+        self.bits = {player: 1 << i for i, player in enumerate(match.players)}
+        self.alive_mask = (1 << len(match.players)) - 1
+
+    def kill(self, player:PlayerInMatch, time):
+        player.alive = False
+        player.time_of_death = time
+        player.rounds_survived = self.match.rounds
+        self.alive_mask &= ~self.bits[player]
+
+    def update_end_time(self, time):
+        if self.match.match_end_time < time:
+            self.match.match_end_time = time
+
+    def player(self, name)->PlayerInMatch:
+        if isinstance(name, str) and name.endswith(" |"):
+            name = name[:-2]
+        return self.match.get_player_by_name(name)
+
+
+def replay_events(match:Match, events, players_alive, imps_alive):
+    """Replay events on match in one pass; returns (snapshots, final state)."""
+    state = GameState(match, players_alive, imps_alive)
+    snapshots = []
+    for index, event in enumerate(events):
+        event_type = event.get('event')
+        handler, actor, target = EVENT_HANDLERS.get(event_type, (None, None, None))
+        snapshot = EventSnapshot(index, event_type, event, state.players_alive, state.imps_alive,
+                                 match.rounds, state.meeting, is_crit(state.players_alive, state.imps_alive),
+                                 state.alive_mask,
+                                 state.player(event.get(actor)) if actor else None,
+                                 state.player(event.get(target)) if target else None)
+        snapshots.append(snapshot)
+        if handler is not None:
+            handler(state, event, snapshot)
+    return snapshots, state
+
+
+def is_alive(match:Match, snapshot:EventSnapshot, player:PlayerInMatch):
+    return bool(snapshot.alive_mask >> match.players.index(player) & 1)
+
+
+@event_handler("Task", actor='name')
+def on_task(state:GameState, event, snapshot:EventSnapshot):
+    player = snapshot.player
+    player.finished_task()
+    if player.tasks_complete == 10:
+        if player.alive:
+            player.finished_tasks_alive = True
+        else:
+            player.finished_tasks_dead = True
+
+
+@event_handler("Death", actor='name', target='killer')
+def on_death(state:GameState, event, snapshot:EventSnapshot):
+    player = snapshot.player
+    if player.alive == False:
+        return
+    state.players_alive -= 1 # one player killed
+    state.death_happened = True
+    state.kill(player, event.get('time'))
+    player.died_first_round = not state.meeting_called_after_death
+
+    killer = snapshot.target
+    if killer is not None:
+        killer.got_a_kill()
+        if killer.solo_imp: killer.kills_as_solo_imp += 1
+    state.update_end_time(event.get('time'))
+
+
+@event_handler("BodyReport", actor='player', target='deadplayer')
+def on_body_report(state:GameState, event, snapshot:EventSnapshot):
+    state.meeting_called_after_death = True
+    state.meeting += 1
+
+
+@event_handler("MeetingStart", actor='player')
+def on_meeting_start(state:GameState, event, snapshot:EventSnapshot):
+    if state.death_happened:
+        state.meeting_called_after_death = True
+    state.meeting += 1
+
+
+@event_handler("PlayerVote", actor='player', target='target')
+def on_player_vote(state:GameState, event, snapshot:EventSnapshot):
+    match = state.match
+    if state.death_happened:
+        state.meeting_called_after_death = True
+
+    player = snapshot.player
+    if str(event.get('target')).lower() =='none':
+        player.skipped_vote()
+    elif match.is_player_imp(event.get('target')):
+        player.correct_vote()
+    else:
+        player.incorrect_vote()
+
+    player.last_voted = event.get('target')
+    state.update_end_time(event.get('time'))
+
+
+@event_handler("Exiled", actor='player')
+def on_exiled(state:GameState, event, snapshot:EventSnapshot):
+    match = state.match
+    ejected_player_name = event.get('player')
+    ejected = snapshot.player
+    if ejected.alive == False:
+        return
+    state.kill(ejected, event.get('time'))
+    ejected.ejected_in_meeting = True
+    players_alive = state.players_alive
+
+    if match.is_player_imp(ejected_player_name):
+        state.imps_alive -= 1
+        if players_alive >= 7:
+            for player in match.get_players_by_team("impostor"):
+                if player.name == ejected_player_name:
+                    player.ejected_early_as_imp = True
+                else:
+                    player.solo_imp = True
+                    match.solo_imp_game = True
+        for player in match.get_players_by_team("crewmate"):
+            if player.last_voted == ejected_player_name and player.alive: #crewmate voted an imp out
+                player.correct_vote_on_eject.append(players_alive)
+
+    else: # voted a crewmate or skipped
+        for player in match.players:
+            if player.alive:
+                if player.last_voted == ejected_player_name and player.team == "crewmate":
+                    player.got_crew_voted.append(players_alive) # all players who voted out a crewmate
+
+                elif player.team == "impostor":
+                    player.got_crew_voted.append(players_alive)
+
+                if snapshot.crit and player.team == "crewmate" and not player.won:
+                    if match.is_player_imp(player.last_voted):
+                        player.right_vote_on_crit_but_loss = True
+
+                    elif players_alive in [3,5,6]:
+                        player.voted_wrong_on_crit = True
+                    elif players_alive in [4,7] and (player.last_voted != "Skipped" and player.last_voted != "none"):
+                        player.voted_wrong_on_crit = True
+
+    state.players_alive -= 1 # one player ejected
+    imps_alive = state.imps_alive
+    players_alive = state.players_alive
+    if imps_alive == 0 or (players_alive==1 and imps_alive==1) or (players_alive==2 and imps_alive==2): #game ended
+        pass
+    else:
+        match.rounds+=1
+
+
+@event_handler("MeetingEnd")
+def on_meeting_end(state:GameState, event, snapshot:EventSnapshot):
+    if event.get("result") not in ("Skipped", "Tie"):
+        return
+    match = state.match
+    match.rounds+=1
+    # A skip only loses the game at 3 alive, or at 5-6 alive with both impostors left
+    if ((state.players_alive in [5,6]) and (state.imps_alive == 2)) or state.players_alive == 3:
+        for player in match.players:
+            if not player.alive: continue
+            if player.team == "crewmate" and not player.won:
+                if (player.last_voted == "none" or player.last_voted == None or player.last_voted == "missed" or not match.is_player_imp(player.last_voted)):
+                    player.voted_wrong_on_crit = True
+                elif match.is_player_imp(player.last_voted):
+                    player.right_vote_on_crit_but_loss = True
@@ -0,0 +1,150 @@
+import logging
+import pandas as pd
+from config_service import ranked_percentages, settings
+from player_in_match import PlayerInMatch
+from match_class import Match
+from mmr_kernel import calculate_mmr_matches
+
+
+def player_key(player_name):
+    return str(player_name).lower().replace(" ", "")
+
+
+def is_rated(result, player_count):
+    return str(result).lower() not in ("canceled", "unknown") and player_count == 10
+
+
+class MatchReRater:
+    """Re-rates a changed match and the later matches whose ratings depend on it.
+
+    The events frame is in rating order. MMRs are rolled forward from the nearest checkpoint
+    before the changed match using the stored gains. From the changed match on, a match is
+    re-rated when it shares a player with a match re-rated before it; its players then join
+    the affected set, everything else keeps its stored rows. Leaderboard entries of affected
+    players move by the difference between their new and old MMR, so staff MMR changes stay."""
+
+    def __init__(self, file_handler):
+        self.logger = logging.getLogger('MatchReRater')
+        self.file_handler = file_handler
+        self.default_mmr = (float(settings().current_mmr), float(settings().crewmate_current_mmr), float(settings().impostor_current_mmr))
+
+    def start_state(self, position, order, rows):
+        """(start position, player key -> [MMR, Crewmate MMR, Impostor MMR]) of the nearest checkpoint before position.
+
+        A checkpoint is only used when its events watermark equals the number of events rows of
+        the first `checkpoint position` matches of order (row indices per match in rows), i.e. it
+        was taken right after the match it claims; otherwise an earlier one is tried."""
+        checkpoints = self.file_handler.checkpoints
+        checkpoint = checkpoints.nearest_before(position)
+        while checkpoint is not None:
+            start = checkpoint['position']
+            if start <= len(order) and sum(len(rows[match_id]) for match_id in order[:start]) == checkpoint['events_watermark']:
+                break
+            self.logger.warning(f"Checkpoint at match {start} does not match the events order - trying an earlier one")
+            checkpoint = checkpoints.nearest_before(start)
+        if checkpoint is None:
+            return 0, {}
+        leaderboard = checkpoint['leaderboard']
+        state = {}
+        for name, mmr, crew, imp in zip(leaderboard['Player Name'], leaderboard['MMR'], leaderboard['Crewmate MMR'], leaderboard['Impostor MMR']):
+            state.setdefault(player_key(name), [float(mmr), float(crew), float(imp)])
+        self.logger.info(f"Re-rating from the checkpoint at match {checkpoint['position']}")
+        return checkpoint['position'], state
+
+    def apply_gains(self, state, name, crew_gain, imp_gain):
+        # Same arithmetic as Leaderboard.update_player
+        mmr = state.setdefault(player_key(name), list(self.default_mmr))
+        mmr[0] = round(mmr[0] + (crew_gain + imp_gain) / 2, 3)
+        mmr[1] = round(mmr[1] + crew_gain, 3)
+        mmr[2] = round(mmr[2] + imp_gain, 3)
+
+    def rate(self, match_id, state) -> Match:
+        """Replay match_id from its file and rate it against the MMRs in state."""
+        file_handler = self.file_handler
+        match_file = file_handler.find_matchfile_by_id(match_id)
+        match = file_handler.replay_file(match_file, file_handler.special_match_k(match_id))
+        if match is None:
+            raise ValueError(f"Could not replay match {match_id} ({match_file})")
+        player:PlayerInMatch
+        for player in match.players:
+            player.current_mmr, player.crewmate_current_mmr, player.impostor_current_mmr = state.get(player_key(player.name), self.default_mmr)
+        if match.result not in ["Canceled", "Unknown"]:
+            params = ranked_percentages()
+            match.calculate_avg_mmr()
+            match.calculate_percentage_of_winning(params)
+            calculate_mmr_matches([match], params)
+        return match
+
+    def rerate(self, match_id):
+        """Re-rate match_id (already stored in the events) and its dependents.
+
+        Returns (the changed Match, number of re-rated matches, number of affected players)."""
+        file_handler = self.file_handler
+        events_leaderboard = file_handler.events_leaderboard
+        events = events_leaderboard.events_lb
+        order = list(pd.unique(events['Match ID']))
+        rows = events.groupby('Match ID', sort=False).indices
+        position = order.index(match_id)
+
+        start, old_state = self.start_state(position + 1, order, rows)
+        names = events['Player Name'].to_numpy()
+        results = events['Match Result'].to_numpy()
+        crew_gains = events['Crewmate MMR Gain'].to_numpy(dtype=float)
+        imp_gains = events['Impostor MMR Gain'].to_numpy(dtype=float)
+        indexes = events['Index'].to_numpy()
+
+        def roll(state, stored_match_id):
+            match_rows = rows[stored_match_id]
+            if is_rated(results[match_rows[0]], len(match_rows)):
+                for row in match_rows:
+                    self.apply_gains(state, names[row], crew_gains[row], imp_gains[row])
+
+        for stored_match_id in order[start:position]:
+            roll(old_state, stored_match_id)
+        new_state = {key: list(mmr) for key, mmr in old_state.items()}
+
+        affected_players = {}  # player key -> name
+        new_rows = {}
+        changed_match = None
+        for stored_match_id in order[position:]:
+            match_rows = rows[stored_match_id]
+            if stored_match_id != match_id and all(player_key(names[row]) not in affected_players for row in match_rows):
+                roll(new_state, stored_match_id)
+                roll(old_state, stored_match_id)
+                continue
+            match = self.rate(stored_match_id, new_state)
+            if stored_match_id == match_id:
+                changed_match = match
+            if is_rated(match.result, len(match.players)):
+                for player in match.players:
+                    self.apply_gains(new_state, player.name, player.crewmate_mmr_gain, player.impostor_mmr_gain)
+            roll(old_state, stored_match_id)
+            for player in match.players:
+                affected_players.setdefault(player_key(player.name), player.name)
+            new_rows[stored_match_id] = [
+                events_leaderboard.player_in_match_row(player, match_start_time=match.match_start_time,
+                                                       index=indexes[match_rows[min(i, len(match_rows) - 1)]],
+                                                       match_start_epoch=match.start_epoch)
+                for i, player in enumerate(match.players)]
+
+        self.logger.info(f"Match {match_id}: re-rated {len(new_rows)} matches affecting {len(affected_players)} players")
+        events_leaderboard.replace_matches(new_rows)
+        self.update_leaderboard(affected_players, old_state, new_state)
+        # Checkpoints after the changed match hold ratings that no longer apply
+        file_handler.checkpoints.discard_from(position + 1)
+        return changed_match, len(new_rows), len(affected_players)
+
+    def update_leaderboard(self, affected_players, old_state, new_state):
+        leaderboard = self.file_handler.leaderboard
+        for key, name in affected_players.items():
+            old = old_state.get(key, list(self.default_mmr))
+            new = new_state.get(key, list(self.default_mmr))
+            if old == new:
+                continue
+            index = leaderboard.player_index(name)
+            if index is None:
+                leaderboard.new_player(name)
+                index = leaderboard.player_index(name)
+            for column, old_mmr, new_mmr in zip(['MMR', 'Crewmate MMR', 'Impostor MMR'], old, new):
+                leaderboard.leaderboard.at[index, column] = round(leaderboard.leaderboard.at[index, column] + new_mmr - old_mmr, 3)
+        leaderboard.rank_players()
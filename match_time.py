@@ -0,0 +1,65 @@
+import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+logger = logging.getLogger('FileHandler')
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+TIME_FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %I:%M:%S %p"]
+
+
+def _parse_fixed(time_str):
+    """Fast path for 'MM/DD/YYYY HH:MM:SS' with an optional AM/PM suffix; raises ValueError otherwise."""
+    parts = time_str.split(' ')
+    if len(parts) not in (2, 3):
+        raise ValueError(time_str)
+    date = parts[0].split('/')
+    clock = parts[1].split(':')
+    if len(date) != 3 or len(clock) != 3 or len(date[2]) != 4 or not date[2].isdigit() \
+            or not all(x.isdigit() and len(x) <= 2 for x in date[:2] + clock):
+        raise ValueError(time_str)
+    hour = int(clock[0])
+    if len(parts) == 3:
+        am_pm = parts[2].upper()
+        if am_pm not in ('AM', 'PM') or not 1 <= hour <= 12:
+            raise ValueError(time_str)
+        hour = hour % 12 + (12 if am_pm == 'PM' else 0)
+    return datetime(int(date[2]), int(date[0]), int(date[1]), hour, int(clock[1]), int(clock[2]))
+
+
+@lru_cache(maxsize=65536)
+def _parse_cached(time_str):
+    try:
+        return _parse_fixed(time_str)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(time_str, time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_time(time_str):
+    """Parse time robustly; if missing or malformed, return a safe minimal datetime."""
+    if not time_str:
+        logger.warning("Missing game start time; defaulting to minimal datetime")
+        return datetime.min
+
+    parsed = _parse_cached(str(time_str))
+    if parsed is None:
+        logger.warning(f"Time format not recognized: {time_str}; defaulting to minimal datetime")
+        return datetime.min
+    return parsed
+
+
+def to_epoch(dt):
+    """Whole seconds since 1970-01-01 of a naive datetime (no timezone conversion)."""
+    return (dt - EPOCH) // SECOND
+
+
+def duration_seconds(delta):
+    return delta // SECOND
+
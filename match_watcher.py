@@ -0,0 +1,147 @@
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import struct
+import sys
+import time
+
+from match_catalog import MatchCatalog
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class MatchWatcher:
+    """Watches matches_path for match/events files that have been fully written.
+
+    On Linux this uses inotify (IN_CLOSE_WRITE/IN_MOVED_TO), elsewhere it falls back to
+    polling while someone is waiting. A match is ready once its _match.json has a final
+    result and its eventsLogFile parses; ready matches are indexed in the catalog and
+    handed to whoever is waiting on them."""
+
+    def __init__(self, file_handler, poll_interval=0.5, ready_ttl=300):
+        self.logger = logging.getLogger('MatchWatcher')
+        self.file_handler = file_handler
+        self.matches_path = file_handler.matches_path
+        self.catalog = file_handler.catalog
+        self.poll_interval = poll_interval
+        self.ready_ttl = ready_ttl
+        self.ready = {}      # str(match id) -> (match file name, monotonic time it became ready)
+        self.waiters = {}    # str(match id) -> [Future]
+        self.events_to_match = {}  # events file -> match file, until the match is ready
+        self.loop = None
+        self.fd = None
+
+    def start(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        if not sys.platform.startswith('linux'):
+            self.logger.info("inotify not available - falling back to polling for match files")
+            return
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            if libc.inotify_add_watch(fd, os.fsencode(self.matches_path), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {self.matches_path}")
+        except Exception as e:
+            self.logger.error(f"Could not start inotify watcher, falling back to polling: {e}")
+            return
+        self.fd = fd
+        self.loop.add_reader(self.fd, self._on_readable)
+        self.logger.info(f"Watching {self.matches_path} for finished matches")
+
+    def stop(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        names = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        for name in names:
+            self.file_written(name)
+
+    def file_written(self, file_name):
+        if MatchCatalog.is_match_file(file_name):
+            self.check_match_file(file_name)
+        elif file_name in self.events_to_match:
+            self.check_match_file(self.events_to_match[file_name])
+
+    def check_match_file(self, match_file):
+        """Index match_file and resolve its waiters if both files are complete."""
+        entry = self.catalog.update_file(match_file)
+        if entry is None or entry['match_id'] is None:
+            return False
+        events_file = entry['events_file']
+        if events_file:
+            self.events_to_match[events_file] = match_file
+        if entry['result'] in (None, "Unknown") or not events_file:
+            return False
+        try:
+            with open(os.path.join(self.matches_path, events_file), 'r', encoding='utf-8') as f:
+                json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        # the events file is complete, later writes to it no longer concern this match
+        self.events_to_match.pop(events_file, None)
+        key = str(entry['match_id'])
+        self.prune_ready()
+        self.ready[key] = (match_file, time.monotonic())
+        for future in self.waiters.pop(key, []):
+            if not future.done():
+                future.set_result(match_file)
+        return True
+
+    def prune_ready(self):
+        """Forget ready matches nobody waited for within ready_ttl seconds."""
+        expired = time.monotonic() - self.ready_ttl
+        for key in [key for key, (_, ready_at) in self.ready.items() if ready_at < expired]:
+            del self.ready[key]
+
+    def check_match_id(self, match_id):
+        match_file = self.catalog.find(match_id)
+        return match_file is not None and self.check_match_file(match_file)
+
+    async def wait_ready(self, match_id, timeout=10):
+        """Wait until match_id's files are fully written; returns the match file name or None on timeout."""
+        key = str(match_id)
+        if key in self.ready or self.check_match_id(match_id):
+            return self.ready.pop(key)[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, []).append(future)
+        try:
+            if self.fd is not None:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not future.done() and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                self.check_match_id(match_id)
+            return future.result() if future.done() else None
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.ready.pop(key, None)
+            waiters = self.waiters.get(key)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self.waiters[key]
+
@@ -0,0 +1,214 @@
+import json
+import numpy as np
+import pandas as pd
+from player_in_match import PlayerInMatch
+from config_service import ranked_percentages
+from match_class import Match
+
+# Struct-of-arrays inputs of the kernel, one entry per player
+PLAYER_FIELDS = ['crewmate', 'impostor', 'won', 'died_first_round', 'percentage_of_winning', 'k', 'performance',
+                 'correct_votes', 'incorrect_votes', 'got_crew_voted', 'tasks_complete', 'voted_wrong_on_crit',
+                 'right_vote_on_crit_but_loss', 'rounds_survived', 'solo_imp_game', 'ejected_early_as_imp',
+                 'solo_imp', 'kills_as_solo_imp', 'won_as_solo_imp', 'kills', 'crewmate_mmr_gain', 'impostor_mmr_gain']
+
+
+def round_like_python(values, decimals):
+    """round(x, decimals) for every element, bit-for-bit.
+
+    np.round scales, rounds and scales back, which can pick the other neighbour when the
+    scaled value sits on a tie; those elements go through Python's correctly rounded round()."""
+    values = np.asarray(values, dtype=float)
+    scale = 10.0 ** decimals
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
+
+
+def players_to_arrays(matches):
+    """Struct-of-arrays of the players of every rated match; returns (arrays, [(match, player)])."""
+    columns = {field: [] for field in PLAYER_FIELDS}
+    ejects = []
+    owners = []
+    match:Match
+    player:PlayerInMatch
+    for match in matches:
+        if match.result.lower() in ["canceled", "unknown"]:
+            continue
+        for player in match.players:
+            owners.append((match, player))
+            columns['crewmate'].append(player.team == 'crewmate')
+            columns['impostor'].append(player.team == 'impostor')
+            columns['won'].append(bool(player.won))
+            columns['died_first_round'].append(bool(player.died_first_round))
+            columns['percentage_of_winning'].append(player.percentage_of_winning)
+            columns['k'].append(match.k)
+            columns['performance'].append(player.performance)
+            columns['correct_votes'].append(player.number_of_correct_votes)
+            columns['incorrect_votes'].append(player.number_of_incorrect_votes)
+            columns['got_crew_voted'].append(len(player.got_crew_voted))
+            columns['tasks_complete'].append(player.tasks_complete)
+            columns['voted_wrong_on_crit'].append(bool(player.voted_wrong_on_crit))
+            columns['right_vote_on_crit_but_loss'].append(bool(player.right_vote_on_crit_but_loss))
+            columns['rounds_survived'].append(player.rounds_survived)
+            columns['solo_imp_game'].append(bool(match.solo_imp_game))
+            columns['ejected_early_as_imp'].append(bool(player.ejected_early_as_imp))
+            columns['solo_imp'].append(bool(player.solo_imp))
+            columns['kills_as_solo_imp'].append(player.kills_as_solo_imp)
+            columns['won_as_solo_imp'].append(bool(player.won_as_solo_imp))
+            columns['kills'].append(player.number_of_kills)
+            columns['crewmate_mmr_gain'].append(player.crewmate_mmr_gain)
+            columns['impostor_mmr_gain'].append(player.impostor_mmr_gain)
+            ejects.append(player.correct_vote_on_eject)
+
+    arrays = {field: np.asarray(values, dtype=bool if isinstance(values[0], bool) else float) if values else np.zeros(0)
+              for field, values in columns.items()}
+    add_eject_arrays(arrays, ejects)
+    return arrays, owners
+
+
+def events_to_arrays(events_df:pd.DataFrame, k=None):
+    """Struct-of-arrays of the rated rows of an events frame; k is a number or a callable match id -> k."""
+    rated = events_df[~events_df['Match Result'].str.lower().isin(['unknown', 'canceled'])]
+    k = ranked_percentages()['k_factor'] if k is None else k
+    match_ids = rated['Match ID'].to_numpy()
+    if callable(k):
+        # one lookup per match, not per events row
+        unique_ids, positions = np.unique(match_ids, return_inverse=True)
+        match_k = np.asarray([k(match_id) for match_id in unique_ids], dtype=float)[positions]
+    else:
+        match_k = np.full(len(rated), float(k))
+    got_crew_voted = [parse_list(value) for value in rated['Got Crew Voted']]
+    ejects = [[correct_vote[0] for correct_vote in parse_list(value)] for value in rated['Correct Vote on Eject']]
+    arrays = {
+        'crewmate': (rated['Player Team'] == 'crewmate').to_numpy(),
+        'impostor': (rated['Player Team'] == 'impostor').to_numpy(),
+        'won': rated['Won'].astype(bool).to_numpy(),
+        'died_first_round': rated['Died First Round'].astype(bool).to_numpy(),
+        'percentage_of_winning': rated['Percentage of Winning'].to_numpy(dtype=float),
+        'k': match_k,
+        'performance': np.ones(len(rated)),
+        'correct_votes': rated['Correct Votes'].to_numpy(dtype=float),
+        'incorrect_votes': rated['Incorrect Votes'].to_numpy(dtype=float),
+        'got_crew_voted': np.asarray([len(votes) for votes in got_crew_voted], dtype=float),
+        'tasks_complete': rated['Tasks Complete'].to_numpy(dtype=float),
+        'voted_wrong_on_crit': rated['Voted Wrong on Crit'].astype(bool).to_numpy(),
+        'right_vote_on_crit_but_loss': rated['Voted Right on Crit but Lost'].astype(bool).to_numpy(),
+        'rounds_survived': rated['Rounds Survived'].to_numpy(dtype=float),
+        # a match is a solo impostor game once one of its impostors became solo
+        'solo_imp_game': rated.groupby('Match ID', sort=False)['Solo Imp'].transform('any').astype(bool).to_numpy(),
+        'ejected_early_as_imp': rated['Ejected Early as Imp'].astype(bool).to_numpy(),
+        'solo_imp': rated['Solo Imp'].astype(bool).to_numpy(),
+        'kills_as_solo_imp': rated['Kills as Solo Imp'].to_numpy(dtype=float),
+        'won_as_solo_imp': rated['Won as Solo Imp'].astype(bool).to_numpy(),
+        'kills': rated['Number of Kills'].to_numpy(dtype=float),
+        'crewmate_mmr_gain': np.zeros(len(rated)),
+        'impostor_mmr_gain': np.zeros(len(rated)),
+    }
+    add_eject_arrays(arrays, ejects)
+    return arrays, rated
+
+
+def parse_list(value):
+    """A list column of the events CSV ('[[7, 1]]'), or the list itself."""
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return value if isinstance(value, (list, tuple)) else []
+
+
+def add_eject_arrays(arrays, ejects):
+    # Players alive at each correct eject, padded with zeros (kept in order for the running sum)
+    width = max((len(alive) for alive in ejects), default=0)
+    arrays['correct_eject_alive'] = np.zeros((len(ejects), width))
+    arrays['correct_eject_count'] = np.asarray([len(alive) for alive in ejects], dtype=int)
+    for i, alive in enumerate(ejects):
+        arrays['correct_eject_alive'][i, :len(alive)] = alive
+
+
+def performance_arrays(arrays, params=None):
+    """Performance of every player after all modifiers and bounds; it does not depend on MMR."""
+    rp = ranked_percentages() if params is None else params
+    crew = arrays['crewmate']
+    imp = arrays['impostor']
+    won = arrays['won']
+    performance = arrays['performance'].astype(float)
+
+    def scale(mask, factor, divide=False):
+        nonlocal performance
+        performance = np.where(mask, performance / factor if divide else performance * factor, performance)
+
+    scale(crew & (arrays['correct_votes'] != 0), 1 + (arrays['correct_votes'] * rp['crew_correct_vote_bonus']))
+    scale(crew & (arrays['incorrect_votes'] != 0), 1 + (arrays['incorrect_votes'] * rp['crew_incorrect_vote_penalty']), divide=True)
+    scale(crew & (arrays['got_crew_voted'] != 0), 1 + (rp['crew_got_voted_penalty'] * arrays['got_crew_voted']), divide=True)
+    scale(crew & (arrays['tasks_complete'] != 0), 1 + (arrays['tasks_complete'] * rp['crew_task_bonus']))
+    scale(crew & arrays['voted_wrong_on_crit'], 1 + rp['crew_wrong_crit_penalty'], divide=True)
+    # sum(...) in calculate_mmr adds the per-eject bonuses left to right, starting from 0
+    eject_bonus = np.zeros(len(performance))
+    alive = arrays['correct_eject_alive']
+    for j in range(alive.shape[1]):
+        eject_bonus = np.where(arrays['correct_eject_count'] > j, eject_bonus + alive[:, j] * rp['crew_correct_eject_bonus'], eject_bonus)
+    scale(crew, 1 + eject_bonus)
+    scale(crew & arrays['right_vote_on_crit_but_loss'], 1 + rp['crew_right_crit_loss_bonus'])
+    rounds = arrays['rounds_survived']
+    scale(crew & won, 1 + (rounds * rp['crew_win_survival_bonus']))
+    scale(crew & ~won, 1 + (rounds * rp['crew_loss_survival_penalty']), divide=True)
+    scale(crew & ~won & arrays['solo_imp_game'], 1 + (rounds * rp['crew_solo_imp_survival_penalty']), divide=True)
+
+    scale(imp & arrays['ejected_early_as_imp'], 1 + rp['imp_early_eject_penalty'], divide=True)
+    scale(imp & arrays['solo_imp'], 1 + rp['imp_solo_bonus'])
+    scale(imp & (arrays['got_crew_voted'] != 0), 1 + (rp['imp_got_voted_bonus'] * arrays['got_crew_voted']))
+    scale(imp & (arrays['kills_as_solo_imp'] > 0), 1 + (rp['imp_solo_kill_bonus'] * arrays['kills_as_solo_imp']))
+    scale(imp & arrays['won_as_solo_imp'], 1 + rp['imp_solo_win_bonus'])
+    scale(imp & (arrays['kills'] > 0), 1 + (arrays['kills'] * rp['imp_kill_bonus']))
+
+    performance = np.where(performance < rp['min_performance'], rp['min_performance'], performance)
+    died_first = arrays['died_first_round']
+    performance = np.where(won & died_first, rp['died_first_win_performance'], performance)
+    performance = np.where(~won & died_first, rp['max_loss_performance'], performance)
+    return performance
+
+
+def calculate_mmr_arrays(arrays, params=None):
+    """Vectorized Match.calculate_mmr over a struct of player arrays (see players_to_arrays).
+
+    Applies the modifiers in the same order and with the same float operations, so the
+    results equal the per-player loop exactly. Returns a dict with performance, p,
+    crewmate_mmr_gain, impostor_mmr_gain and mmr_gain arrays."""
+    performance = performance_arrays(arrays, params)
+    crew = arrays['crewmate']
+    imp = arrays['impostor']
+    won = arrays['won']
+    win_prob = arrays['percentage_of_winning']
+    p = np.where(won, (1 - win_prob) * performance, win_prob / performance * -1)
+    p = round_like_python(p, 4)
+    gain = round_like_python(p * arrays['k'], 2)
+    crewmate_mmr_gain = np.where(crew, gain, arrays['crewmate_mmr_gain'])
+    impostor_mmr_gain = np.where(imp, gain, arrays['impostor_mmr_gain'])
+    return {
+        'performance': performance,
+        'p': p,
+        'crewmate_mmr_gain': crewmate_mmr_gain,
+        'impostor_mmr_gain': impostor_mmr_gain,
+        'mmr_gain': (impostor_mmr_gain + crewmate_mmr_gain) / 2,
+    }
+
+
+def calculate_mmr_matches(matches, params=None):
+    """Match.calculate_mmr for many matches in one kernel call; results are written back to the players."""
+    arrays, owners = players_to_arrays(matches)
+    if not owners:
+        return
+    # one snapshot for the kernel and the recorded breakdowns
+    params = ranked_percentages() if params is None else params
+    results = calculate_mmr_arrays(arrays, params)
+    player:PlayerInMatch
+    for i, (match, player) in enumerate(owners):
+        # the recorded modifiers start from the same pre-match performance as the kernel
+        _, player.mmr_breakdown = match.performance_breakdown(player, params)
+        player.performance = float(results['performance'][i])
+        player.p = float(results['p'][i])
+        player.crewmate_mmr_gain = float(results['crewmate_mmr_gain'][i])
+        player.impostor_mmr_gain = float(results['impostor_mmr_gain'][i])
+        player.mmr_gain = float(results['mmr_gain'][i])
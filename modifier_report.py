@@ -0,0 +1,163 @@
+"""How much MMR each ranked_percentages modifier moved over a season.
+
+    python modifier_report.py [--season "Season 1"] [--by team|tier|window] [--window 7d] [--tiers 900,1000,1100]
+
+Uses the 'MMR Breakdown' recorded for every rated events row. A player's gain is
+base * performance (a win) or base / performance (a loss), where the base only depends on
+the win probability and performance is the product of the modifiers. The difference
+between the gain and the base is split over the modifiers by their share of
+log(performance), so the modifiers, 'Base' and the gains add up exactly. Amounts are in
+role MMR (Crewmate or Impostor MMR); the overall MMR moves by half of them."""
+import argparse
+import logging
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+from config_service import settings
+from leaderboard_events import EventsLeaderboard
+from match_class import MODIFIERS, PENALTY_MODIFIERS, SET_MODIFIERS, parse_breakdown
+
+GROUPS = ['team', 'tier', 'window']
+
+
+def parse_window(window) -> int:
+    """'7d' / '12h' -> seconds."""
+    found = re.fullmatch(r"\s*(\d+)\s*([dh])\s*", str(window).lower())
+    if not found:
+        raise ValueError(f"Invalid window '{window}', use e.g. 7d or 12h")
+    return int(found.group(1)) * (86400 if found.group(2) == 'd' else 3600)
+
+
+def tier_labels(mmr:pd.Series, edges=None) -> pd.Categorical:
+    """Tier of every pre-match MMR: the given edges, or the season's quartiles."""
+    if edges is None:
+        edges = np.unique(np.quantile(mmr, [0.25, 0.5, 0.75])) if len(mmr) else np.array([])
+    edges = np.asarray(sorted(edges), dtype=float)
+    names = [f"<{edges[0]:.0f}"] if len(edges) else ["all"]
+    names += [f"{low:.0f}-{high:.0f}" for low, high in zip(edges[:-1], edges[1:])]
+    if len(edges):
+        names.append(f"{edges[-1]:.0f}+")
+    # ordered from the lowest tier up
+    return pd.Categorical.from_codes(np.searchsorted(edges, mmr.to_numpy(dtype=float), side='right'), names)
+
+
+def window_labels(epochs:pd.Series, window):
+    seconds = parse_window(window)
+    start = (epochs.to_numpy(dtype='int64') // seconds) * seconds
+    return pd.to_datetime(start, unit='s').strftime('%Y-%m-%d %H:%M' if seconds % 86400 else '%Y-%m-%d').to_numpy()
+
+
+def modifier_contributions(events_df:pd.DataFrame, tiers=None, window=None) -> pd.DataFrame:
+    """One row per (events row, modifier) with its MMR contribution, plus one 'Base' row per events row.
+
+    Columns: Modifier, MMR, team, tier, window. Rows without a recorded breakdown (rated
+    before it existed) only get their base."""
+    rated = events_df[events_df['Match Result'].isin(['Crewmates Win', 'Impostors Win'])]
+    crewmate = (rated['Player Team'] == 'crewmate').to_numpy()
+    gain = np.where(crewmate, rated['Crewmate MMR Gain'].to_numpy(dtype=float), rated['Impostor MMR Gain'].to_numpy(dtype=float))
+    won = rated['Won'].astype(bool).to_numpy()
+    row = np.arange(len(rated))
+
+    # long form of the breakdowns: 'CV:1.1;WC:1.4' -> (row, code, factor). Breakdowns repeat a
+    # lot, so each distinct text is parsed once and its entries are repeated for its rows.
+    text = rated['MMR Breakdown'] if 'MMR Breakdown' in rated.columns else pd.Series("", index=rated.index)
+    text_id, texts = pd.factorize(text.where(text.map(lambda value: isinstance(value, str)), ""))
+    parsed = [parse_breakdown(value) for value in texts]
+    lengths = np.asarray([len(modifiers) for modifiers in parsed], dtype=int)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(int)
+    text_codes = np.asarray([code for modifiers in parsed for code, _ in modifiers], dtype=object)
+    text_factors = np.asarray([factor for modifiers in parsed for _, factor in modifiers], dtype=float)
+    counts = lengths[text_id]
+    entry_row = np.repeat(row, counts)
+    # position of every entry inside its row's breakdown
+    within = np.arange(len(entry_row)) - np.repeat(np.cumsum(counts) - counts, counts)
+    source = starts[text_id][entry_row] + within
+    entries = pd.DataFrame({'row': entry_row, 'code': text_codes[source] if len(source) else np.zeros(0, dtype=object),
+                            'factor': text_factors[source] if len(source) else np.zeros(0)})
+
+    # every modifier as a multiplicative factor on performance; set modifiers (MIN, Dead1st,
+    # always last) become value / performance before them
+    setting = entries['code'].isin(SET_MODIFIERS).to_numpy()
+    factor = np.where(entries['code'].isin(PENALTY_MODIFIERS).to_numpy(), 1 / entries['factor'].to_numpy(), entries['factor'].to_numpy())
+    factor = np.where(setting, 1.0, factor)
+    before_set = np.ones(len(rated))
+    np.multiply.at(before_set, entries['row'].to_numpy(), factor)
+    if setting.any():
+        sets = entries[setting]
+        previous = sets.groupby('row')['factor'].shift(1)
+        previous = previous.fillna(pd.Series(before_set[sets['row'].to_numpy()], index=sets.index))
+        factor[setting] = sets['factor'].to_numpy() / previous.to_numpy()
+    log_factor = np.log(factor)
+    log_performance = np.bincount(entries['row'].to_numpy(), weights=log_factor, minlength=len(rated))
+
+    # gain = base * performance on a win, base / performance on a loss
+    signed = np.where(won, log_performance, -log_performance)
+    base = gain * np.exp(-signed)
+    modifier_total = gain - base
+    # logarithmic mean weight: contributions are exactly additive in log(performance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(np.abs(signed) > 1e-12, modifier_total / signed, base)
+    contribution = weight[entries['row'].to_numpy()] * np.where(won[entries['row'].to_numpy()], log_factor, -log_factor)
+
+    # categoricals keep the group-bys of the report cheap
+    groups = {
+        'team': pd.Categorical(rated['Player Team'].to_numpy()),
+        'tier': tier_labels(rated['MMR'], tiers),
+        'window': pd.Categorical(window_labels(rated['Match Start Epoch'], window) if window else np.full(len(rated), 'all')),
+    }
+    taken = np.concatenate([row, entries['row'].to_numpy()])
+    contributions = pd.DataFrame({
+        'Modifier': pd.Categorical(np.concatenate([np.full(len(rated), 'Base', dtype=object), entries['code'].to_numpy()])),
+        'MMR': np.concatenate([base, contribution]),
+    })
+    for name, values in groups.items():
+        contributions[name] = values.take(taken)
+    return contributions
+
+
+def attribution_report(contributions:pd.DataFrame, by=None) -> pd.DataFrame:
+    """Per modifier (and per group of `by`): rows it applied to, MMR it moved, and that as a share of all moved MMR."""
+    group_keys = [by] if isinstance(by, str) else list(by or [])
+    keys = group_keys + ['Modifier']
+    parts = contributions.assign(Gained=contributions['MMR'].clip(lower=0), Lost=contributions['MMR'].clip(upper=0))
+    report = parts.groupby(keys, observed=True)[['MMR', 'Gained', 'Lost']].sum()
+    report.insert(0, 'Rows', parts.groupby(keys, observed=True).size())
+    report = report.reset_index()
+    # all MMR moved in the group: base and modifier parts, both directions
+    if group_keys:
+        moved = parts.assign(Moved=parts['MMR'].abs()).groupby(group_keys, observed=True)['Moved'].sum().reset_index()
+        report = report.merge(moved, on=group_keys)
+    else:
+        report['Moved'] = parts['MMR'].abs().sum()
+    report['Share'] = report['MMR'] / report.pop('Moved')
+    report.insert(len(keys), 'Label', report['Modifier'].map(lambda code: MODIFIERS.get(code, code)))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attribute a season's MMR changes to the ranked_percentages modifiers")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--by', action='append', choices=GROUPS, default=[], help="group by team, tier and/or window (repeatable)")
+    parser.add_argument('--window', default='7d', help="time window size for --by window (default: 7d)")
+    parser.add_argument('--tiers', help="comma separated MMR tier edges (default: the season's quartiles)")
+    parser.add_argument('--csv', help="also write the report to this CSV")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    events_file = f"{args.season.replace(' ', '_')}_events.csv"
+    if not os.path.exists(events_file):
+        print(f"{events_file} not found", file=sys.stderr)
+        sys.exit(1)
+    try:
+        tiers = [float(edge) for edge in args.tiers.split(',')] if args.tiers else None
+        contributions = modifier_contributions(EventsLeaderboard(events_file).events_lb, tiers=tiers,
+                                               window=args.window if 'window' in args.by else None)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    report = attribution_report(contributions, args.by)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    if args.csv:
+        report.to_csv(args.csv, index=False)
@@ -0,0 +1,137 @@
+"""Backtest ranked_percentages.yaml parameter sets on a season's history.
+
+    python parameter_sweep.py --set crew_wrong_crit_penalty=0.3,0.4,0.5 --set k_factor=24,32
+                              [--season "Season 1"] [--workers 4] [--csv sweep.csv] [--calibration]
+
+Every combination of the --set values (on top of the current ranked_percentages.yaml) is
+replayed with the log-curve model in a process pool. For each set it reports how well the
+pre-match win probabilities predicted the results (log loss, Brier score, calibration
+buckets) and how spread out the final MMRs are."""
+import argparse
+import itertools
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config_service import ranked_percentages, settings
+from leaderboard_events import EventsLeaderboard
+from mmr_kernel import events_to_arrays
+from rating_models import LogCurveModel, season_from_arrays, prediction_scores
+from special_matches import get_special_match_index
+
+CALIBRATION_BINS = np.linspace(0, 1, 11)
+
+# Season arrays of a sweep, set once per worker process by init_worker
+season_data = None
+
+
+def init_worker(arrays, rated):
+    global season_data
+    season_data = (arrays, rated)
+
+
+def calibration_buckets(predictions:pd.DataFrame, bins=CALIBRATION_BINS):
+    """Predicted vs observed crewmate win rate per probability bucket."""
+    p = predictions['Crew Win Probability'].to_numpy(dtype=float)
+    y = predictions['Crew Won'].to_numpy(dtype=float)
+    bucket = np.clip(np.digitize(p, bins) - 1, 0, len(bins) - 2)
+    counts = np.bincount(bucket, minlength=len(bins) - 1)
+    predicted = np.bincount(bucket, weights=p, minlength=len(bins) - 1)
+    observed = np.bincount(bucket, weights=y, minlength=len(bins) - 1)
+    used = counts > 0
+    return pd.DataFrame({
+        'from': bins[:-1][used],
+        'to': bins[1:][used],
+        'matches': counts[used],
+        'predicted': predicted[used] / counts[used],
+        'observed': observed[used] / counts[used],
+    })
+
+
+def mmr_spread(model:LogCurveModel):
+    mmr = np.asarray([ratings[0] for ratings in model.ratings.values()], dtype=float)
+    if not len(mmr):
+        return {'players': 0, 'mmr std': float('nan'), 'mmr p10': float('nan'), 'mmr p90': float('nan'), 'mmr range': float('nan')}
+    return {
+        'players': len(mmr),
+        'mmr std': float(mmr.std()),
+        'mmr p10': float(np.percentile(mmr, 10)),
+        'mmr p90': float(np.percentile(mmr, 90)),
+        'mmr range': float(mmr.max() - mmr.min()),
+    }
+
+
+def backtest(overrides, arrays=None, rated=None):
+    """Replay the season with ranked_percentages updated by overrides; returns (summary row, calibration buckets)."""
+    if arrays is None:
+        arrays, rated = season_data
+    params = {**ranked_percentages(), **overrides}
+    model = LogCurveModel(params)
+    predictions = model.replay(season_from_arrays(arrays, rated, params))
+    calibration = calibration_buckets(predictions)
+    calibration_error = float((calibration['matches'] * (calibration['predicted'] - calibration['observed']).abs()).sum()
+                              / max(calibration['matches'].sum(), 1))
+    summary = {**overrides, **prediction_scores(predictions), 'calibration error': calibration_error, **mmr_spread(model)}
+    return summary, calibration
+
+
+def parameter_grid(settings):
+    """['name=v1,v2', ...] -> list of override dicts (the cartesian product)."""
+    names, values = [], []
+    for setting in settings:
+        name, _, raw = setting.partition('=')
+        name = name.strip()
+        if name not in ranked_percentages():
+            raise ValueError(f"Unknown ranked_percentages key {name}")
+        names.append(name)
+        values.append([float(value) for value in raw.split(',') if value.strip()])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def sweep(events_df:pd.DataFrame, grid, workers=None, k=None):
+    """Backtest every override dict of grid; returns (summary frame sorted by log loss, calibration per set)."""
+    arrays, rated = events_to_arrays(events_df, k)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(grid) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(grid)), initializer=init_worker, initargs=(arrays, rated)) as executor:
+            results = list(executor.map(backtest, grid))
+    else:
+        results = [backtest(overrides, arrays, rated) for overrides in grid]
+    summary = pd.DataFrame([summary for summary, _ in results])
+    order = summary['log loss'].sort_values(kind='mergesort').index
+    return summary.loc[order].reset_index(drop=True), [results[i][1] for i in order]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest ranked_percentages parameter sets on a season's history")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--set', dest='settings', action='append', default=[], metavar='KEY=V1,V2',
+                        help="values to try for a ranked_percentages key (repeatable, all combinations are run)")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument('--csv', help="also write the summary table to this CSV")
+    parser.add_argument('--calibration', action='store_true', help="print the calibration buckets of every set")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    events_file = f"{args.season.replace(' ', '_')}_events.csv"
+    if not os.path.exists(events_file):
+        print(f"{events_file} not found", file=sys.stderr)
+        sys.exit(1)
+    try:
+        grid = parameter_grid(args.settings) or [{}]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    special_matches = get_special_match_index(settings().special_matches_file)
+    # NaN: not a special match, the set's k_factor applies
+    summary, calibrations = sweep(EventsLeaderboard(events_file).events_lb, grid, args.workers,
+                                  k=lambda match_id: special_matches.k_for(match_id, float('nan')))
+    print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
+    if args.calibration:
+        for (_, row), calibration in zip(summary.iterrows(), calibrations):
+            print(f"\n{', '.join(f'{name}={row[name]:g}' for name in grid[0]) or 'current parameters'}")
+            print(calibration.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if args.csv:
+        summary.to_csv(args.csv, index=False)
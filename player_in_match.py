@@ -1,13 +1,24 @@
-import yaml
-import os
+from array import array
+from config_service import settings
+
+
+def vote_pairs(alive_counts) -> str:
+    """Events/CSV text of an alive-count array, in the old [[players_alive, 1], ...] list form."""
+    return "[" + ", ".join(f"[{alive}, 1]" for alive in alive_counts) + "]"
 
-# Load config from YAML
-with open(os.path.join('config', 'config.yaml'), 'r', encoding='utf-8') as f:
-    all_configs = yaml.safe_load(f)
-use_config = all_configs['use'] if 'use' in all_configs else 'main'
-config = all_configs[use_config]
 
 class PlayerInMatch:
+    # Ten of these per match and a full rebuild keeps every match; slots drop the per-instance dict
+    __slots__ = ('match_id', 'name', 'discord', 'color', 'current_mmr', 'crewmate_current_mmr', 'impostor_current_mmr',
+                 'team', 'match_result', 'mmr_gain', 'crewmate_mmr_gain', 'impostor_mmr_gain', 'percentage_of_winning',
+                 'won', 'p', 'performance', 'mmr_breakdown', 'alive', 'alive_time', 'alive_seconds', 'match_time',
+                 'match_seconds', 'time_of_death', 'rounds_survived', 'total_rounds', 'ejected_in_meeting',
+                 'number_of_placed_votes', 'number_of_correct_votes', 'number_of_incorrect_votes', 'number_of_skip_votes',
+                 'last_voted', 'voting_accuracy', 'got_crew_voted', 'died_first_round', 'finished_tasks_alive',
+                 'finished_tasks_dead', 'tasks_complete', 'voted_wrong_on_crit', 'correct_vote_on_eject',
+                 'right_vote_on_crit_but_loss', 'number_of_kills', 'ejected_early_as_imp', 'solo_imp', 'kills_as_solo_imp',
+                 'won_as_solo_imp')
+
     def __init__(self, 
                  name="",
                  team="",
@@ -21,9 +32,9 @@ class PlayerInMatch:
         self.name = name
         self.discord = 0
         self.color = None
-        self.current_mmr = current_mmr if current_mmr is not None else config['current_mmr']
-        self.crewmate_current_mmr = crewmate_current_mmr if crewmate_current_mmr is not None else config['crewmate_current_mmr']
-        self.impostor_current_mmr = impostor_current_mmr if impostor_current_mmr is not None else config['impostor_current_mmr']
+        self.current_mmr = current_mmr if current_mmr is not None else settings().current_mmr
+        self.crewmate_current_mmr = crewmate_current_mmr if crewmate_current_mmr is not None else settings().crewmate_current_mmr
+        self.impostor_current_mmr = impostor_current_mmr if impostor_current_mmr is not None else settings().impostor_current_mmr
         self.team = team
         self.match_result = None
         self.mmr_gain = 0.0
@@ -34,10 +45,13 @@ class PlayerInMatch:
         self.won = None
         self.p = 1.0
         self.performance = 1.0
+        self.mmr_breakdown = [] # (code, factor) of every performance modifier applied by Match.calculate_mmr
         self.alive = True
         #survivability
         self.alive_time = None
+        self.alive_seconds = 0
         self.match_time = None
+        self.match_seconds = 0
         self.time_of_death = None
         self.rounds_survived = 0
         self.total_rounds = 0
@@ -49,14 +63,14 @@ class PlayerInMatch:
         self.number_of_skip_votes = 0
         self.last_voted = None
         self.voting_accuracy = 0
-        self.got_crew_voted = []
+        self.got_crew_voted = array('B') # players alive at each eject of a crewmate the player took part in
         #crew
         self.died_first_round = False
         self.finished_tasks_alive = False 
         self.finished_tasks_dead = False
         self.tasks_complete = 0
         self.voted_wrong_on_crit = False 
-        self.correct_vote_on_eject = []
+        self.correct_vote_on_eject = array('B') # players alive at each impostor eject the player voted for
         self.right_vote_on_crit_but_loss = False 
         #imp
         self.number_of_kills = 0
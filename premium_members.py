@@ -3,13 +3,8 @@ import os
 from datetime import datetime, timedelta
 import json
 import logging  # Add this import
-import yaml
+from special_matches import get_special_match_index
 
-# Load config from YAML
-with open(os.path.join('config', 'config.yaml'), 'r', encoding='utf-8') as f:
-    all_configs = yaml.safe_load(f)
-use_config = all_configs['use'] if 'use' in all_configs else 'main'
-config = all_configs[use_config]
 
 class PremiumMember:
     def __init__(self, member_id, discord_name, server_nickname, discord_id, role, subscription_end, logs_dir, parent):
@@ -307,8 +302,8 @@ class PremiumMember:
 
         game_info = self.pending_games.pop(0)
         
-        # Add to special matches file
-        new_match = pd.DataFrame([{
+        # Add to special matches file (and the shared index the match processing reads)
+        self.parent.special_matches.add({
             'match_id': match_id,
             'timestamp': time_of_match.strftime('%Y-%m-%d %H:%M:%S'),
             'channel_id': game_info['channel_id'],
@@ -316,11 +311,7 @@ class PremiumMember:
             'member_name': self.discord_name,
             'member_id': self.member_id,
             'transaction_id': None
-        }])
-        
-        matches_df = pd.read_csv(self.parent.special_matches_file)
-        matches_df = pd.concat([matches_df, new_match], ignore_index=True)
-        matches_df.to_csv(self.parent.special_matches_file, index=False)
+        })
 
         # Check if this was the last pending game
         games_completed = len(self.pending_games) == 0
@@ -358,6 +349,7 @@ class PremiumMembers:
                 'match_id', 'channel_id', 'time_of_match', 
                 'balance_type', 'completed', 'member_id'
             ]).to_csv(self.special_matches_file, index=False)
+        self.special_matches = get_special_match_index(self.special_matches_file)
         
         # Load or create the CSV file
         self.df = self.load_or_create_file()
@@ -598,7 +590,7 @@ class PremiumMembers:
             balance_data = json.load(f)
             
         logs_df = pd.read_csv(member.logs_file)
-        special_matches_df = pd.read_csv(self.special_matches_file)
+        special_matches_df = self.special_matches.matches()
         
         # Filter special matches for this member
         special_matches_df = special_matches_df[special_matches_df['member_id'] == member_id]
@@ -0,0 +1,211 @@
+"""Bootstrap confidence intervals for player ratings.
+
+    python rating_intervals.py [--season "Season 1"] [--samples 200] [--workers 4] [--full]
+
+Every player's rated matches are resampled with replacement and replayed in a random order
+with the MMR kernel's arithmetic: the player's own MMR moves their team average and so the
+win probability, while teammates and opponents keep their stored pre-match MMRs. The spread
+of the replayed final MMRs gives a 95% interval, centered on the live MMR (so manual MMR
+changes are kept). Players with few games or a wide interval are flagged provisional.
+
+Only players who played since the last run are resampled unless --full is given."""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config_service import ranked_percentages, settings
+from leaderboard import Leaderboard
+from leaderboard_events import EventsLeaderboard
+from match_rerate import player_key
+from mmr_kernel import events_to_arrays, performance_arrays, round_like_python
+from special_matches import get_special_match_index
+from win_probability import WinProbabilityCurve
+
+# Stored in the leaderboard right after 'Impostor MMR'
+INTERVAL_COLUMNS = ['MMR Low', 'MMR High', 'Crewmate MMR Low', 'Crewmate MMR High', 'Impostor MMR Low',
+                    'Impostor MMR High', 'Provisional', 'Interval Games']
+CONFIDENCE = 0.95
+PLAYERS_PER_CHUNK = 32
+
+# Season inputs of a run, set once per worker process by init_worker
+season_data = None
+
+
+def init_worker(data):
+    global season_data
+    season_data = data
+
+
+def interval_inputs(events_df:pd.DataFrame, k=None, params=None):
+    """Per events row inputs of the replay, and the row indices of every player (in rating order)."""
+    params = ranked_percentages() if params is None else params
+    config = settings()
+    arrays, rated = events_to_arrays(events_df, k)
+    crewmate = arrays['crewmate']
+    match_ids = rated['Match ID'].to_numpy()
+    role_mmr = np.where(crewmate, rated['Crewmate MMR'].to_numpy(dtype=float), rated['Impostor MMR'].to_numpy(dtype=float))
+    frame = pd.DataFrame({'match': match_ids, 'crewmate': crewmate, 'mmr': role_mmr})
+    team_sum = frame.groupby(['match', 'crewmate'])['mmr'].transform('sum').to_numpy()
+    team_size = frame.groupby(['match', 'crewmate'])['mmr'].transform('size').to_numpy(dtype=float)
+    totals = frame.groupby(['match', 'crewmate'])['mmr'].agg(['sum', 'size'])
+    opponents = totals.reindex(pd.MultiIndex.from_arrays([match_ids, ~crewmate]))
+    data = {
+        'crewmate': crewmate,
+        'won': arrays['won'],
+        'performance': performance_arrays(arrays, params),
+        'k': np.where(np.isnan(arrays['k']), params['k_factor'], arrays['k']),
+        'other_sum': team_sum - role_mmr,
+        'team_size': team_size,
+        # a side without players (not a full match) counts as the player's own team average
+        'opponent_avg': np.where(opponents['size'].isna().to_numpy(), team_sum / team_size,
+                                 (opponents['sum'] / opponents['size']).to_numpy()),
+        'params': params,
+        'start': (float(config.current_mmr), float(config.crewmate_current_mmr), float(config.impostor_current_mmr)),
+    }
+    keys = rated['Player Name'].map(player_key).to_numpy()
+    rows = pd.Series(np.arange(len(rated))).groupby(keys, sort=False).indices
+    return data, {key: np.asarray(indices) for key, indices in rows.items()}
+
+
+def bootstrap_chunk(chunk, samples=200, seed=0, data=None):
+    """{player key: (offsets of MMR, Crewmate MMR, Impostor MMR low/high from the median, games)} for a chunk.
+
+    All players and resamples of the chunk are replayed together, one match position per step."""
+    data = season_data if data is None else data
+    curve = WinProbabilityCurve(data['params'])
+    rng = np.random.default_rng(seed)
+    counts = np.asarray([len(rows) for _, rows in chunk])
+    longest = counts.max()
+    rows_by_player = np.zeros((len(chunk), longest), dtype=int)
+    for i, (_, rows) in enumerate(chunk):
+        rows_by_player[i, :len(rows)] = rows
+    mmr, crew_mmr, imp_mmr = (np.full((len(chunk), samples), value) for value in data['start'])
+    for step in range(longest):
+        active = (step < counts)[:, None]
+        picks = np.minimum((rng.random((len(chunk), samples)) * counts[:, None]).astype(int), counts[:, None] - 1)
+        row = np.take_along_axis(rows_by_player, picks, axis=1)
+        crew = data['crewmate'][row]
+        team_avg = (data['other_sum'][row] + np.where(crew, crew_mmr, imp_mmr)) / data['team_size'][row]
+        crew_avg = np.where(crew, team_avg, data['opponent_avg'][row])
+        imp_avg = np.where(crew, data['opponent_avg'][row], team_avg)
+        crew_win_probability = curve(crew_avg, imp_avg)
+        win_probability = np.where(crew, crew_win_probability, 1 - crew_win_probability)
+        performance = data['performance'][row]
+        p = np.where(data['won'][row], (1 - win_probability) * performance, win_probability / performance * -1)
+        gain = np.where(active, round_like_python(round_like_python(p.ravel(), 4) * data['k'][row].ravel(), 2).reshape(p.shape), 0.0)
+        # same rounding as Leaderboard.update_player
+        crew_mmr = np.round(crew_mmr + np.where(crew, gain, 0.0), 3)
+        imp_mmr = np.round(imp_mmr + np.where(crew, 0.0, gain), 3)
+        mmr = np.round(mmr + gain / 2, 3)
+    tail = (1 - CONFIDENCE) / 2
+    results = {}
+    for i, (key, _) in enumerate(chunk):
+        offsets = []
+        for values in (mmr[i], crew_mmr[i], imp_mmr[i]):
+            low, median, high = np.quantile(values, [tail, 0.5, 1 - tail])
+            offsets += [low - median, high - median]
+        results[key] = (*offsets, int(counts[i]))
+    return results
+
+
+class RatingIntervals:
+    """Keeps the interval columns of a leaderboard up to date.
+
+    prepare() and store() touch the live leaderboard and must run where it is mutated (the
+    ingest thread in the bot); compute() only uses what prepare() returned and can run on
+    any thread. A player is stale when their number of rated events rows differs from the
+    'Interval Games' the interval was computed on."""
+
+    def __init__(self, leaderboard:Leaderboard, events_leaderboard:EventsLeaderboard, k=None, samples=200, workers=None):
+        self.logger = logging.getLogger('RatingIntervals')
+        self.leaderboard = leaderboard
+        self.events_leaderboard = events_leaderboard
+        # NaN: not a special match, ranked_percentages' k_factor applies
+        self.k = float('nan') if k is None else k
+        self.samples = samples
+        self.workers = workers
+
+    def prepare(self, full=False):
+        """(season inputs, chunks of (player key, rows)) of the stale players, or None when none are stale."""
+        data, rows = interval_inputs(self.events_leaderboard.events_lb, self.k)
+        lb = self.leaderboard.leaderboard
+        stored = dict(zip(lb['Player Name'].map(player_key), lb['Interval Games'])) if 'Interval Games' in lb.columns else {}
+        stale = [(key, player_rows) for key, player_rows in rows.items() if full or stored.get(key) != len(player_rows)]
+        if not stale:
+            return None
+        # similar history lengths together keep the padding of a chunk small
+        stale.sort(key=lambda item: len(item[1]))
+        return data, [stale[i:i + PLAYERS_PER_CHUNK] for i in range(0, len(stale), PLAYERS_PER_CHUNK)]
+
+    def compute(self, job):
+        """Bootstrap every chunk of a prepare() job in a process pool; returns {player key: offsets}."""
+        data, chunks = job
+        workers = min(self.workers or os.cpu_count() or 1, len(chunks))
+        seeds = range(len(chunks))
+        results = {}
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data,)) as executor:
+                for chunk_results in executor.map(bootstrap_chunk, chunks, [self.samples] * len(chunks), seeds):
+                    results.update(chunk_results)
+        else:
+            for chunk, seed in zip(chunks, seeds):
+                results.update(bootstrap_chunk(chunk, self.samples, seed, data))
+        return results
+
+    def store(self, results):
+        """Write intervals around the live MMRs of the players in results, then save the leaderboard."""
+        lb = self.leaderboard.leaderboard
+        config = settings()
+        provisional_games = config.get('provisional_games', 20)
+        provisional_width = config.get('provisional_interval_width', 300)
+        for position, column in enumerate(INTERVAL_COLUMNS):
+            if column not in lb.columns:
+                # leaderboards from before the interval columns
+                lb.insert(lb.columns.get_loc('Impostor MMR') + 1 + position, column,
+                          pd.Series(0, index=lb.index).astype(self.leaderboard.dtype_dict[column]))
+        for index, name in lb['Player Name'].items():
+            offsets = results.get(player_key(name))
+            if offsets is None:
+                continue
+            for column, low, high in (('MMR', offsets[0], offsets[1]), ('Crewmate MMR', offsets[2], offsets[3]),
+                                      ('Impostor MMR', offsets[4], offsets[5])):
+                lb.at[index, f'{column} Low'] = round(lb.at[index, column] + low, 2)
+                lb.at[index, f'{column} High'] = round(lb.at[index, column] + high, 2)
+            games = offsets[6]
+            # 0/1 like the other leaderboard counters, which are filled with 0 on load
+            lb.at[index, 'Provisional'] = int(games < provisional_games or
+                                              lb.at[index, 'MMR High'] - lb.at[index, 'MMR Low'] > provisional_width)
+            lb.at[index, 'Interval Games'] = games
+        self.leaderboard.save()
+        return len(results)
+
+    def run(self, full=False):
+        """prepare(), compute() and store() in one call; returns the number of players refreshed."""
+        job = self.prepare(full)
+        if job is None:
+            return 0
+        return self.store(self.compute(job))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap MMR confidence intervals into a season's leaderboard")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--samples', type=int, default=200, help="bootstrap resamples per player (default: 200)")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument('--full', action='store_true', help="recompute every player, not only those who played since the last run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    season_file = args.season.replace(' ', '_')
+    for path in (f"{season_file}_events.csv", f"{season_file}_leaderboard.csv"):
+        if not os.path.exists(path):
+            print(f"{path} not found", file=sys.stderr)
+            sys.exit(1)
+    special_matches = get_special_match_index(settings().special_matches_file)
+    intervals = RatingIntervals(Leaderboard(f"{season_file}_leaderboard.csv"), EventsLeaderboard(f"{season_file}_events.csv"),
+                                k=lambda match_id: special_matches.k_for(match_id, float('nan')),
+                                samples=args.samples, workers=args.workers)
+    print(f"Refreshed the intervals of {intervals.run(args.full)} players")
@@ -0,0 +1,349 @@
+"""Rating models that can replay a whole season from the events store.
+
+    python rating_models.py [--season "Season 1"]
+
+replays the season's events with every model and prints how well each one predicted the
+match results (log loss, Brier score, accuracy)."""
+import argparse
+from abc import ABC, abstractmethod
+import logging
+import math
+import os
+import sys
+from collections import namedtuple
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from config_service import ranked_percentages, settings
+from leaderboard_events import EventsLeaderboard
+from match_rerate import player_key
+from mmr_kernel import events_to_arrays, performance_arrays
+from special_matches import get_special_match_index
+from win_probability import WinProbabilityCurve
+
+
+# One rated match of a season in rating order. Per-player tuples are in events row order;
+# full is False for matches without 10 players, which are predicted but change no rating.
+SeasonMatch = namedtuple('SeasonMatch', ['match_id', 'names', 'crewmate', 'won', 'performance', 'k', 'crew_won', 'full'])
+
+
+def load_season(events_df:pd.DataFrame, k=None, params=None):
+    """SeasonMatch list of the rated matches of an events frame.
+
+    k is a number or a callable match id -> k (special matches); performance is computed for
+    every player in one kernel pass with params (ranked_percentages by default)."""
+    arrays, rated = events_to_arrays(events_df, k)
+    return season_from_arrays(arrays, rated, params)
+
+
+def season_from_arrays(arrays, rated:pd.DataFrame, params=None):
+    """load_season for arrays already built by events_to_arrays; NaN k values take params['k_factor']."""
+    params = ranked_percentages() if params is None else params
+    performance = performance_arrays(arrays, params)
+    ks = np.where(np.isnan(arrays['k']), params['k_factor'], arrays['k'])
+    names = rated['Player Name'].to_numpy()
+    season = []
+    for match_id, rows in rated.groupby('Match ID', sort=False).indices.items():
+        crewmate = tuple(bool(x) for x in arrays['crewmate'][rows])
+        won = tuple(bool(x) for x in arrays['won'][rows])
+        crew_won = any(w for w, crew in zip(won, crewmate) if crew)
+        season.append(SeasonMatch(match_id, tuple(names[rows]), crewmate, won, tuple(float(x) for x in performance[rows]),
+                                  float(ks[rows[0]]), crew_won, len(rows) == 10))
+    return season
+
+
+def side_advantage(base_win_percentage):
+    """Log-odds of the crewmates winning between equal teams."""
+    return math.log(base_win_percentage / (1 - base_win_percentage))
+
+
+class RatingModel(ABC):
+    """Base class: predict() the crewmate win probability of a match, then update() on its result."""
+
+    name = 'model'
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ratings = {}
+
+    @abstractmethod
+    def predict(self, match:SeasonMatch) -> float:
+        pass
+
+    @abstractmethod
+    def update(self, match:SeasonMatch, crew_win_probability):
+        pass
+
+    def replay(self, season):
+        """Replay a season from scratch; returns one row per match with the prediction made before it."""
+        self.reset()
+        rows = []
+        for match in season:
+            crew_win_probability = self.predict(match)
+            rows.append((match.match_id, crew_win_probability, match.crew_won))
+            if match.full:
+                self.update(match, crew_win_probability)
+        return pd.DataFrame(rows, columns=['Match ID', 'Crew Win Probability', 'Crew Won'])
+
+    def teams(self, match:SeasonMatch):
+        crew = [name for name, crewmate in zip(match.names, match.crewmate) if crewmate]
+        impostors = [name for name, crewmate in zip(match.names, match.crewmate) if not crewmate]
+        return crew, impostors
+
+
+class LogCurveModel(RatingModel):
+    """The production model: log win-probability curve and performance-scaled gains.
+
+    Replaying a rebuilt season reproduces its stored MMR gains exactly."""
+
+    name = 'log curve'
+
+    def __init__(self, params=None):
+        self.curve = WinProbabilityCurve(params)
+        self.default_mmr = (float(settings().current_mmr), float(settings().crewmate_current_mmr), float(settings().impostor_current_mmr))
+        super().__init__()
+
+    def mmr(self, name):
+        return self.ratings.get(player_key(name), self.default_mmr)
+
+    def predict(self, match:SeasonMatch):
+        crew, impostors = self.teams(match)
+        if not crew or not impostors:
+            return self.curve(0, 0)
+        avg_crew = sum(self.mmr(name)[1] for name in crew) / len(crew)
+        avg_imp = sum(self.mmr(name)[2] for name in impostors) / len(impostors)
+        return self.curve(avg_crew, avg_imp)
+
+    def gains(self, match:SeasonMatch, crew_win_probability):
+        """(crewmate gain, impostor gain) per player, as Match.calculate_mmr computes them."""
+        imp_win_probability = 1 - crew_win_probability
+        gains = []
+        for crewmate, won, performance in zip(match.crewmate, match.won, match.performance):
+            win_probability = crew_win_probability if crewmate else imp_win_probability
+            p = (1 - win_probability) * performance if won else win_probability / performance * -1
+            gain = round(round(p, 4) * match.k, 2)
+            gains.append((gain, 0.0) if crewmate else (0.0, gain))
+        return gains
+
+    def update(self, match:SeasonMatch, crew_win_probability):
+        for name, (crew_gain, imp_gain) in zip(match.names, self.gains(match, crew_win_probability)):
+            # Same arithmetic as Leaderboard.update_player
+            mmr, crew, imp = self.mmr(name)
+            self.ratings[player_key(name)] = (round(mmr + (imp_gain + crew_gain) / 2, 3), round(crew + crew_gain, 3), round(imp + imp_gain, 3))
+
+
+class EloModel(RatingModel):
+    """Classic Elo on team averages, with separate crewmate and impostor ratings per player.
+
+    The crewmates get a fixed side advantage so that equal teams are predicted at the base
+    crewmate win percentage."""
+
+    name = 'elo'
+
+    def __init__(self, k=32, scale=400, initial=None, base_win_percentage=None):
+        self.k = k
+        self.scale = scale
+        self.initial = float(settings().current_mmr) if initial is None else initial
+        base = ranked_percentages()['crew_base_win_percentage'] if base_win_percentage is None else base_win_percentage
+        self.advantage = side_advantage(base) * scale / math.log(10)
+        super().__init__()
+
+    def rating(self, name, crewmate):
+        return self.ratings.get((player_key(name), crewmate), self.initial)
+
+    def predict(self, match:SeasonMatch):
+        crew, impostors = self.teams(match)
+        avg_crew = np.mean([self.rating(name, True) for name in crew]) if crew else self.initial
+        avg_imp = np.mean([self.rating(name, False) for name in impostors]) if impostors else self.initial
+        return 1 / (1 + 10 ** ((avg_imp - avg_crew - self.advantage) / self.scale))
+
+    def update(self, match:SeasonMatch, crew_win_probability):
+        delta = self.k * ((1.0 if match.crew_won else 0.0) - crew_win_probability)
+        for name, crewmate in zip(match.names, match.crewmate):
+            self.ratings[(player_key(name), crewmate)] = self.rating(name, crewmate) + (delta if crewmate else -delta)
+
+
+class Glicko2Model(RatingModel):
+    """Glicko-2 with a rating deviation and volatility per player and role.
+
+    Every match is its own rating period. A player is rated against the other team as one
+    opponent (mean rating, root mean square deviation); the crewmates get the same side
+    advantage as in EloModel. Deviations only grow through the volatility, not with time."""
+
+    name = 'glicko-2'
+    SCALE = 173.7178
+
+    def __init__(self, initial=None, deviation=350.0, volatility=0.06, tau=0.5, base_win_percentage=None):
+        self.initial = float(settings().current_mmr) if initial is None else initial
+        self.deviation = deviation
+        self.volatility = volatility
+        self.tau = tau
+        base = ranked_percentages()['crew_base_win_percentage'] if base_win_percentage is None else base_win_percentage
+        self.advantage = side_advantage(base)
+        super().__init__()
+
+    def state(self, name, crewmate):
+        """(mu, phi, sigma) on the Glicko-2 scale."""
+        return self.ratings.get((player_key(name), crewmate), (0.0, self.deviation / self.SCALE, self.volatility))
+
+    @staticmethod
+    def g(phi):
+        return 1 / math.sqrt(1 + 3 * phi * phi / (math.pi * math.pi))
+
+    def team(self, names, crewmate):
+        states = [self.state(name, crewmate) for name in names]
+        if not states:
+            return 0.0, self.deviation / self.SCALE
+        return sum(s[0] for s in states) / len(states), math.sqrt(sum(s[1] * s[1] for s in states) / len(states))
+
+    def predict(self, match:SeasonMatch):
+        crew, impostors = self.teams(match)
+        crew_mu, crew_phi = self.team(crew, True)
+        imp_mu, imp_phi = self.team(impostors, False)
+        phi = math.sqrt(crew_phi * crew_phi + imp_phi * imp_phi)
+        return 1 / (1 + math.exp(-self.g(phi) * (crew_mu - imp_mu + self.advantage)))
+
+    def new_volatility(self, phi, sigma, delta, v):
+        # Illinois iteration from Glickman's Glicko-2 paper, step 5
+        a = math.log(sigma * sigma)
+        tau2 = self.tau * self.tau
+
+        def f(x):
+            ex = math.exp(x)
+            return ex * (delta * delta - phi * phi - v - ex) / (2 * (phi * phi + v + ex) ** 2) - (x - a) / tau2
+
+        A = a
+        if delta * delta > phi * phi + v:
+            B = math.log(delta * delta - phi * phi - v)
+        else:
+            k = 1
+            while f(a - k * self.tau) < 0:
+                k += 1
+            B = a - k * self.tau
+        fA, fB = f(A), f(B)
+        while abs(B - A) > 1e-6:
+            C = A + (A - B) * fA / (fB - fA)
+            fC = f(C)
+            if fC * fB <= 0:
+                A, fA = B, fB
+            else:
+                fA /= 2
+            B, fB = C, fC
+        return math.exp(A / 2)
+
+    def update(self, match:SeasonMatch, crew_win_probability):
+        crew, impostors = self.teams(match)
+        teams = {True: self.team(crew, True), False: self.team(impostors, False)}
+        new_states = {}
+        for name, crewmate in zip(match.names, match.crewmate):
+            mu, phi, sigma = self.state(name, crewmate)
+            opponent_mu, opponent_phi = teams[not crewmate]
+            advantage = self.advantage if crewmate else -self.advantage
+            g = self.g(opponent_phi)
+            expected = 1 / (1 + math.exp(-g * (mu + advantage - opponent_mu)))
+            score = 1.0 if match.crew_won == crewmate else 0.0
+            v = 1 / (g * g * expected * (1 - expected))
+            delta = v * g * (score - expected)
+            sigma = self.new_volatility(phi, sigma, delta, v)
+            phi_star = math.sqrt(phi * phi + sigma * sigma)
+            phi = 1 / math.sqrt(1 / (phi_star * phi_star) + 1 / v)
+            mu = mu + phi * phi * g * (score - expected)
+            new_states[(player_key(name), crewmate)] = (mu, phi, sigma)
+        self.ratings.update(new_states)
+
+
+class TrueSkillModel(RatingModel):
+    """TrueSkill-style Gaussian team model (two teams, no draws).
+
+    A team performs at the mean skill of its players plus noise beta; the crewmates get a
+    side advantage so that equal teams are predicted at the base crewmate win percentage.
+    Skills are updated with the usual v/w truncated-Gaussian corrections and get tau added
+    before every match."""
+
+    name = 'trueskill'
+
+    def __init__(self, initial=None, sigma=250.0, beta=125.0, tau=2.5, base_win_percentage=None):
+        self.initial = float(settings().current_mmr) if initial is None else initial
+        self.sigma = sigma
+        self.beta = beta
+        self.tau = tau
+        base = ranked_percentages()['crew_base_win_percentage'] if base_win_percentage is None else base_win_percentage
+        self.normal = NormalDist()
+        self.advantage = self.normal.inv_cdf(base)
+        super().__init__()
+
+    def state(self, name, crewmate):
+        return self.ratings.get((player_key(name), crewmate), (self.initial, self.sigma))
+
+    def team(self, names, crewmate):
+        states = [self.state(name, crewmate) for name in names] or [(self.initial, self.sigma)]
+        n = len(states)
+        return sum(s[0] for s in states) / n, sum(s[1] * s[1] for s in states) / (n * n), n
+
+    def t(self, match:SeasonMatch):
+        crew, impostors = self.teams(match)
+        crew_mu, crew_var, crew_n = self.team(crew, True)
+        imp_mu, imp_var, imp_n = self.team(impostors, False)
+        c = math.sqrt(2 * self.beta * self.beta + crew_var + imp_var + self.tau * self.tau * (1 / crew_n + 1 / imp_n))
+        return (crew_mu - imp_mu) / c + self.advantage, c
+
+    def predict(self, match:SeasonMatch):
+        return self.normal.cdf(self.t(match)[0])
+
+    def update(self, match:SeasonMatch, crew_win_probability):
+        t, c = self.t(match)
+        # t seen from the winning team
+        if not match.crew_won:
+            t = -t
+        cdf = max(self.normal.cdf(t), 1e-12)
+        v = self.normal.pdf(t) / cdf
+        w = v * (v + t)
+        team_size = {True: sum(match.crewmate), False: len(match.crewmate) - sum(match.crewmate)}
+        new_states = {}
+        for name, crewmate in zip(match.names, match.crewmate):
+            mu, sigma = self.state(name, crewmate)
+            n = team_size[crewmate]
+            var = sigma * sigma + self.tau * self.tau
+            sign = 1 if match.crew_won == crewmate else -1
+            mu = mu + sign * var / (n * c) * v
+            var = var * max(1 - var / (n * n * c * c) * w, 1e-6)
+            new_states[(player_key(name), crewmate)] = (mu, math.sqrt(var))
+        self.ratings.update(new_states)
+
+
+MODELS = {model.name: model for model in (LogCurveModel, EloModel, Glicko2Model, TrueSkillModel)}
+
+
+def prediction_scores(predictions:pd.DataFrame):
+    """Log loss, Brier score and accuracy of replay() predictions."""
+    p = np.clip(predictions['Crew Win Probability'].to_numpy(dtype=float), 1e-12, 1 - 1e-12)
+    y = predictions['Crew Won'].to_numpy(dtype=float)
+    return {
+        'matches': len(p),
+        'log loss': float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))) if len(p) else float('nan'),
+        'brier': float(np.mean((p - y) ** 2)) if len(p) else float('nan'),
+        'accuracy': float(np.mean((p >= 0.5) == (y == 1))) if len(p) else float('nan'),
+    }
+
+
+def compare_models(season, models=None):
+    """Replay the same season with every model; one row of prediction_scores per model."""
+    models = [model() for model in MODELS.values()] if models is None else models
+    scores = pd.DataFrame({model.name: prediction_scores(model.replay(season)) for model in models}).T
+    return scores.astype({'matches': int})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a season with every rating model and compare their predictions")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    events_file = f"{args.season.replace(' ', '_')}_events.csv"
+    if not os.path.exists(events_file):
+        print(f"{events_file} not found", file=sys.stderr)
+        sys.exit(1)
+    special_matches = get_special_match_index(settings().special_matches_file)
+    season = load_season(EventsLeaderboard(events_file).events_lb, k=special_matches.k_for)
+    print(compare_models(season).to_string(float_format=lambda x: f"{x:.4f}"))
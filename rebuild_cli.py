@@ -0,0 +1,101 @@
+"""Rebuild a season's leaderboard and events from its match directory, without Discord.
+
+    python rebuild_cli.py [--matches Preseason/] [--season "Season 1"] [--workers 4]
+                          [--force] [--cold] [--profile rebuild.prof]
+
+Prints matches/second, seconds per stage (read, replay, rate, stats, persist) and the
+peak memory of the run. Run it from the bot directory, it reads config/config.yaml."""
+import argparse
+import cProfile
+import logging
+import os
+import pstats
+import shutil
+import sys
+import time
+from config_service import settings
+from file_processing import FileHandler
+from stage_timer import StageTimer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process and of its (pool) children, in MB; None where unsupported."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild a season leaderboard from its match files and report throughput")
+    parser.add_argument('--matches', default=settings().matches_path, help="match directory (default: matches_path from the config)")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--workers', type=int, default=None, help="processes reading/replaying matches (default: CPU count, 1 = serial)")
+    parser.add_argument('--force', action='store_true', help="overwrite an existing leaderboard/events of the season")
+    parser.add_argument('--cold', action='store_true', help="drop the parsed match cache first so every JSON file is read")
+    parser.add_argument('--profile', metavar='FILE', help="write a cProfile dump of the rebuild to FILE")
+    parser.add_argument('--quiet', action='store_true', help="only log warnings and errors")
+    return parser.parse_args(argv)
+
+
+def rebuild(args):
+    # Same file names FileHandler uses; checked first because loading creates missing files
+    season_name = args.season.replace(" ", "_")
+    season_files = [f"{season_name}_leaderboard.csv", f"{season_name}_events.csv"]
+    if any(os.path.exists(path) for path in season_files) and not args.force:
+        print(f"{' / '.join(season_files)} already exist, pass --force to rebuild over them", file=sys.stderr)
+        return 1
+    file_handler = FileHandler(args.matches, args.season)
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    file_handler.leaderboard.create_empty_leaderboard()
+    file_handler.leaderboard.invalidate_names()
+    file_handler.events_leaderboard.create_empty_leaderboard()
+    if args.cold:
+        shutil.rmtree(file_handler.match_cache_dir, ignore_errors=True)
+
+    timer = StageTimer()
+    profiler = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    with timer.stage('scan'):
+        files = file_handler.get_sorted_match_files()
+    file_handler.rebuild_season(files, workers=args.workers, timer=timer)
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    matches = file_handler.events_leaderboard.events_lb['Match ID'].nunique()
+    print(f"\nRebuilt {args.season}: {matches} matches from {len(files)} files in {elapsed:.2f}s "
+          f"({matches / elapsed if elapsed else 0:.1f} matches/s)")
+    workers = args.workers or os.cpu_count() or 1
+    # With a pool, read/replay overlap the serial stages; without one they are part of the wall time
+    in_pool = workers > 1 and len(files) > workers
+    for name in ('scan', 'read', 'replay', 'rate', 'stats', 'persist'):
+        if name in timer.seconds:
+            note = f" (summed over {workers} workers)" if name in ('read', 'replay') and in_pool else ""
+            print(f"  {name:<8}{timer.seconds[name]:9.3f}s{note}")
+    serial = sum(seconds for name, seconds in timer.seconds.items() if not in_pool or name not in ('read', 'replay'))
+    print(f"  {'other':<8}{elapsed - serial:9.3f}s ({'waiting on workers, ' if in_pool else ''}final CSV writes)")
+    own, children = peak_memory_mb()
+    if own is None:
+        print("  peak memory: not available on this platform")
+    else:
+        print(f"  peak memory: {own:.1f} MB (worker processes: {children:.1f} MB)")
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f"\ncProfile dump written to {args.profile}, top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(rebuild(parse_args()))
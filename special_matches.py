@@ -0,0 +1,99 @@
+import logging
+import os
+import pandas as pd
+
+MULTIPLIER_K = {'double': 64, 'triple': 96}
+DEFAULT_K = 32
+
+_indexes = {}
+
+
+def get_special_match_index(special_matches_file):
+    """Shared SpecialMatchIndex for special_matches_file, so the bot, FileHandler and PremiumMembers see the same data."""
+    key = os.path.abspath(special_matches_file)
+    if key not in _indexes:
+        _indexes[key] = SpecialMatchIndex(special_matches_file)
+    return _indexes[key]
+
+
+class SpecialMatchIndex:
+    """In-memory view of the special matches CSV (match_id -> multiplier).
+
+    The CSV is only re-read when its mtime changes; matches logged through add()
+    update the index in place."""
+
+    def __init__(self, special_matches_file):
+        self.logger = logging.getLogger('SpecialMatches')
+        self.special_matches_file = special_matches_file
+        self.df = pd.DataFrame(columns=['match_id', 'multiplier'])
+        self.multipliers = {}   # str(match id) -> multiplier
+        self.mtime = None
+
+    @staticmethod
+    def _key(match_id):
+        try:
+            return str(int(float(match_id)))
+        except (TypeError, ValueError):
+            return str(match_id)
+
+    def _build(self):
+        self.multipliers = {}
+        if 'match_id' not in self.df.columns or 'multiplier' not in self.df.columns:
+            return
+        for match_id, multiplier in zip(self.df['match_id'], self.df['multiplier']):
+            if pd.isna(match_id):
+                continue
+            # First entry for a match wins, like the old per-match DataFrame filter
+            self.multipliers.setdefault(self._key(match_id), multiplier)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.special_matches_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload_if_changed(self):
+        mtime = self._file_mtime()
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        if mtime is None:
+            self.df = pd.DataFrame(columns=['match_id', 'multiplier'])
+        else:
+            try:
+                self.df = pd.read_csv(self.special_matches_file)
+            except Exception as e:
+                self.logger.error(f"Error loading special matches file: {str(e)}")
+                return False
+        self._build()
+        self.logger.info(f"Loaded {len(self.multipliers)} special matches from {self.special_matches_file}")
+        return True
+
+    def multiplier(self, match_id):
+        if not match_id:
+            return None
+        self.reload_if_changed()
+        return self.multipliers.get(self._key(match_id))
+
+    def k_for(self, match_id, k=DEFAULT_K):
+        """K factor for match_id: 64 for double, 96 for triple, otherwise k."""
+        multiplier = self.multiplier(match_id)
+        if multiplier is None:
+            return k
+        k = MULTIPLIER_K.get(multiplier, DEFAULT_K)
+        # debug: season-wide jobs ask for every match
+        self.logger.debug(f"Found special match {match_id} with {multiplier} multiplier (k={k})")
+        return k
+
+    def matches(self):
+        self.reload_if_changed()
+        return self.df
+
+    def add(self, row):
+        """Append a special match row to the CSV and to the in-memory index."""
+        self.reload_if_changed()
+        self.df = pd.concat([self.df, pd.DataFrame([row])], ignore_index=True)
+        self.df.to_csv(self.special_matches_file, index=False)
+        self.mtime = self._file_mtime()
+        if row.get('match_id') is not None:
+            self.multipliers.setdefault(self._key(row['match_id']), row.get('multiplier'))
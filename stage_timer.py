@@ -0,0 +1,25 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds and call counts per named stage."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, stage, seconds, count=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + count
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def total(self):
+        return sum(self.seconds.values())
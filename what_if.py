@@ -0,0 +1,162 @@
+"""What-if re-rating: replay the season in memory under other ranked_percentages values.
+
+    python what_if.py --set crew_wrong_crit_penalty=0.3 [--set k_factor=24] [--season "Season 1"] [--csv what_if.csv]
+
+Nothing is written to the live leaderboard or events; the result is the live leaderboard
+with every player's MMR moved by (replay with the new values - replay with the current
+values), re-ranked, next to the live ranks."""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config_service import ranked_percentages, settings
+from leaderboard import Leaderboard
+from leaderboard_events import EventsLeaderboard
+from match_rerate import player_key
+from mmr_kernel import events_to_arrays
+from rating_models import LogCurveModel, season_from_arrays
+from special_matches import get_special_match_index
+
+LIVE_COLUMNS = ['Player Name', 'MMR', 'Crewmate MMR', 'Impostor MMR']
+
+
+def params_hash(params):
+    """Stable hash of a full ranked_percentages mapping."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=float).encode()).hexdigest()
+
+
+def events_signature(events_df:pd.DataFrame):
+    """Cheap fingerprint of the events, to notice added or re-rated matches."""
+    # list columns (vote tuples) are not hashable as they are
+    hashable = events_df.apply(lambda column: column.astype(str) if column.dtype == object else column)
+    return len(events_df), int(pd.util.hash_pandas_object(hashable, index=False).sum())
+
+
+def parse_overrides(settings):
+    """['name=value', ...] -> {name: float}; names must be ranked_percentages keys."""
+    overrides = {}
+    for setting in settings:
+        name, _, raw = setting.partition('=')
+        name = name.strip()
+        if name not in ranked_percentages():
+            raise ValueError(f"Unknown ranked_percentages key {name}")
+        try:
+            overrides[name] = float(raw)
+        except ValueError:
+            raise ValueError(f"{name} needs a number, got '{raw.strip()}'")
+    return overrides
+
+
+class WhatIfSandbox:
+    """Re-rates the season in memory with alternate ranked_percentages and diffs it against live.
+
+    snapshot() reads the live leaderboard and events and must run where they are mutated (the
+    ingest thread in the bot); replays only use the snapshot and can run on any thread. Final
+    ratings are cached per (events fingerprint, parameter hash), so a cached replay is never
+    served for events it was not computed on."""
+
+    def __init__(self, leaderboard:Leaderboard, events_leaderboard:EventsLeaderboard, k=None, cache_size=16):
+        self.logger = logging.getLogger('WhatIfSandbox')
+        self.leaderboard = leaderboard
+        self.events_leaderboard = events_leaderboard
+        # NaN: not a special match, the replayed set's k_factor applies
+        self.k = float('nan') if k is None else k
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.signature = None
+        self.season_arrays = None
+
+    def snapshot(self):
+        """(season arrays, copy of the live leaderboard columns); the arrays are refreshed if the events changed."""
+        events_df = self.events_leaderboard.events_lb
+        signature = events_signature(events_df)
+        with self.lock:
+            if signature != self.signature:
+                self.season_arrays = (signature, *events_to_arrays(events_df, self.k))
+                self.signature = signature
+                self.cache.clear()
+            season_arrays = self.season_arrays
+        return season_arrays, self.leaderboard.leaderboard[LIVE_COLUMNS].copy()
+
+    def ratings(self, params, season_arrays):
+        """{player key: (MMR, Crewmate MMR, Impostor MMR)} after replaying the snapshot()'s season arrays with params."""
+        signature, arrays, rated = season_arrays
+        key = (signature, params_hash(params))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        model = LogCurveModel(params)
+        model.replay(season_from_arrays(arrays, rated, params))
+        with self.lock:
+            self.cache[key] = model.ratings
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return model.ratings
+
+    def compare(self, overrides, snapshot):
+        """Live vs what-if rank and MMR of every player for a snapshot(), in what-if rank order (ranks start at 1)."""
+        # both replays use the same season arrays and ranked_percentages, even if the events or
+        # ranked_percentages.yaml change meanwhile
+        season_arrays, live = snapshot
+        params = ranked_percentages()
+        current = self.ratings(params, season_arrays)
+        changed = self.ratings({**params, **overrides}, season_arrays)
+        live = live.sort_values(by='MMR', ascending=False, kind='mergesort').reset_index(drop=True)
+        # Manual MMR changes stay in: only the difference between the two replays is applied to live
+        shift = np.zeros((len(live), 3))
+        for i, name in enumerate(live['Player Name']):
+            key = player_key(name)
+            if key in current and key in changed:
+                shift[i] = np.subtract(changed[key], current[key])
+        diff = pd.DataFrame({'Player Name': live['Player Name'], 'Rank': np.arange(1, len(live) + 1),
+                             'MMR': live['MMR'].to_numpy(dtype=float)})
+        for j, column in enumerate(LIVE_COLUMNS[1:]):
+            diff[f'What-if {column}'] = np.round(live[column].to_numpy(dtype=float) + shift[:, j], 3)
+        order = diff['What-if MMR'].sort_values(ascending=False, kind='mergesort').index
+        diff = diff.loc[order].reset_index(drop=True)
+        diff.insert(2, 'What-if Rank', np.arange(1, len(diff) + 1))
+        # positive: the player moves up
+        diff.insert(3, 'Rank Change', diff['Rank'] - diff['What-if Rank'])
+        diff.insert(6, 'MMR Change', (diff['What-if MMR'] - diff['MMR']).round(3))
+        return diff
+
+    def run(self, overrides):
+        """snapshot() and compare() in one call, for callers that own the leaderboard thread."""
+        return self.compare(overrides, self.snapshot())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-rate a season in memory with other ranked_percentages values")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--set', dest='settings', action='append', default=[], metavar='KEY=VALUE',
+                        help="ranked_percentages value to change (repeatable)")
+    parser.add_argument('--top', type=int, default=20, help="rows to print (default: 20)")
+    parser.add_argument('--csv', help="write the full comparison to this CSV")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    season_file = args.season.replace(' ', '_')
+    for path in (f"{season_file}_events.csv", f"{season_file}_leaderboard.csv"):
+        if not os.path.exists(path):
+            print(f"{path} not found", file=sys.stderr)
+            sys.exit(1)
+    try:
+        overrides = parse_overrides(args.settings)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    special_matches = get_special_match_index(settings().special_matches_file)
+    sandbox = WhatIfSandbox(Leaderboard(f"{season_file}_leaderboard.csv"), EventsLeaderboard(f"{season_file}_events.csv"),
+                            k=lambda match_id: special_matches.k_for(match_id, float('nan')))
+    diff = sandbox.run(overrides)
+    print(diff.head(args.top).to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    if args.csv:
+        diff.to_csv(args.csv, index=False)
@@ -0,0 +1,260 @@
+"""Feature-based pre-match crewmate win predictor, trained offline on the events store.
+
+    python win_predictor.py [--season "Season 1"] [--holdout 0.2] [--l2 1.0] [--save win_predictor.json]
+                            [--lineup "Crew1,Crew2,..." "Imp1,Imp2"]
+
+Every player has a crewmate and an impostor feature vector built only from what was known
+before the match being predicted: role MMR, role win rate, crewmate voting accuracy, role
+survivability, recent form (win rate over their last RECENT_GAMES games) and role experience.
+A match's features are the crewmate side's average crewmate vector and the impostor side's
+average impostor vector. A logistic regression (NumPy only, Newton steps with an L2 penalty)
+is fitted on the earlier matches and scored next to the current win probability curve on the
+later, held-out ones. The bot does not use it; it is here to be evaluated."""
+import argparse
+import json
+import logging
+import os
+import sys
+import numpy as np
+import pandas as pd
+from config_service import settings
+from leaderboard import Leaderboard
+from leaderboard_events import EventsLeaderboard
+from match_rerate import player_key
+from rating_models import prediction_scores
+from win_probability import WinProbabilityCurve
+
+RECENT_GAMES = 10
+CREW_FEATURES = ['mmr', 'win rate', 'voting accuracy', 'survivability', 'form', 'experience']
+IMP_FEATURES = ['mmr', 'win rate', 'survivability', 'form', 'experience']
+# names of the model inputs, in column order
+FEATURES = [f'crew {name}' for name in CREW_FEATURES] + [f'imp {name}' for name in IMP_FEATURES]
+
+
+def role_features(mmr, games, wins, correct_votes, counted_votes, survival, form_wins, form_games, crewmate=True):
+    """Feature matrix of one role from a player's counts; every rate is shrunk towards 0.5 so new players are defined."""
+    columns = {
+        'mmr': np.asarray(mmr, dtype=float),
+        'win rate': (np.asarray(wins, dtype=float) + 1) / (np.asarray(games, dtype=float) + 2),
+        'voting accuracy': (np.asarray(correct_votes, dtype=float) + 1) / (np.asarray(counted_votes, dtype=float) + 2),
+        'survivability': (np.asarray(survival, dtype=float) + 0.5) / (np.asarray(games, dtype=float) + 1),
+        'form': (np.asarray(form_wins, dtype=float) + 0.5) / (np.asarray(form_games, dtype=float) + 1),
+        'experience': np.log1p(np.asarray(games, dtype=float)),
+    }
+    return np.column_stack([columns[name] for name in (CREW_FEATURES if crewmate else IMP_FEATURES)])
+
+
+def _row_inputs(events_df:pd.DataFrame):
+    """Decided events rows with the per-row values the features count."""
+    rated = events_df[events_df['Match Result'].isin(['Crewmates Win', 'Impostors Win'])]
+    crewmate = (rated['Player Team'] == 'crewmate').to_numpy()
+    won = rated['Won'].astype(bool).to_numpy().astype(float)
+    # voting accuracy as on the leaderboard: crewmate games, without the ones they died first in
+    voting = crewmate & ~rated['Died First Round'].astype(bool).to_numpy()
+    match_seconds = rated['Match Seconds'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        survival = np.clip(np.where(match_seconds > 0, rated['Alive Seconds'].to_numpy(dtype=float) / match_seconds, 0.0), 0, 1)
+    values = pd.DataFrame({
+        'key': rated['Player Name'].map(player_key).to_numpy(),
+        'crewmate': crewmate,
+        'won': won,
+        'correct votes': np.where(voting, rated['Correct Votes'].to_numpy(dtype=float), 0.0),
+        'counted votes': np.where(voting, (rated['Placed Votes'] - rated['Skip Votes']).to_numpy(dtype=float), 0.0),
+        'survival': survival,
+    })
+    return rated, values
+
+
+def pre_match_features(events_df:pd.DataFrame):
+    """Per decided events row: (rated rows, crewmate features, impostor features), counted over the player's earlier rows only.
+
+    Events are kept in rating order, so 'earlier rows' is what the rating system knew."""
+    rated, values = _row_inputs(events_df)
+    role = values.groupby(['key', 'crewmate'], sort=False)
+    player = values.groupby('key', sort=False)
+
+    def before(grouped, column):
+        # running total of the player's rows, without the row itself
+        return (grouped[column].cumsum() - values[column]).to_numpy()
+
+    games = role.cumcount().to_numpy()
+    form_total = before(player, 'won')
+    form_lag = pd.Series(form_total).groupby(values['key'].to_numpy(), sort=False).shift(RECENT_GAMES, fill_value=0).to_numpy()
+    form_games = np.minimum(player.cumcount().to_numpy(), RECENT_GAMES)
+    counts = dict(games=games, wins=before(role, 'won'), correct_votes=before(player, 'correct votes'),
+                  counted_votes=before(player, 'counted votes'), survival=before(role, 'survival'),
+                  form_wins=form_total - form_lag, form_games=form_games)
+    crew = role_features(rated['Crewmate MMR'].to_numpy(dtype=float), crewmate=True, **counts)
+    imp = role_features(rated['Impostor MMR'].to_numpy(dtype=float), crewmate=False, **counts)
+    return rated, crew, imp
+
+
+def match_features(events_df:pd.DataFrame):
+    """(match ids, feature matrix (FEATURES), crew won, avg crew MMR, avg impostor MMR) of every decided 10-player match, in rating order."""
+    rated, crew, imp = pre_match_features(events_df)
+    full = (rated.groupby('Match ID')['Match ID'].transform('size') == 10).to_numpy()
+    crewmate = (rated['Player Team'] == 'crewmate').to_numpy()
+    match_ids = rated['Match ID'].to_numpy()
+    sides = []
+    for side, features, names in ((crewmate, crew, CREW_FEATURES), (~crewmate, imp, IMP_FEATURES)):
+        rows = full & side
+        sides.append(pd.DataFrame(features[rows], columns=names).groupby(match_ids[rows], sort=False).mean())
+    # matches with players on both sides
+    matches = sides[0].index.intersection(sides[1].index, sort=False)
+    features = np.column_stack([sides[0].loc[matches].to_numpy(), sides[1].loc[matches].to_numpy()])
+    crew_won = rated.groupby('Match ID', sort=False)['Match Result'].first().loc[matches].to_numpy() == 'Crewmates Win'
+    return (matches.to_numpy(), features, crew_won, sides[0].loc[matches, 'mmr'].to_numpy(), sides[1].loc[matches, 'mmr'].to_numpy())
+
+
+def sigmoid(z):
+    return 1 / (1 + np.exp(-np.clip(z, -500, 500)))
+
+
+class WinPredictor:
+    """Logistic regression over standardized FEATURES: p(crew wins) = sigmoid(bias + weights . (x - mean) / std).
+
+    Every input is a side average of per-player vectors, so the logit is the bias plus the average
+    of per-player crewmate scores plus the average of per-player impostor scores; index() caches
+    those scores and predict_match() only averages them."""
+
+    def __init__(self, weights, bias, mean, std):
+        self.logger = logging.getLogger('WinPredictor')
+        self.weights = np.asarray(weights, dtype=float)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=float)
+        self.std = np.asarray(std, dtype=float)
+        self.scores = {}
+        self.new_player_scores = (0.0, 0.0)
+
+    @classmethod
+    def fit(cls, features, crew_won, l2=1.0, iterations=50):
+        """Penalized maximum likelihood by Newton's method; the bias is not penalized."""
+        mean = features.mean(axis=0)
+        std = features.std(axis=0)
+        std[std == 0] = 1.0
+        x = np.column_stack([np.ones(len(features)), (features - mean) / std])
+        y = np.asarray(crew_won, dtype=float)
+        penalty = np.full(x.shape[1], float(l2))
+        penalty[0] = 0.0
+        theta = np.zeros(x.shape[1])
+        for _ in range(iterations):
+            p = sigmoid(x @ theta)
+            gradient = x.T @ (p - y) + penalty * theta
+            hessian = (x * (p * (1 - p))[:, None]).T @ x + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            theta -= step
+            if np.max(np.abs(step)) < 1e-10:
+                break
+        return cls(theta[1:], theta[0], mean, std)
+
+    def predict(self, features):
+        """Crewmate win probability of every row of a FEATURES matrix."""
+        return sigmoid(self.bias + ((np.asarray(features, dtype=float) - self.mean) / self.std) @ self.weights)
+
+    def player_scores(self, crew, imp):
+        """Contributions of per-player crewmate and impostor feature rows to the logit (before averaging)."""
+        crew_part = slice(0, len(CREW_FEATURES))
+        imp_part = slice(len(CREW_FEATURES), len(FEATURES))
+        crew_scores = ((crew - self.mean[crew_part]) / self.std[crew_part]) @ self.weights[crew_part]
+        imp_scores = ((imp - self.mean[imp_part]) / self.std[imp_part]) @ self.weights[imp_part]
+        return crew_scores, imp_scores
+
+    def index(self, leaderboard_df:pd.DataFrame, events_df:pd.DataFrame):
+        """Cache the current score of every leaderboard player: live MMRs, counts over all their decided rows."""
+        _, values = _row_inputs(events_df)
+        keys = leaderboard_df['Player Name'].map(player_key).to_numpy()
+
+        def per_player(grouped, how):
+            return getattr(grouped, how)().reindex(keys).fillna(0).to_numpy(dtype=float)
+
+        player = values.groupby('key')
+        # last RECENT_GAMES rows of every player
+        recent = values.groupby('key', sort=False).tail(RECENT_GAMES).groupby('key')['won']
+        shared = dict(correct_votes=per_player(player['correct votes'], 'sum'), counted_votes=per_player(player['counted votes'], 'sum'),
+                      form_wins=per_player(recent, 'sum'), form_games=per_player(recent, 'size'))
+
+        def role_counts(crewmate):
+            role = values[values['crewmate'] == crewmate].groupby('key')
+            return dict(games=per_player(role['won'], 'size'), wins=per_player(role['won'], 'sum'),
+                        survival=per_player(role['survival'], 'sum'), **shared)
+
+        crew = role_features(leaderboard_df['Crewmate MMR'].to_numpy(dtype=float), crewmate=True, **role_counts(True))
+        imp = role_features(leaderboard_df['Impostor MMR'].to_numpy(dtype=float), crewmate=False, **role_counts(False))
+        crew_scores, imp_scores = self.player_scores(crew, imp)
+        self.scores = dict(zip(keys, zip(crew_scores.tolist(), imp_scores.tolist())))
+        config = settings()
+        zeros = dict(games=0, wins=0, correct_votes=0, counted_votes=0, survival=0, form_wins=0, form_games=0)
+        new_crew, new_imp = self.player_scores(role_features([float(config.crewmate_current_mmr)], crewmate=True, **zeros),
+                                               role_features([float(config.impostor_current_mmr)], crewmate=False, **zeros))
+        self.new_player_scores = (float(new_crew[0]), float(new_imp[0]))
+        return len(self.scores)
+
+    def predict_match(self, crewmates, impostors):
+        """Crewmate win probability of a lineup of player names from the index() cache; unknown names count as new players."""
+        crew = [self.scores.get(player_key(name), self.new_player_scores)[0] for name in crewmates]
+        imp = [self.scores.get(player_key(name), self.new_player_scores)[1] for name in impostors]
+        return float(sigmoid(self.bias + np.mean(crew) + np.mean(imp)))
+
+    def to_dict(self):
+        return {'features': FEATURES, 'weights': self.weights.tolist(), 'bias': self.bias,
+                'mean': self.mean.tolist(), 'std': self.std.tolist(), 'recent_games': RECENT_GAMES}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('features') != FEATURES or data.get('recent_games') != RECENT_GAMES:
+            raise ValueError(f"{path} was trained on other features, train it again")
+        return cls(data['weights'], data['bias'], data['mean'], data['std'])
+
+
+def evaluate(events_df:pd.DataFrame, holdout=0.2, l2=1.0, params=None):
+    """(predictor trained on the earlier matches, scores of it and of the current curve on the held-out later matches)."""
+    match_ids, features, crew_won, avg_crew_mmr, avg_imp_mmr = match_features(events_df)
+    split = len(match_ids) - max(1, int(round(len(match_ids) * holdout)))
+    if split < len(FEATURES) + 1:
+        raise ValueError(f"Not enough matches to train on ({len(match_ids)} decided 10-player matches)")
+    predictor = WinPredictor.fit(features[:split], crew_won[:split], l2=l2)
+    held_out = slice(split, None)
+    curve = np.atleast_1d(WinProbabilityCurve(params)(avg_crew_mmr[held_out], avg_imp_mmr[held_out]))
+    scores = {}
+    for name, probability in (('current curve', curve), ('feature model', predictor.predict(features[held_out]))):
+        scores[name] = prediction_scores(pd.DataFrame({'Crew Win Probability': probability, 'Crew Won': crew_won[held_out]}))
+    return predictor, pd.DataFrame(scores).T.astype({'matches': int})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the feature-based win predictor and compare it with the current curve")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--holdout', type=float, default=0.2, help="share of the latest matches held out for scoring (default: 0.2)")
+    parser.add_argument('--l2', type=float, default=1.0, help="L2 penalty on the standardized weights (default: 1.0)")
+    parser.add_argument('--save', help="write the trained model (JSON) to this file")
+    parser.add_argument('--lineup', nargs=2, metavar=('CREWMATES', 'IMPOSTORS'),
+                        help="also predict a lineup, comma separated player names per side")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    season_file = args.season.replace(' ', '_')
+    events_file = f"{season_file}_events.csv"
+    if not os.path.exists(events_file):
+        print(f"{events_file} not found", file=sys.stderr)
+        sys.exit(1)
+    events_df = EventsLeaderboard(events_file).events_lb
+    try:
+        predictor, scores = evaluate(events_df, holdout=args.holdout, l2=args.l2)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(scores.to_string(float_format=lambda x: f"{x:.4f}"))
+    print()
+    print(pd.Series(predictor.weights, index=FEATURES, name='standardized weight').to_string(float_format=lambda x: f"{x:+.4f}"))
+    if args.save:
+        predictor.save(args.save)
+    if args.lineup:
+        predictor.index(Leaderboard(f"{season_file}_leaderboard.csv").leaderboard, events_df)
+        crewmates, impostors = (side.split(',') for side in args.lineup)
+        print(f"\nCrewmate win probability: {predictor.predict_match(crewmates, impostors):.3f}")
@@ -0,0 +1,212 @@
+"""Fit the win-probability curve of ranked_percentages.yaml to the season's match history.
+
+    python win_prob_fit.py [--season "Season 1"] [--plot calibration.png]
+
+Prints proposed win_prob_a..d, crew_base_win_percentage and min/max_win_probability with
+95% confidence intervals, and optionally writes a calibration plot."""
+import argparse
+import io
+import logging
+import math
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from config_service import ranked_percentages, settings
+from leaderboard_events import EventsLeaderboard
+from win_probability import WinProbabilityCurve
+
+# Crewmate win probability is base + sign(diff) * (a * log(1 + |diff| / h) + e). This is the
+# same family as a * log(b * |diff| + c) + d, but a*log(b x + c) + d only depends on b through
+# c / b and a * log(b) + d, so b is kept at its configured value and c = h * b, d = e - a * log(c).
+PARAMETERS = ['crew_base_win_percentage', 'win_prob_a', 'win_prob_c', 'win_prob_d']
+Z_95 = 1.959964
+# The clamps are proposed where the data runs out: the curve at this quantile of |diff|
+BOUND_QUANTILE = 0.95
+
+MatchHistory = namedtuple('MatchHistory', ['match_id', 'avg_crew_mmr', 'avg_imp_mmr', 'crew_won'])
+WinProbFit = namedtuple('WinProbFit', ['values', 'low', 'high', 'theta', 'covariance', 'log_likelihood', 'matches', 'bound_distance', 'b'])
+
+
+def match_history(events_df:pd.DataFrame) -> MatchHistory:
+    """(avg crew MMR, avg impostor MMR, crew won) of every decided 10-player match, from the pre-match MMRs in the events."""
+    valid = events_df[events_df['Match Result'].isin(['Crewmates Win', 'Impostors Win'])]
+    valid = valid[valid.groupby('Match ID')['Match ID'].transform('size') == 10]
+    crew = valid[valid['Player Team'] == 'crewmate'].groupby('Match ID')['Crewmate MMR'].mean()
+    imp = valid[valid['Player Team'] == 'impostor'].groupby('Match ID')['Impostor MMR'].mean()
+    result = valid.groupby('Match ID')['Match Result'].first()
+    matches = crew.index.intersection(imp.index)
+    return MatchHistory(matches.to_numpy(), crew[matches].to_numpy(dtype=float), imp[matches].to_numpy(dtype=float),
+                        (result[matches] == 'Crewmates Win').to_numpy())
+
+
+def curve_probability(theta, difference):
+    """Unclamped crewmate win probability for theta = [logit(base), a, log(h), e]."""
+    base = 1 / (1 + np.exp(-theta[0]))
+    change = theta[1] * np.log1p(np.abs(difference) / np.exp(theta[2])) + theta[3]
+    return np.where(difference < 0, base - change, base + change)
+
+
+def log_likelihood(theta, difference, crew_won):
+    p = np.clip(curve_probability(theta, difference), 1e-9, 1 - 1e-9)
+    return float(np.sum(np.where(crew_won, np.log(p), np.log1p(-p))))
+
+
+def numeric_hessian(f, theta, step=1e-4):
+    n = len(theta)
+    gradient = np.zeros(n)
+    hessian = np.zeros((n, n))
+    f0 = f(theta)
+    for i in range(n):
+        ei = np.zeros(n)
+        ei[i] = step
+        f_plus, f_minus = f(theta + ei), f(theta - ei)
+        gradient[i] = (f_plus - f_minus) / (2 * step)
+        hessian[i, i] = (f_plus - 2 * f0 + f_minus) / (step * step)
+        for j in range(i):
+            ej = np.zeros(n)
+            ej[j] = step
+            hessian[i, j] = hessian[j, i] = (f(theta + ei + ej) - f(theta + ei - ej) - f(theta - ei + ej) + f(theta - ei - ej)) / (4 * step * step)
+    return gradient, hessian
+
+
+def to_theta(params):
+    b, c = params['win_prob_b'], params['win_prob_c']
+    base = params['crew_base_win_percentage']
+    return np.array([math.log(base / (1 - base)), params['win_prob_a'], math.log(c / b), params['win_prob_a'] * math.log(c) + params['win_prob_d']])
+
+
+def to_values(theta, b, bound_distance):
+    """Configuration values of theta: the four PARAMETERS, then min and max win probability."""
+    base = 1 / (1 + math.exp(-theta[0]))
+    a = theta[1]
+    c = math.exp(theta[2]) * b
+    d = theta[3] - a * math.log(c)
+    low, high = curve_probability(theta, np.array([-bound_distance, bound_distance]))
+    return np.array([base, a, c, d, low, high])
+
+
+def fit_win_probability(history:MatchHistory, params=None, iterations=100):
+    """Maximum likelihood fit of the curve, starting from params (ranked_percentages by default).
+
+    Damped Newton steps on the vectorized log-likelihood; 95% intervals come from the inverse
+    observed information (delta method for the derived values). Intervals are NaN when the
+    information matrix is not positive definite (too little or degenerate data)."""
+    params = ranked_percentages() if params is None else params
+    difference = history.avg_crew_mmr - history.avg_imp_mmr
+    crew_won = history.crew_won.astype(bool)
+    f = lambda theta: log_likelihood(theta, difference, crew_won)
+    theta = to_theta(params)
+    damping = 1e-3
+    for _ in range(iterations):
+        gradient, hessian = numeric_hessian(f, theta)
+        current = f(theta)
+        improved = False
+        while damping < 1e8:
+            try:
+                step = np.linalg.solve(-hessian + damping * np.eye(len(theta)), gradient)
+            except np.linalg.LinAlgError:
+                damping *= 10
+                continue
+            if f(theta + step) > current:
+                theta = theta + step
+                damping = max(damping / 10, 1e-9)
+                improved = True
+                break
+            damping *= 10
+        if not improved or np.max(np.abs(step)) < 1e-8:
+            break
+
+    bound_distance = float(np.quantile(np.abs(difference), BOUND_QUANTILE)) if len(difference) else 0.0
+    b = params['win_prob_b']
+    values = to_values(theta, b, bound_distance)
+    _, hessian = numeric_hessian(f, theta)
+    try:
+        covariance = np.linalg.inv(-hessian)
+        if np.any(np.diag(covariance) < 0):
+            raise np.linalg.LinAlgError
+        # Jacobian of to_values by central differences
+        jacobian = np.zeros((len(values), len(theta)))
+        for i in range(len(theta)):
+            h = 1e-6 * max(1.0, abs(theta[i]))
+            e = np.zeros(len(theta))
+            e[i] = h
+            jacobian[:, i] = (to_values(theta + e, b, bound_distance) - to_values(theta - e, b, bound_distance)) / (2 * h)
+        standard_error = np.sqrt(np.maximum(np.diag(jacobian @ covariance @ jacobian.T), 0))
+    except np.linalg.LinAlgError:
+        covariance = np.full((len(theta), len(theta)), np.nan)
+        standard_error = np.full(len(values), np.nan)
+    low, high = values - Z_95 * standard_error, values + Z_95 * standard_error
+    # the clamps are probabilities
+    values[4:], low[4:], high[4:] = np.clip(values[4:], 0, 1), np.clip(low[4:], 0, 1), np.clip(high[4:], 0, 1)
+    return WinProbFit(values, low, high, theta, covariance, f(theta), len(difference), bound_distance, b)
+
+
+def proposed_yaml(fit:WinProbFit, params=None):
+    """The fitted values as ranked_percentages.yaml lines, with the current value and the 95% CI."""
+    params = ranked_percentages() if params is None else params
+    names = PARAMETERS + ['min_win_probability', 'max_win_probability']
+    lines = [f"# fitted on {fit.matches} matches, log-likelihood {fit.log_likelihood:.2f}; win_prob_b kept at {fit.b}",
+             f"# min/max_win_probability: fitted curve at |diff| = {fit.bound_distance:.1f} ({BOUND_QUANTILE:.0%} of matches are closer)"]
+    for name, value, low, high in zip(names, fit.values, fit.low, fit.high):
+        lines.append(f"{name}: {value:.6g}  # 95% CI [{low:.4g}, {high:.4g}] (old: {params[name]})")
+    return "\n".join(lines)
+
+
+def calibration_plot(history:MatchHistory, fit:WinProbFit, params=None, bins=10):
+    """PNG (BytesIO) of predicted vs observed crewmate win rate for the current and the fitted curve.
+
+    Uses a Figure directly (no pyplot state), so it can be rendered from a worker thread."""
+    from matplotlib.figure import Figure
+    params = ranked_percentages() if params is None else params
+    names = PARAMETERS + ['min_win_probability', 'max_win_probability']
+    fitted = {**params, **dict(zip(names, fit.values))}
+    figure = Figure(figsize=(6, 6))
+    axes = figure.subplots()
+    axes.plot([0, 1], [0, 1], color='gray', linestyle='--', label='perfect calibration')
+    crew_won = history.crew_won.astype(float)
+    for label, curve_params, color in (('current', params, 'red'), ('fitted', fitted, 'blue')):
+        predicted = np.atleast_1d(WinProbabilityCurve(curve_params)(history.avg_crew_mmr, history.avg_imp_mmr))
+        edges = np.quantile(predicted, np.linspace(0, 1, bins + 1)) if len(predicted) else np.array([0, 1])
+        bucket = np.clip(np.searchsorted(edges, predicted, side='right') - 1, 0, len(edges) - 2)
+        counts = np.bincount(bucket, minlength=len(edges) - 1)
+        used = counts > 0
+        mean_predicted = np.bincount(bucket, weights=predicted, minlength=len(edges) - 1)[used] / counts[used]
+        observed = np.bincount(bucket, weights=crew_won, minlength=len(edges) - 1)[used] / counts[used]
+        axes.plot(mean_predicted, observed, marker='o', color=color, label=f'{label} curve')
+    axes.set_xlabel('Predicted crewmate win probability')
+    axes.set_ylabel('Observed crewmate win rate')
+    axes.set_title(f'Win probability calibration ({len(crew_won)} matches)')
+    axes.set_xlim(0, 1)
+    axes.set_ylim(0, 1)
+    axes.grid(True)
+    axes.legend()
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png')
+    buf.seek(0)
+    return buf
+
+
+def fit_report(history:MatchHistory, params=None):
+    """(proposed YAML text, calibration PNG) for a match history; blocking, run it off the event loop."""
+    fit = fit_win_probability(history, params)
+    return proposed_yaml(fit, params), calibration_plot(history, fit, params)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the win probability curve to a season's match history")
+    parser.add_argument('--season', default=settings().season_name, help="season name (default: season_name from the config)")
+    parser.add_argument('--plot', help="write the calibration plot (PNG) to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    events_file = f"{args.season.replace(' ', '_')}_events.csv"
+    if not os.path.exists(events_file):
+        print(f"{events_file} not found", file=sys.stderr)
+        sys.exit(1)
+    history = match_history(EventsLeaderboard(events_file).events_lb)
+    fit = fit_win_probability(history)
+    print(proposed_yaml(fit))
+    if args.plot:
+        with open(args.plot, 'wb') as f:
+            f.write(calibration_plot(history, fit).getbuffer())
@@ -0,0 +1,53 @@
+import numpy as np
+from config_service import ranked_percentages
+
+
+class WinProbabilityCurve:
+    """Crewmate win probability from the difference of the average crewmate and impostor MMR.
+
+    p = base ± (a * log(b * |diff| + c) + d), clamped to min_win_probability when the crew is
+    weaker and to max_win_probability when it is stronger. The constants are read once; pass
+    other params (same keys as ranked_percentages.yaml) to evaluate a different curve."""
+
+    def __init__(self, params=None):
+        params = ranked_percentages() if params is None else params
+        self.a = params['win_prob_a']
+        self.b = params['win_prob_b']
+        self.c = params['win_prob_c']
+        self.d = params['win_prob_d']
+        self.base = params['crew_base_win_percentage']
+        self.min_win_probability = params['min_win_probability']
+        self.max_win_probability = params['max_win_probability']
+
+    def log_term(self, difference):
+        return self.a * np.log(self.b * difference + self.c) + self.d
+
+    def __call__(self, avg_crew_mmr, avg_imp_mmr):
+        """Crewmate win probability for scalars or arrays of average MMRs (impostor win probability is 1 - p)."""
+        difference = np.asarray(avg_crew_mmr, dtype=float) - np.asarray(avg_imp_mmr, dtype=float)
+        prob_change = self.log_term(np.abs(difference))
+        weaker = difference < 0
+        win_prob = np.where(weaker, self.base - prob_change, self.base + prob_change)
+        win_prob = np.where(weaker & (win_prob < self.min_win_probability), self.min_win_probability, win_prob)
+        win_prob = np.where(~weaker & (win_prob > self.max_win_probability), self.max_win_probability, win_prob)
+        return win_prob if win_prob.ndim else float(win_prob)
+
+
+# (params snapshot, its curve); rebuilt when ranked_percentages.yaml is reloaded
+_curve = (None, None)
+
+
+def curve_for(params=None):
+    """WinProbabilityCurve of params (the current ranked_percentages by default), reused while they stay the same."""
+    global _curve
+    params = ranked_percentages() if params is None else params
+    cached_params, curve = _curve
+    if cached_params is not params:
+        curve = WinProbabilityCurve(params)
+        _curve = (params, curve)
+    return curve
+
+
+def win_probability(avg_crew_mmr, avg_imp_mmr, params=None):
+    """Crewmate win probability with the configured curve; see WinProbabilityCurve."""
+    return curve_for(params)(avg_crew_mmr, avg_imp_mmr)